@@ -1,40 +1,325 @@
 from dotenv import load_dotenv
 load_dotenv()
 
+import base64
+import bisect
+import csv
+import gzip
+import hashlib
+import heapq
+import io
+import json
+import math
+import mimetypes
 import os
+import queue
 import random
-from datetime import datetime, timedelta
-
-import requests
-from flask import (Flask, flash, jsonify, redirect, render_template, request,
-                   session, url_for)
-from flask_mail import Mail, Message
+import smtplib
+import sqlite3
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from array import array
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from types import MappingProxyType
+
+import click
+from flask import (Flask, Response, flash, g, get_template_attribute, has_request_context, jsonify,
+                   redirect, render_template, request, send_from_directory, session, stream_with_context,
+                   url_for)
 from flask_sqlalchemy import SQLAlchemy
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+from sqlalchemy import event as sa_event
+from sqlalchemy import insert as sa_insert
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy import select as sa_select
+from sqlalchemy import update as sa_update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
 
 # --- App Initialization ---
+# create_app() (bottom of the file) configures the app; 'flask upgrade-db' migrates the schema.
 app = Flask(__name__)
-# For production, this key should be a long, random string stored securely as an environment variable
-app.secret_key = os.environ.get('FLASK_SECRET_KEY', 'a_super_secret_key_for_your_cafe_app')
+
+@app.before_request
+def require_create_app():
+    # The bare app (gunicorn app:app) was never configured by create_app().
+    if 'sqlalchemy' not in app.extensions:
+        raise RuntimeError("create_app() has not been called in this process: serve wsgi:app "
+                           "(gunicorn wsgi:app) or asgi:app, not app:app")
+
+def config_from_environment():
+    return {
+        # For production, this key should be a long, random string stored securely as an environment variable
+        'SECRET_KEY': os.environ.get('FLASK_SECRET_KEY', 'a_super_secret_key_for_your_cafe_app'),
+        # DATABASE_URL selects the backend (SQLite by default, e.g. postgresql://… in production).
+        'SQLALCHEMY_DATABASE_URI': os.environ.get('DATABASE_URL', 'sqlite:///instance/cafe.db'),
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        # SQLite pragmas: WAL readers run alongside the writer, and writers wait for the lock.
+        'SQLITE_JOURNAL_MODE': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+        'SQLITE_SYNCHRONOUS': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'SQLITE_BUSY_TIMEOUT_MS': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 30000)),
+        'DB_POOL_SIZE': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'DB_MAX_OVERFLOW': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+        'DB_POOL_TIMEOUT': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        'DB_POOL_RECYCLE': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'MAIL_SERVER': os.environ.get('MAIL_SERVER', 'smtp.gmail.com'),
+        'MAIL_PORT': int(os.environ.get('MAIL_PORT', 587)),
+        'MAIL_USE_TLS': os.environ.get('MAIL_USE_TLS', 'true').lower() == 'true',
+        'MAIL_USERNAME': os.environ.get('EMAIL_USER'),
+        'MAIL_PASSWORD': os.environ.get('EMAIL_PASS'),
+        'MAIL_DEFAULT_SENDER': os.environ.get('EMAIL_USER'),
+        # Outbox delivery: worker threads per process, mails per reused SMTP session, retry limit.
+        'MAIL_OUTBOX_WORKERS': int(os.environ.get('MAIL_OUTBOX_WORKERS', 2)),
+        'MAIL_OUTBOX_BATCH_SIZE': int(os.environ.get('MAIL_OUTBOX_BATCH_SIZE', 20)),
+        'MAIL_OUTBOX_MAX_ATTEMPTS': int(os.environ.get('MAIL_OUTBOX_MAX_ATTEMPTS', 5)),
+        # Build read-only caches in create_app(), so gunicorn --preload shares them with workers.
+        'WARM_CACHES': os.environ.get('WARM_CACHES', 'true').lower() == 'true',
+        # Async serving mode (asgi.py): threads running the Flask routes; 0 means the DB pool size plus overflow.
+        'ASYNC_DB_THREADS': int(os.environ.get('ASYNC_DB_THREADS', 0)),
+        # /metrics is off (404) unless enabled; a token additionally requires "Authorization: Bearer <token>".
+        'METRICS_ENABLED': os.environ.get('METRICS_ENABLED', 'false').lower() == 'true',
+        'METRICS_TOKEN': os.environ.get('METRICS_TOKEN'),
+    }
 
 
 # --- Database Configuration ---
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///instance/cafe.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
-with app.app_context():
-    db.create_all()
+db = SQLAlchemy()
+
+def engine_options(database_url, config):
+    # Each gunicorn worker keeps its own pool; pre-ping and recycle drop connections the server closed.
+    options = {'pool_pre_ping': True}
+    if database_url not in ('sqlite://', 'sqlite:///:memory:'): # in-memory SQLite shares one connection
+        options.update({
+            'pool_size': config['DB_POOL_SIZE'],
+            'max_overflow': config['DB_MAX_OVERFLOW'],
+            'pool_timeout': config['DB_POOL_TIMEOUT'],
+            'pool_recycle': config['DB_POOL_RECYCLE'],
+        })
+    return options
 
+@sa_event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA busy_timeout = {int(app.config['SQLITE_BUSY_TIMEOUT_MS'])}")
+    cursor.execute(f"PRAGMA journal_mode = {app.config['SQLITE_JOURNAL_MODE']}")
+    cursor.execute(f"PRAGMA synchronous = {app.config['SQLITE_SYNCHRONOUS']}")
+    cursor.close()
+
+def dispose_inherited_connections(engines):
+    # Connections must not be shared with a forked child; close=False leaves the parent's open.
+    for engine in engines:
+        engine.dispose(close=False)
 
 
 # --- Flask-Mail Configuration ---
-app.config['MAIL_SERVER'] = 'smtp.gmail.com'
-app.config['MAIL_PORT'] = 587
-app.config['MAIL_USE_TLS'] = True
-app.config['MAIL_USERNAME'] = os.environ.get('EMAIL_USER')
-app.config['MAIL_PASSWORD'] = os.environ.get('EMAIL_PASS')
-app.config['MAIL_DEFAULT_SENDER'] = os.environ.get('EMAIL_USER')
-mail = Mail(app)
+_mail = None
+_mail_lock = threading.Lock()
+
+def get_mail():
+    """The Flask-Mail client, created when the outbox first delivers mail."""
+    global _mail
+    if _mail is None:
+        with _mail_lock:
+            if _mail is None:
+                from flask_mail import Mail
+                _mail = Mail(app)
+    return _mail
+
+
+# --- INSTRUMENTATION ---
+# Per-process Prometheus metrics on /metrics (set METRICS_ENABLED or METRICS_TOKEN).
+# PROFILE_SLOW_REQUESTS_MS writes collapsed stacks of slower requests to instance/profiles/.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+METRIC_DEFINITIONS = {
+    'http_requests_total': ('counter', 'HTTP requests by endpoint, method and status.'),
+    'http_request_duration_seconds': ('histogram', 'HTTP request latency by endpoint.'),
+    'http_request_db_queries': ('histogram', 'SQL queries issued per HTTP request, by endpoint.'),
+    'http_request_db_seconds_total': ('counter', 'Time spent in SQL queries during HTTP requests, by endpoint.'),
+    'db_query_duration_seconds': ('histogram', 'SQL query latency, including background threads.'),
+    'outbound_call_duration_seconds': ('histogram', 'Outbound HTTP and SMTP call latency by target.'),
+    'outbound_call_errors_total': ('counter', 'Failed outbound calls by target.'),
+    'slow_request_profiles_total': ('counter', 'Slow requests whose sampled stacks were written to disk.'),
+    'kitchen_order_eta_seconds': ('histogram', 'Estimated preparation time given to new dine-in orders.'),
+    'weather_cache_events_total': ('counter', 'Weather cache reads (hits, stale_hits, misses), refreshes and fetch errors.'),
+}
+PROFILE_SLOW_REQUESTS_MS = float(os.environ.get('PROFILE_SLOW_REQUESTS_MS', 0)) # 0 disables the profiler
+PROFILE_SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL_MS', 5)) / 1000
+
+class Instrumentation:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = Counter()   # (name, labels) -> value
+        self._histograms = {}        # (name, labels) -> {'buckets': (...), 'counts': [...], 'sum': float}
+
+    def inc(self, name, labels=(), value=1):
+        with self._lock:
+            self._counters[(name, labels)] += value
+
+    def observe(self, name, labels, value, buckets=LATENCY_BUCKETS):
+        with self._lock:
+            histogram = self._histograms.get((name, labels))
+            if histogram is None:
+                histogram = self._histograms[(name, labels)] = {'buckets': buckets, 'counts': [0] * (len(buckets) + 1), 'sum': 0.0}
+            histogram['counts'][bisect.bisect_left(buckets, value)] += 1
+            histogram['sum'] += value
+
+    @contextmanager
+    def outbound(self, target):
+        """Times an outbound call; exceptions are counted and re-raised."""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc('outbound_call_errors_total', (('target', target),))
+            raise
+        finally:
+            self.observe('outbound_call_duration_seconds', (('target', target),), time.perf_counter() - started)
+
+    def render(self):
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, dict(value, counts=list(value['counts']))) for key, value in self._histograms.items())
+        by_name = {}
+        for (name, labels), value in counters:
+            by_name.setdefault(name, []).append(f"{name}{format_labels(labels)} {value}")
+        for (name, labels), histogram in histograms:
+            samples = by_name.setdefault(name, [])
+            cumulative = 0
+            for bound, count in zip(histogram['buckets'] + ('+Inf',), histogram['counts']):
+                cumulative += count
+                samples.append(f"{name}_bucket{format_labels(labels + (('le', str(bound)),))} {cumulative}")
+            samples.append(f"{name}_sum{format_labels(labels)} {histogram['sum']}")
+            samples.append(f"{name}_count{format_labels(labels)} {cumulative}")
+        lines = []
+        for name in sorted(by_name):
+            metric_type, description = METRIC_DEFINITIONS[name]
+            lines += [f"# HELP {name} {description}", f"# TYPE {name} {metric_type}"] + by_name[name]
+        return '\n'.join(lines) + '\n'
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    pairs = []
+    for key, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"')
+        pairs.append(f'{key}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+instrumentation = Instrumentation()
+
+class SlowRequestProfiler:
+    def __init__(self, threshold_ms, interval, output_dir):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval
+        self.output_dir = output_dir
+        self._active = {}            # thread id -> Counter of collapsed stacks
+        self._lock = threading.Lock()
+        self._started_pid = None
+
+    def begin(self):
+        self._ensure_sampler()
+        with self._lock:
+            self._active[threading.get_ident()] = Counter()
+
+    def end(self, endpoint, duration):
+        with self._lock:
+            stacks = self._active.pop(threading.get_ident(), None)
+        if stacks and duration >= self.threshold:
+            self._write(endpoint, duration, stacks)
+
+    def _ensure_sampler(self):
+        if self._started_pid == os.getpid():
+            return
+        with self._lock:
+            if self._started_pid == os.getpid():
+                return
+            self._started_pid = os.getpid()
+        threading.Thread(target=self._sample_loop, daemon=True).start()
+
+    def _sample_loop(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                active = list(self._active.items())
+            if not active:
+                continue
+            frames = sys._current_frames()
+            for thread_id, stacks in active:
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    stacks[collapse_stack(frame)] += 1
+
+    def _write(self, endpoint, duration, stacks):
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            file_name = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{endpoint}-{duration * 1000:.0f}ms.folded"
+            with open(os.path.join(self.output_dir, file_name), 'w') as f:
+                for stack, count in stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            instrumentation.inc('slow_request_profiles_total', (('endpoint', endpoint),))
+        except OSError as e:
+            print(f"Could not write request profile: {e}")
+
+def collapse_stack(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+slow_request_profiler = (SlowRequestProfiler(PROFILE_SLOW_REQUESTS_MS, PROFILE_SAMPLE_INTERVAL,
+                                             os.path.join(app.instance_path, 'profiles'))
+                         if PROFILE_SLOW_REQUESTS_MS > 0 else None)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.db_queries, g.db_seconds = 0, 0.0
+    if slow_request_profiler:
+        slow_request_profiler.begin()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.get('request_started')
+    if started is None:
+        return response
+    duration = time.perf_counter() - started
+    endpoint = request.endpoint or 'unmatched'
+    labels = (('endpoint', endpoint),)
+    instrumentation.inc('http_requests_total', labels + (('method', request.method), ('status', str(response.status_code))))
+    instrumentation.observe('http_request_duration_seconds', labels, duration)
+    instrumentation.observe('http_request_db_queries', labels, g.db_queries, QUERY_COUNT_BUCKETS)
+    instrumentation.inc('http_request_db_seconds_total', labels, g.db_seconds)
+    if slow_request_profiler:
+        slow_request_profiler.end(endpoint, duration)
+    return response
+
+@app.teardown_request
+def stop_request_profile(error=None):
+    if slow_request_profiler:
+        slow_request_profiler.end(request.endpoint or 'unmatched', 0) # no-op if after_request already ran
+
+@sa_event.listens_for(Engine, 'before_cursor_execute')
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()
+
+@sa_event.listens_for(Engine, 'after_cursor_execute')
+def record_query_metrics(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - context._query_started
+    instrumentation.observe('db_query_duration_seconds', (), duration)
+    if has_request_context() and 'db_queries' in g:
+        g.db_queries += 1
+        g.db_seconds += duration
 
 
 # --- DATABASE MODELS ---
@@ -48,8 +333,8 @@ class User(db.Model):
 class Feedback(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     text = db.Column(db.String(500), nullable=False)
-    sentiment = db.Column(db.String(50), nullable=False)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    sentiment = db.Column(db.String(50), nullable=False, index=True)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
 class Booking(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -58,6 +343,9 @@ class Booking(db.Model):
     date = db.Column(db.String(20), nullable=False)
     time = db.Column(db.String(10), nullable=False)
     party_size = db.Column(db.Integer, nullable=False)
+    starts_at = db.Column(db.DateTime) # typed copy of date + time, used for availability checks
+    __table_args__ = (db.Index('ix_booking_date_table', 'date', 'table_id'),
+                      db.Index('ix_booking_date_time', 'date', 'time', 'id'))
 
 class DineInOrder(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -70,6 +358,7 @@ class DineInOrder(db.Model):
     status = db.Column(db.String(20), default='preparing') # preparing -> ready -> notified
     estimated_ready_time = db.Column(db.DateTime, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (db.Index('ix_dine_in_order_status_ready_time', 'status', 'estimated_ready_time'),)
 
 class OnlineOrder(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -81,6 +370,110 @@ class OnlineOrder(db.Model):
     total = db.Column(db.Float, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
+class OutboxMail(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(200), nullable=False)
+    recipients = db.Column(db.JSON, nullable=False)
+    body = db.Column(db.Text)
+    html = db.Column(db.Text)
+    status = db.Column(db.String(20), default='pending') # pending -> sending -> sent | failed
+    attempts = db.Column(db.Integer, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_error = db.Column(db.String(500))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+    __table_args__ = (db.Index('ix_outbox_mail_status_next_attempt', 'status', 'next_attempt_at'),)
+
+class OrderLine(db.Model):
+    # One row per cart line of a confirmed order, so sales reports are plain SQL aggregates.
+    id = db.Column(db.Integer, primary_key=True)
+    order_type = db.Column(db.String(10), nullable=False) # 'dine_in' | 'online'
+    order_id = db.Column(db.String(30), nullable=False, index=True)
+    menu_item_id = db.Column(db.Integer)
+    item_name = db.Column(db.String(100), nullable=False)
+    category = db.Column(db.String(20), nullable=False) # menu category (breakfast, ...), or 'other'
+    quantity = db.Column(db.Integer, nullable=False)
+    unit_price = db.Column(db.Float, nullable=False)
+    line_total = db.Column(db.Float, nullable=False)
+    ordered_at = db.Column(db.DateTime, nullable=False, index=True)
+    ordered_hour = db.Column(db.Integer, nullable=False) # local hour of day, 0-23
+
+class TableReservationLedger(db.Model):
+    # Bumping reservation_count locks the row, serializing bookings for the table.
+    table_id = db.Column(db.Integer, primary_key=True)
+    reservation_count = db.Column(db.Integer, nullable=False, default=0)
+
+class IdSequence(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+class IdempotencyKey(db.Model):
+    # The response to an order request that carried a client-supplied key, for replays.
+    id = db.Column(db.Integer, primary_key=True)
+    user_email = db.Column(db.String(120), nullable=False)
+    key = db.Column(db.String(100), nullable=False)
+    request_hash = db.Column(db.String(64), nullable=False)
+    order_id = db.Column(db.String(30), nullable=False)
+    response = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (db.UniqueConstraint('user_email', 'key', name='uq_idempotency_key_user_key'),)
+
+# --- SCHEMA MIGRATIONS ---
+# 'flask upgrade-db' adds missing tables, nullable columns and indexes; --check only lists them.
+def upgrade_schema(dry_run=False):
+    """Adds missing tables, columns and indexes. Returns what was added (or, with dry_run, is missing)."""
+    inspector = sa_inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    changes = [f"table {table.name}" for table in db.metadata.sorted_tables if table.name not in existing_tables]
+    if not dry_run:
+        db.create_all()
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables: # created complete, with its indexes
+                continue
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                if not column.nullable:
+                    raise RuntimeError(f"Cannot add required column {table.name}.{column.name} automatically")
+                if not dry_run:
+                    column_type = column.type.compile(dialect=connection.dialect)
+                    connection.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}')
+                changes.append(f"column {table.name}.{column.name}")
+            existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in sorted(table.indexes, key=lambda index: index.name):
+                if index.name not in existing_indexes:
+                    if not dry_run:
+                        index.create(connection)
+                    changes.append(f"index {index.name}")
+    return changes
+
+def warn_if_schema_outdated():
+    # Name the fix at startup instead of failing every query that reads a missing column.
+    try:
+        missing = [change for change in upgrade_schema(dry_run=True) if not change.startswith('table ')]
+    except Exception as e:
+        print(f"Could not check the database schema: {e}")
+        return
+    if missing:
+        print(f"The database schema is out of date (missing {', '.join(missing)}); run 'flask upgrade-db'.")
+
+@app.cli.command('upgrade-db')
+@click.option('--check', is_flag=True, help='Only list missing tables, columns and indexes; exit 1 if there are any.')
+def upgrade_db_command(check):
+    """Creates missing tables, columns and indexes in the configured database."""
+    changes = upgrade_schema(dry_run=check)
+    for change in changes:
+        click.echo(f"{'Missing' if check else 'Added'} {change}")
+    if not changes:
+        click.echo("Schema is up to date.")
+    elif check:
+        raise SystemExit(1)
+    else:
+        click.echo(f"Applied {len(changes)} changes.")
+
+
 # --- STATIC DATA ---
 MENU_DATA = {
     'breakfast': [
@@ -140,7 +533,6 @@ MENU_DATA = {
         {'id': 48, 'name': 'Cappuccino', 'description': 'Espresso with steamed milk and a thick layer of foam.', 'price': 130, 'base_popularity': 9, 'category': 'hot', 'type': 'coffee'},
     ]
 }
-ALL_MENU_ITEMS = [item for category_items in MENU_DATA.values() for item in category_items]
 TABLE_DATA = [
     {'id': 1, 'name': 'Table 1', 'capacity': 2, 'properties': ['window', 'quiet']},
     {'id': 2, 'name': 'Table 2', 'capacity': 2, 'properties': ['window']},
@@ -149,18 +541,402 @@ TABLE_DATA = [
     {'id': 5, 'name': 'Table 5', 'capacity': 6, 'properties': ['social', 'group']},
     {'id': 6, 'name': 'Table 6', 'capacity': 8, 'properties': ['group', 'private']},
 ]
+TABLES_BY_ID = {table['id']: table for table in TABLE_DATA}
 
-# --- AI HELPER FUNCTIONS ---
-def get_weather_data():
+# --- STATIC ASSETS ---
+# build_assets.py writes hashed, resized and precompressed copies to static/dist/ with a
+# manifest; when it exists static URLs point there, otherwise static/ is served as is.
+ASSET_DIST_DIR = 'dist'
+ASSET_MAX_AGE = 365 * 86400
+MENU_IMAGE_WIDTH = 640 # cards are at most ~320 CSS px wide, so this covers 2x screens
+PRECOMPRESSED_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+def load_asset_manifest():
     try:
-        api_url = f'https://api.open-meteo.com/v1/forecast?latitude=22.57&longitude=88.36&current_weather=true'
-        response = requests.get(api_url, timeout=5)
+        with open(os.path.join(app.static_folder, ASSET_DIST_DIR, 'manifest.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+asset_manifest = {} # filled by create_app()
+
+@app.url_defaults
+def fingerprint_static_urls(endpoint, values):
+    if endpoint == 'static':
+        entry = asset_manifest.get(values.get('filename'))
+        if entry:
+            values['filename'] = entry['path']
+
+def image_urls(filename, width=MENU_IMAGE_WIDTH):
+    """(src, srcset) for an image: the WebP variant for `width` and every WebP width built."""
+    entry = asset_manifest.get(filename)
+    if not entry or 'webp' not in entry:
+        return url_for('static', filename=filename), ''
+    candidates = {int(variant_width): sized['webp'] for variant_width, sized in entry['widths'].items()}
+    candidates[entry['width']] = entry['webp']
+    src = candidates[min((w for w in candidates if w >= width), default=entry['width'])]
+    srcset = ', '.join(f"{url_for('static', filename=path)} {w}w" for w, path in sorted(candidates.items()))
+    return url_for('static', filename=src), srcset
+
+def serve_static(filename):
+    if not filename.startswith(f"{ASSET_DIST_DIR}/"):
+        return app.send_static_file(filename)
+    # Hashed names change whenever the content does, so clients may cache them forever.
+    for encoding, suffix in PRECOMPRESSED_ENCODINGS:
+        if request.accept_encodings[encoding] and os.path.isfile(os.path.join(app.static_folder, filename + suffix)):
+            response = send_from_directory(app.static_folder, filename + suffix, max_age=ASSET_MAX_AGE,
+                                           mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(app.static_folder, filename, max_age=ASSET_MAX_AGE)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+app.view_functions['static'] = serve_static
+
+# --- MENU CATALOG ---
+# The menu is compiled into frozen, indexed MenuItems. MENU_FILE (JSON or YAML) replaces
+# MENU_DATA and is reloaded when it changes.
+MENU_FILE = os.environ.get('MENU_FILE')
+MENU_RELOAD_SECONDS = float(os.environ.get('MENU_RELOAD_SECONDS', 5))
+MENU_REQUIRED_FIELDS = ('id', 'name', 'price', 'base_popularity', 'category', 'type')
+DEFAULT_IMAGE = 'images/logo.png'
+IMAGE_PATHS = {
+    1: 'images/masalaoats.jpg', 2: 'images/pancakes.jpg', 3: 'images/Chicken-Biryani.jpg',
+    4: 'images/vegthali.jpg', 5: 'images/paneer.png', 6: 'images/grilledfish.jpg',
+    7: 'images/coldcoffee.jpg', 8: 'images/masalachai.jpg', 9: 'images/alooparatha.jpg',
+    10: 'images/fruit_smoothie_bowl.jpg', 11: 'images/scrambled_eggs.jpg', 12: 'images/dosa.jpg',
+    13: 'images/french_toast.jpg', 14: 'images/paneer_butter_masala.jpg', 15: 'images/chicken_wrap.jpg',
+    16: 'images/pasta_arrabiata.jpg', 17: 'images/dal_makhani.jpg', 18: 'images/caesar_salad.jpg',
+    19: 'images/mushroom_do_pyaza.jpg', 20: 'images/chicken_korma.jpg', 21: 'images/veg_pulao.jpg',
+    22: 'images/shepherds_pie.jpg', 23: 'images/roasted_chicken.jpg', 24: 'images/fresh_lime_soda.jpg',
+    25: 'images/espresso.jpg', 26: 'images/green_tea.jpg', 27: 'images/mango_lassi.jpg',
+    28: 'images/iced_peach_tea.jpg', 29: 'images/muesli.jpg', 30: 'images/uttapam.jpg',
+    31: 'images/waffles.jpg', 32: 'images/cheela.jpg', 33: 'images/omelette_pav.jpg',
+    34: 'images/rajmachawal.jpg', 35: 'images/quinoa_bowl.jpg', 36: 'images/club_sandwich.jpg',
+    37: 'images/mutter_paneer.jpg', 38: 'images/tuna_melt.jpg', 39: 'images/baingan_bharta.jpg',
+    40: 'images/chicken_stroganoff.jpg', 41: 'images/minestrone_soup.jpg', 42: 'images/tandoori_prawns.jpg',
+    43: 'images/veggie_burger.jpg', 44: 'images/caramel_frappe.jpg', 45: 'images/hot_chocolate.jpg',
+    46: 'images/ginger_tea.jpg', 47: 'images/watermelon_juice.jpg', 48: 'images/cappuccino.jpg',
+}
+
+@dataclass(frozen=True, slots=True)
+class MenuItem:
+    id: int
+    name: str
+    description: str
+    price: float
+    base_popularity: float
+    category: str           # the item's own category, e.g. 'warm' or 'cold'
+    type: str
+    menu_category: str      # the MENU_DATA section it is listed under, e.g. 'breakfast'
+    image_url: str
+    image_srcset: str       # responsive WebP candidates, empty without built assets
+    payload: MappingProxyType # read-only dict served by the JSON APIs
+
+class MenuCatalog:
+    __slots__ = ('version', 'items', 'by_id', 'by_name', 'by_menu_category', 'by_category', 'by_type')
+
+    def __init__(self, sections, version=1):
+        self.version = version
+        items = []
+        with app.test_request_context():
+            for menu_category, section_items in sections.items():
+                for raw_item in section_items:
+                    missing = [field for field in MENU_REQUIRED_FIELDS if field not in raw_item]
+                    if missing:
+                        raise ValueError(f"Menu item {raw_item.get('name', raw_item.get('id'))!r} is missing {', '.join(missing)}")
+                    payload = {key: value for key, value in raw_item.items() if key != 'image'}
+                    payload.setdefault('description', '')
+                    image_path = raw_item.get('image') or IMAGE_PATHS.get(raw_item['id'], DEFAULT_IMAGE)
+                    payload['image_url'], payload['image_srcset'] = image_urls(image_path)
+                    items.append(MenuItem(
+                        id=payload['id'], name=payload['name'], description=payload['description'], price=payload['price'],
+                        base_popularity=payload['base_popularity'], category=payload['category'], type=payload['type'],
+                        menu_category=menu_category, image_url=payload['image_url'], image_srcset=payload['image_srcset'],
+                        payload=MappingProxyType(payload),
+                    ))
+        self.items = tuple(items)
+        self.by_id = {item.id: item for item in items}
+        self.by_name = {item.name: item for item in items}
+        if len(self.by_id) != len(items) or len(self.by_name) != len(items):
+            raise ValueError("Menu item ids and names must be unique")
+        self.by_menu_category = {name: tuple(item for item in items if item.menu_category == name) for name in sections}
+        self.by_category = group_menu_items(items, 'category')
+        self.by_type = group_menu_items(items, 'type')
+
+def group_menu_items(items, field):
+    groups = {}
+    for item in items:
+        groups.setdefault(getattr(item, field), []).append(item)
+    return {key: tuple(group) for key, group in groups.items()}
+
+def load_menu_file(path):
+    with open(path) as f:
+        if path.endswith(('.yaml', '.yml')):
+            import yaml # optional: only needed for YAML menus
+            return yaml.safe_load(f)
+        return json.load(f)
+
+class MenuStore:
+    """Holds the current MenuCatalog and rebuilds it when the menu file changes."""
+
+    def __init__(self, default_sections, menu_file=None, check_interval=MENU_RELOAD_SECONDS):
+        self.default_sections = default_sections
+        self.menu_file = menu_file
+        self.check_interval = check_interval
+        self._catalog = None
+        self._file_stamp = None
+        self._next_check = 0
+        self._lock = threading.Lock()
+
+    def get(self):
+        catalog = self._catalog
+        if catalog is None or (self.menu_file and time.monotonic() >= self._next_check):
+            catalog = self._refresh()
+        return catalog
+
+    def _refresh(self):
+        with self._lock:
+            self._next_check = time.monotonic() + self.check_interval
+            stamp = self._menu_file_stamp()
+            if self._catalog is not None and stamp == self._file_stamp:
+                return self._catalog
+            version = self._catalog.version + 1 if self._catalog else 1
+            try:
+                sections = load_menu_file(self.menu_file) if stamp else self.default_sections
+                catalog = MenuCatalog(sections, version)
+            except (OSError, ValueError, TypeError, AttributeError, ImportError) as e:
+                if self._catalog is None:
+                    raise
+                print(f"Could not reload menu from {self.menu_file}, keeping the current one: {e}")
+                self._file_stamp = stamp # retry once the file changes again
+                return self._catalog
+            self._catalog, self._file_stamp = catalog, stamp
+            return catalog
+
+    def _menu_file_stamp(self):
+        if not self.menu_file:
+            return None
+        try:
+            stat = os.stat(self.menu_file)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+menu_store = MenuStore(MENU_DATA, MENU_FILE)
+
+def get_menu_catalog():
+    return menu_store.get()
+
+# --- WEATHER PROVIDER ---
+# Weather is served from a TTL cache refreshed in the background (on the event loop under
+# asgi.py) and shared between workers through instance/weather_cache.json.
+WEATHER_API_URL = os.environ.get('WEATHER_API_URL', 'https://api.open-meteo.com/v1/forecast?latitude=22.57&longitude=88.36&current_weather=true')
+WEATHER_FALLBACK = {'temperature': 28}
+_http_session = None
+_http_session_lock = threading.Lock()
+_async_http_client = None
+
+def get_http_session():
+    """A pooled requests session for outbound HTTP, created on first use."""
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                import requests
+                _http_session = requests.Session()
+    return _http_session
+
+def get_async_http_client():
+    """A pooled httpx.AsyncClient for outbound HTTP from the event loop, created on first use."""
+    global _async_http_client
+    if _async_http_client is None:
+        import httpx # only needed by the async serving mode
+        _async_http_client = httpx.AsyncClient(timeout=5)
+    return _async_http_client
+
+async def close_async_http_client():
+    global _async_http_client
+    if _async_http_client is not None:
+        client, _async_http_client = _async_http_client, None
+        await client.aclose()
+
+def fetch_open_meteo_weather():
+    with instrumentation.outbound('open_meteo'):
+        response = get_http_session().get(WEATHER_API_URL, timeout=5)
+        response.raise_for_status()
+    data = response.json()
+    return {'temperature': data['current_weather']['temperature']}
+
+async def fetch_open_meteo_weather_async():
+    with instrumentation.outbound('open_meteo'):
+        response = await get_async_http_client().get(WEATHER_API_URL)
         response.raise_for_status()
-        data = response.json()
-        return {'temperature': data['current_weather']['temperature']}
-    except requests.exceptions.RequestException as e:
-        print(f"Could not fetch weather data: {e}")
-        return {'temperature': 28}
+    data = response.json()
+    return {'temperature': data['current_weather']['temperature']}
+
+class WeatherProvider:
+    def __init__(self, backend, ttl=600, max_stale=3 * 3600, cache_file=None):
+        self.backend = backend          # any callable returning {'temperature': ...}
+        self.ttl = ttl                  # seconds a reading counts as fresh
+        self.max_stale = max_stale      # seconds a stale reading may still be served
+        self.cache_file = cache_file
+        self.stats = {'hits': 0, 'misses': 0, 'stale_hits': 0, 'refreshes': 0, 'errors': 0}
+        self._entry = None              # {'data': {...}, 'fetched_at': epoch seconds}
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._refresher_pid = None
+        self._wake_async_refresher = None
+
+    def get(self):
+        refresher_started = self._ensure_refresher()
+        entry = self._current_entry()
+        age = time.time() - entry['fetched_at'] if entry else None
+        if entry and age < self.ttl:
+            self._count('hits')
+            return dict(entry['data'])
+        if not refresher_started: # a refresher that just started fetches on its first pass
+            self.refresh_async()
+        if entry and age < self.max_stale:
+            self._count('stale_hits')
+            return dict(entry['data'])
+        self._count('misses')
+        return dict(WEATHER_FALLBACK)
+
+    def _count(self, key):
+        with self._lock: # request threads and the refresher update these together
+            self.stats[key] += 1
+        instrumentation.inc('weather_cache_events_total', (('event', key),))
+
+    def refresh(self):
+        try:
+            data = self.backend()
+        except Exception as e:
+            self._refresh_failed(e)
+            return None
+        return self._store(data)
+
+    def _refresh_failed(self, error):
+        self._count('errors')
+        print(f"Could not fetch weather data: {error}")
+
+    def _store(self, data):
+        entry = {'data': data, 'fetched_at': time.time()}
+        self._entry = entry
+        self._count('refreshes')
+        self._write_shared(entry)
+        return data
+
+    def refresh_async(self):
+        wake = self._wake_async_refresher
+        if wake:
+            wake()
+            return
+        if self._claim_refresh():
+            threading.Thread(target=self._run_refresh, daemon=True).start()
+
+    def _claim_refresh(self):
+        # One fetch at a time per process, whether the loop or a stale read asked for it.
+        with self._lock:
+            if self._refreshing:
+                return False
+            self._refreshing = True
+            return True
+
+    def _run_refresh(self):
+        try:
+            self.refresh()
+        finally:
+            self._refreshing = False
+
+    def _ensure_refresher(self):
+        """Starts this process's refresh loop if needed. Returns True if it was started now."""
+        # Threads do not survive a fork, so each gunicorn worker starts its own loop.
+        if self._refresher_pid == os.getpid():
+            return False
+        with self._lock:
+            if self._refresher_pid == os.getpid():
+                return False
+            self._refresher_pid = os.getpid()
+        threading.Thread(target=self._refresh_loop, daemon=True).start()
+        return True
+
+    def _refresh_loop(self):
+        while True:
+            entry = self._current_entry()
+            if (not entry or time.time() - entry['fetched_at'] >= self.ttl) and self._claim_refresh():
+                self._run_refresh()
+            time.sleep(max(self.ttl / 2, 1))
+
+    async def refresh_forever_async(self, fetch):
+        """The refresh loop as a task on the running event loop; `fetch` is a coroutine function.
+
+        While it runs, get() starts no refresh thread and a stale read wakes this loop instead.
+        """
+        import asyncio
+        loop = asyncio.get_running_loop()
+        wake = asyncio.Event()
+        self._refresher_pid = os.getpid()
+        self._wake_async_refresher = lambda: loop.call_soon_threadsafe(wake.set)
+        try:
+            while True:
+                wake.clear()
+                entry = self._current_entry()
+                if not entry or time.time() - entry['fetched_at'] >= self.ttl:
+                    try:
+                        self._store(await fetch())
+                    except Exception as e:
+                        self._refresh_failed(e)
+                try:
+                    await asyncio.wait_for(wake.wait(), timeout=max(self.ttl / 2, 1))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._wake_async_refresher = None
+
+    def _current_entry(self):
+        entry = self._entry
+        if entry and time.time() - entry['fetched_at'] < self.ttl:
+            return entry
+        shared = self._read_shared()
+        if shared and (not entry or shared['fetched_at'] > entry['fetched_at']):
+            self._entry = entry = shared
+        return entry
+
+    def _read_shared(self):
+        if not self.cache_file:
+            return None
+        try:
+            with open(self.cache_file) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_shared(self, entry):
+        if not self.cache_file:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            tmp_path = f"{self.cache_file}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self.cache_file)
+        except OSError as e:
+            print(f"Could not write shared weather cache: {e}")
+
+weather_provider = WeatherProvider(
+    fetch_open_meteo_weather,
+    ttl=int(os.environ.get('WEATHER_CACHE_TTL', 600)),
+    cache_file=os.path.join(app.instance_path, 'weather_cache.json'),
+)
+
+# --- AI HELPER FUNCTIONS ---
+def get_weather_data():
+    return weather_provider.get()
 
 def get_local_event():
     if datetime.now().weekday() >= 4:
@@ -168,34 +944,122 @@ def get_local_event():
     if random.random() < 0.1: return 'Gameday'
     return None
 
-def calculate_dynamic_scores(weather, event):
-    temperature = weather.get('temperature', 28)
-    scored_items = []
-    for item in ALL_MENU_ITEMS:
-        item_copy = item.copy()
-        score = item_copy['base_popularity']
-        item_category = item_copy.get('category', '')
-        item_type = item_copy.get('type', '')
-        if temperature < 24:
-            if item_category in ['hot', 'hearty', 'warm']: score += 3
-            if item_type == 'cold': score -= 2
-        elif temperature > 30:
-            if item_category in ['cold', 'light']: score += 3
-            if item_category in ['hot', 'hearty']: score -= 2
+# --- SCORING ENGINE ---
+# Deterministic scores are memoized per (band, event, hour, demand version); the jitter is
+# only applied to items that can still reach the top k.
+SCORE_JITTER = 0.5
+
+def get_temperature_band(temperature):
+    if temperature < 24: return 'cold'
+    if temperature > 30: return 'hot'
+    return 'mild'
+
+GAMEDAY_PICKS = frozenset({'Chicken Biryani', 'Cold Coffee'})
+
+class ScoringEngine:
+    def __init__(self, catalog_source):
+        self.catalog_source = catalog_source
+        self._loaded = (None, [])   # (catalog, features per catalog item)
+        self._ranked_by_context = {}
+
+    def _catalog_features(self):
+        catalog = self.catalog_source()
+        loaded_catalog, features = self._loaded
+        if catalog is not loaded_catalog:
+            features = [self._extract_features(item) for item in catalog.items]
+            self._loaded = (catalog, features)
+        return catalog, features
+
+    @staticmethod
+    def _extract_features(item):
+        return {
+            'base': item.base_popularity,
+            'warm_category': item.category in ('hot', 'hearty', 'warm'),
+            'cold_type': item.type == 'cold',
+            'cool_category': item.category in ('cold', 'light'),
+            'heavy_category': item.category in ('hot', 'hearty'),
+            'festive_type': item.type in ('sweet', 'classic', 'hearty'),
+            'gameday_pick': item.name in GAMEDAY_PICKS,
+        }
+
+    @staticmethod
+    def _base_score(features, band, event):
+        score = features['base']
+        if band == 'cold':
+            if features['warm_category']: score += 3
+            if features['cold_type']: score -= 2
+        elif band == 'hot':
+            if features['cool_category']: score += 3
+            if features['heavy_category']: score -= 2
         if event == 'Festival Weekend':
-            if item_type in ['sweet', 'classic', 'hearty']: score += 4
+            if features['festive_type']: score += 4
         elif event == 'Gameday':
-            if item_copy['name'] in ['Chicken Biryani', 'Cold Coffee']: score += 3
-        item_copy['dynamic_score'] = score + random.uniform(-0.5, 0.5)
-        scored_items.append(item_copy)
-    return scored_items
+            if features['gameday_pick']: score += 3
+        return score
+
+    def ranked(self, band, event):
+        """Items sorted by deterministic score for a context bucket, memoized."""
+        catalog, features = self._catalog_features()
+        hour, versions = popularity_model.current_hour(), (catalog.version, popularity_model.version)
+        key = (band, event, hour, versions)
+        ranked = self._ranked_by_context.get(key)
+        if ranked is None:
+            boosts = popularity_model.boosts(hour)
+            ranked = sorted(
+                ((self._base_score(item_features, band, event) + boosts.get(item.id, 0), item)
+                 for item_features, item in zip(features, catalog.items)),
+                key=lambda pair: pair[0], reverse=True,
+            )
+            # Copy-on-write: request threads read this dict without the lock.
+            fresh = {cached_key: value for cached_key, value in self._ranked_by_context.items()
+                     if cached_key[3] == versions}
+            fresh[key] = ranked
+            self._ranked_by_context = fresh
+        return ranked
+
+    def top_k(self, weather, event, k, exclude_ids=()):
+        popularity_model.start()
+        band = get_temperature_band(weather.get('temperature', 28))
+        candidates = []
+        cutoff = None
+        for score, item in self.ranked(band, event):
+            if item.id in exclude_ids:
+                continue
+            # Anything more than two jitter widths below the k-th score can never overtake it.
+            if cutoff is not None and score < cutoff:
+                break
+            candidates.append((score + random.uniform(-SCORE_JITTER, SCORE_JITTER), item))
+            if len(candidates) == k:
+                cutoff = score - 2 * SCORE_JITTER
+        top = heapq.nlargest(k, candidates, key=lambda pair: pair[0])
+        return [dict(item.payload, dynamic_score=dynamic_score) for dynamic_score, item in top]
+
+scoring_engine = ScoringEngine(get_menu_catalog)
+
+def calculate_dynamic_scores(weather, event):
+    return scoring_engine.top_k(weather, event, len(get_menu_catalog().items))
+
+# --- PRICING SNAPSHOT CACHE ---
+# Prices only change at fixed hours, so each category's payload, and the HTML built from
+# it, is rendered once per pricing window and served with an ETag.
+PRICING_BOUNDARY_HOURS = (0, 13, 14, 16, 18, 21)
+
+def get_pricing_window(now):
+    start_hour = max(hour for hour in PRICING_BOUNDARY_HOURS if hour <= now.hour)
+    window_start = now.replace(hour=start_hour, minute=0, second=0, microsecond=0)
+    next_hours = [hour for hour in PRICING_BOUNDARY_HOURS if hour > now.hour]
+    if next_hours:
+        window_end = window_start.replace(hour=next_hours[0])
+    else:
+        window_end = window_start.replace(hour=0) + timedelta(days=1)
+    return window_start, window_end
 
 def apply_dynamic_pricing(menu_items):
     now = datetime.now()
     current_hour = now.hour
     updated_items = []
     for item in menu_items:
-        new_item = item.copy()
+        new_item = dict(item.payload)
         new_item['original_price'] = new_item['price']
         new_item['price_reason'] = None
         if 16 <= current_hour < 18 and new_item.get('category') == 'drinks' and new_item.get('type') == 'cold':
@@ -210,36 +1074,1684 @@ def apply_dynamic_pricing(menu_items):
         updated_items.append(new_item)
     return updated_items
 
-def get_image_map():
-    return {
-        1: 'images/masalaoats.jpg', 2: 'images/pancakes.jpg', 3: 'images/Chicken-Biryani.jpg',
-        4: 'images/vegthali.jpg', 5: 'images/paneer.png', 6: 'images/grilledfish.jpg',
-        7: 'images/coldcoffee.jpg', 8: 'images/masalachai.jpg', 9: 'images/alooparatha.jpg',
-        10: 'images/fruit_smoothie_bowl.jpg', 11: 'images/scrambled_eggs.jpg', 12: 'images/dosa.jpg',
-        13: 'images/french_toast.jpg', 14: 'images/paneer_butter_masala.jpg', 15: 'images/chicken_wrap.jpg',
-        16: 'images/pasta_arrabiata.jpg', 17: 'images/dal_makhani.jpg', 18: 'images/caesar_salad.jpg',
-        19: 'images/mushroom_do_pyaza.jpg', 20: 'images/chicken_korma.jpg', 21: 'images/veg_pulao.jpg',
-        22: 'images/shepherds_pie.jpg', 23: 'images/roasted_chicken.jpg', 24: 'images/fresh_lime_soda.jpg',
-        25: 'images/espresso.jpg', 26: 'images/green_tea.jpg', 27: 'images/mango_lassi.jpg',
-        28: 'images/iced_peach_tea.jpg', 29: 'images/muesli.jpg', 30: 'images/uttapam.jpg',
-        31: 'images/waffles.jpg', 32: 'images/cheela.jpg', 33: 'images/omelette_pav.jpg',
-        34: 'images/rajmachawal.jpg', 35: 'images/quinoa_bowl.jpg', 36: 'images/club_sandwich.jpg',
-        37: 'images/mutter_paneer.jpg', 38: 'images/tuna_melt.jpg', 39: 'images/baingan_bharta.jpg',
-        40: 'images/chicken_stroganoff.jpg', 41: 'images/minestrone_soup.jpg', 42: 'images/tandoori_prawns.jpg',
-        43: 'images/veggie_burger.jpg', 44: 'images/caramel_frappe.jpg', 45: 'images/hot_chocolate.jpg',
-        46: 'images/ginger_tea.jpg', 47: 'images/watermelon_juice.jpg', 48: 'images/cappuccino.jpg',
-    }
+class PricingSnapshotCache:
+    def __init__(self):
+        self._snapshots = {}
+        self._lock = threading.Lock()
+
+    def get(self, category_name):
+        now = datetime.now()
+        catalog = get_menu_catalog()
+        snapshot = self._snapshots.get(category_name)
+        if (snapshot is None or snapshot['catalog_version'] != catalog.version
+                or not (snapshot['window_start'] <= now < snapshot['window_end'])):
+            snapshot = self._render(catalog, category_name, now)
+            with self._lock:
+                self._snapshots[category_name] = snapshot
+        return snapshot
+
+    def rendered(self, category_name, key, render, snapshot=None):
+        """render(snapshot), cached on the category's snapshot so it expires together with it."""
+        snapshot = snapshot or self.get(category_name)
+        html = snapshot['rendered'].get(key)
+        if html is None:
+            html = snapshot['rendered'][key] = render(snapshot)
+        return html
+
+    def clear(self):
+        with self._lock:
+            self._snapshots.clear()
+
+    @staticmethod
+    def _render(catalog, category_name, now):
+        window_start, window_end = get_pricing_window(now)
+        dynamically_priced_items = apply_dynamic_pricing(catalog.by_menu_category[category_name])
+        body = app.json.dumps({'items': dynamically_priced_items}).encode('utf-8')
+        return {
+            'items': dynamically_priced_items,
+            'body': body,
+            'rendered': {},
+            'etag': hashlib.sha1(body).hexdigest(),
+            'catalog_version': catalog.version,
+            'window_start': window_start,
+            'window_end': window_end,
+        }
+
+pricing_cache = PricingSnapshotCache()
+
+# --- MENU PAGES ---
+# Menu pages are rendered on the server from cached menu_cards.html fragments.
+DINE_IN_MENU_CATEGORIES = ('breakfast', 'lunch', 'dinner', 'drinks')
+
+def menu_cards(category_name, macro_name):
+    """The category's priced items rendered by a menu_cards.html macro."""
+    return pricing_cache.rendered(category_name, macro_name, lambda snapshot: get_template_attribute(
+        'menu_cards.html', macro_name)(snapshot['items']))
+
+def get_todays_specials_data():
+    weather = get_weather_data()
+    event = get_local_event()
+    specials = scoring_engine.top_k(weather, event, 4)
+    context_string = f"Based on the current weather ({weather.get('temperature')}°C) "
+    context_string += f"and a {event}, " if event else "in Kolkata, "
+    context_string += "here are our top picks for you!"
+    return {'specials': specials, 'context': context_string}
+
+def conditional_page(body, last_modified=None, private=False):
+    response = app.response_class(body, mimetype='text/html')
+    response.add_etag()
+    if last_modified:
+        response.last_modified = last_modified.astimezone(timezone.utc)
+    response.cache_control.no_cache = True
+    if private:
+        response.cache_control.private = True
+    return response.make_conditional(request)
+
+def render_category_page(category_name, template_name):
+    # Category pages hold nothing user specific, so the whole page is cached per window.
+    snapshot = pricing_cache.get(category_name)
+    page = pricing_cache.rendered(category_name, template_name, lambda snapshot: render_template(
+        template_name, menu_cards=menu_cards(category_name, 'category_cards')), snapshot)
+    return conditional_page(page, snapshot['window_start'])
+
+# --- MAIL OUTBOX ---
+# Mail is queued in the order's transaction and delivered by worker threads in batches,
+# one SMTP session per batch, with exponential backoff on failure.
+MAIL_RETRY_BASE_SECONDS = 30
+MAIL_CLAIM_LEASE = timedelta(minutes=10)
+MAIL_SESSION_RECONNECTS = 1
+
+def queue_mail(subject, recipients, body=None, html=None):
+    outbox_mail = OutboxMail(subject=subject, recipients=list(recipients), body=body, html=html)
+    db.session.add(outbox_mail)
+    db.session.info['outbox_dirty'] = True
+    return outbox_mail
+
+class MailOutbox:
+    def __init__(self):
+        self.stats = {'sent': 0, 'failed': 0, 'retried': 0, 'delivery_seconds_total': 0.0, 'last_delivery_seconds': None}
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._workers_pid = None
+
+    def wake(self):
+        self.start()
+        self._wakeup.set()
+
+    def metrics(self):
+        depth = OutboxMail.query.filter(OutboxMail.status.in_(['pending', 'sending'])).count()
+        sent = self.stats['sent']
+        return dict(self.stats, queue_depth=depth,
+                    avg_delivery_seconds=self.stats['delivery_seconds_total'] / sent if sent else None)
+
+    def start(self):
+        if self._workers_pid == os.getpid():
+            return
+        with self._lock:
+            if self._workers_pid == os.getpid():
+                return
+            self._workers_pid = os.getpid()
+            for _ in range(app.config['MAIL_OUTBOX_WORKERS']):
+                threading.Thread(target=self._worker_loop, daemon=True).start()
+
+    def _worker_loop(self):
+        while True:
+            self._wakeup.wait(timeout=5)
+            self._wakeup.clear()
+            with app.app_context():
+                try:
+                    while self.deliver_batch():
+                        pass
+                except Exception as e:
+                    print(f"Mail outbox worker error: {e}")
+                finally:
+                    db.session.remove()
+
+    def _claim_batch(self):
+        now = datetime.utcnow()
+        due = (OutboxMail.query
+               .filter(OutboxMail.status.in_(['pending', 'sending']), OutboxMail.next_attempt_at <= now)
+               .order_by(OutboxMail.next_attempt_at)
+               .limit(app.config['MAIL_OUTBOX_BATCH_SIZE']).all())
+        claimed_ids = []
+        for outbox_mail in due:
+            # Conditional update so two workers (or two processes) never claim the same row.
+            claimed = (OutboxMail.query
+                       .filter_by(id=outbox_mail.id, next_attempt_at=outbox_mail.next_attempt_at)
+                       .update({'status': 'sending', 'next_attempt_at': now + MAIL_CLAIM_LEASE}, synchronize_session=False))
+            if claimed:
+                claimed_ids.append(outbox_mail.id)
+        db.session.commit()
+        if not claimed_ids:
+            return []
+        return OutboxMail.query.filter(OutboxMail.id.in_(claimed_ids)).all()
+
+    def deliver_batch(self):
+        """Delivers one batch of due mails over a single SMTP session. Returns the batch size."""
+        batch = self._claim_batch()
+        if not batch:
+            return 0
+        from flask_mail import Message # imported with the mail client, on first delivery
+        pending = deque(batch)
+        reconnects = 0
+        while pending:
+            try:
+                with instrumentation.outbound('smtp_session'), get_mail().connect() as connection:
+                    while pending:
+                        outbox_mail = pending[0]
+                        try:
+                            msg = Message(outbox_mail.subject, recipients=outbox_mail.recipients,
+                                          body=outbox_mail.body, html=outbox_mail.html)
+                            with instrumentation.outbound('smtp_send'):
+                                connection.send(msg)
+                        except Exception as e:
+                            if is_smtp_connection_error(e):
+                                raise
+                            # Refused recipient, rejected content, malformed mail: the session is still good.
+                            print(f"Failed to deliver queued email {outbox_mail.id}: {e}")
+                            self._mark_failed(pending.popleft(), e)
+                            continue
+                        self._mark_sent(pending.popleft())
+            except Exception as e:
+                if pending and reconnects < MAIL_SESSION_RECONNECTS:
+                    reconnects += 1
+                    print(f"SMTP session failed, reconnecting: {e}")
+                    continue
+                print(f"Failed to deliver queued email: {e}")
+                while pending:
+                    self._mark_failed(pending.popleft(), e)
+        db.session.commit()
+        return len(batch)
+
+    def _mark_sent(self, outbox_mail):
+        outbox_mail.status = 'sent'
+        outbox_mail.sent_at = datetime.utcnow()
+        latency = (outbox_mail.sent_at - outbox_mail.created_at).total_seconds()
+        self.stats['sent'] += 1
+        self.stats['delivery_seconds_total'] += latency
+        self.stats['last_delivery_seconds'] = latency
+
+    def _mark_failed(self, outbox_mail, error):
+        outbox_mail.attempts = (outbox_mail.attempts or 0) + 1
+        outbox_mail.last_error = str(error)[:500]
+        if outbox_mail.attempts >= app.config['MAIL_OUTBOX_MAX_ATTEMPTS']:
+            outbox_mail.status = 'failed'
+            self.stats['failed'] += 1
+        else:
+            outbox_mail.status = 'pending'
+            outbox_mail.next_attempt_at = datetime.utcnow() + timedelta(seconds=MAIL_RETRY_BASE_SECONDS * 2 ** (outbox_mail.attempts - 1))
+            self.stats['retried'] += 1
+
+def is_smtp_connection_error(error):
+    """True if the SMTP session is unusable: dropped, timed out, or closed by the server (421)."""
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code == 421
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+mail_outbox = MailOutbox()
+
+@sa_event.listens_for(Session, 'after_commit')
+def _wake_mail_outbox(session):
+    if session.info.pop('outbox_dirty', False):
+        mail_outbox.wake()
+
+# --- KITCHEN SCHEDULING ---
+# A dine-in order's ETA: each unit takes the first free slot at its station (a heap of free
+# times per station). Orders are planned on a copy of the schedule, installed on commit.
+def parse_kitchen_stations(spec):
+    """Parses "stove:8,grill:4" into {'stove': 8, 'grill': 4}."""
+    stations = {}
+    for part in spec.split(','):
+        name, _, slots = part.strip().partition(':')
+        if name:
+            stations[name] = max(int(slots or 1), 1)
+    if not stations:
+        raise ValueError("KITCHEN_STATIONS must name at least one station")
+    return stations
+
+KITCHEN_STATIONS = parse_kitchen_stations(os.environ.get('KITCHEN_STATIONS', 'stove:8,grill:4,cold:2,bar:3'))
+# (station, minutes one unit keeps a slot busy)
+PREP_BY_TYPE = {'fast food': ('grill', 6), 'coffee': ('bar', 2)}
+PREP_BY_CATEGORY = {
+    'hearty': ('stove', 7), 'continental': ('stove', 7), 'classic': ('stove', 6), 'warm': ('stove', 5),
+    'light': ('grill', 7), 'sweet': ('grill', 5), 'cold': ('cold', 3), 'hot': ('bar', 3),
+}
+PREP_STATION_BY_MENU_CATEGORY = {'drinks': 'bar'}
+DEFAULT_PREP = ('stove', 6)
+KITCHEN_ETA_BUCKETS = (60, 300, 600, 900, 1200, 1800, 2700, 3600, 5400)
+
+def item_prep_profile(item):
+    """Returns (station, prep seconds) for one unit of a MenuItem."""
+    station, minutes = PREP_BY_TYPE.get(item.type) or PREP_BY_CATEGORY.get(item.category, DEFAULT_PREP)
+    station = PREP_STATION_BY_MENU_CATEGORY.get(item.menu_category, station)
+    return item.payload.get('station', station), float(item.payload.get('prep_minutes', minutes)) * 60
+
+class KitchenPlan:
+    """A working copy of the kitchen schedule for one order transaction."""
+
+    def __init__(self, scheduler, base):
+        self.scheduler = scheduler
+        self.base = base
+        free_at, self.max_seen_pk, own_pks = base
+        self.free_at = {station: list(times) for station, times in free_at.items()}
+        self.own_pks = set(own_pks)
+        self.orders = []
+        self._synced = False
+
+    def place(self, cart, arrival):
+        """Queues the cart's items behind the current backlog and returns when the last one is done."""
+        ready_at = arrival
+        for station, seconds in self.scheduler.tasks(cart):
+            slots = self.free_at[station]
+            finished_at = max(slots[0], arrival) + timedelta(seconds=seconds)
+            heapq.heapreplace(slots, finished_at)
+            ready_at = max(ready_at, finished_at)
+        return ready_at
+
+    def schedule(self, order):
+        """Sets a new DineInOrder's estimated_ready_time from the kitchen's backlog."""
+        if not self._synced:
+            self.sync()
+        order.estimated_ready_time = self.place(order.items, order.timestamp)
+        self.orders.append(order)
+        instrumentation.observe('kitchen_order_eta_seconds', (),
+                                (order.estimated_ready_time - order.timestamp).total_seconds(), KITCHEN_ETA_BUCKETS)
+
+    def sync(self):
+        # Runs after the sequence row is bumped, so every earlier order is visible.
+        self._synced = True
+        rows = (db.session.query(DineInOrder.id, DineInOrder.items, DineInOrder.timestamp)
+                .filter(DineInOrder.id > self.max_seen_pk, DineInOrder.status == 'preparing',
+                        DineInOrder.estimated_ready_time > datetime.utcnow())
+                .order_by(DineInOrder.id).all())
+        for pk, items, ordered_at in rows:
+            self.max_seen_pk = max(self.max_seen_pk, pk)
+            if pk in self.own_pks:
+                self.own_pks.discard(pk) # planned by this process when it was placed
+            else:
+                self.place(items or [], ordered_at)
+
+class KitchenScheduler:
+    def __init__(self, stations=KITCHEN_STATIONS):
+        self.stations = dict(stations)
+        self.default_station = next(iter(self.stations))
+        # (free times per station, highest order pk synced, pks planned here but not yet synced past)
+        self._state = ({station: [datetime.min] * slots for station, slots in self.stations.items()}, 0, frozenset())
+        self._profiles = (None, {}, {})   # (catalog version, by item id, by item name)
+        self._lock = threading.Lock()
+
+    def begin(self):
+        with self._lock:
+            return KitchenPlan(self, self._state)
+
+    def commit(self, plan):
+        """Installs a plan whose transaction committed, unless the schedule moved on since it began."""
+        if not plan.orders:
+            return
+        own_pks = frozenset(plan.own_pks | {order.id for order in plan.orders})
+        with self._lock:
+            if self._state is plan.base:
+                self._state = (plan.free_at, plan.max_seen_pk, own_pks)
+
+    def tasks(self, cart):
+        """One (station, seconds) task per unit ordered, longest first."""
+        tasks = []
+        for cart_item in cart:
+            station, seconds = self.prep_profile(cart_item)
+            tasks += [(station, seconds)] * max(int(cart_item.get('quantity', 1)), 1)
+        tasks.sort(key=lambda task: task[1], reverse=True)
+        return tasks
+
+    def prep_profile(self, cart_item):
+        catalog = get_menu_catalog()
+        version, by_id, by_name = self._profiles
+        if version != catalog.version:
+            profiles = {item.id: item_prep_profile(item) for item in catalog.items}
+            by_id, by_name = profiles, {item.name: profiles[item.id] for item in catalog.items}
+            self._profiles = (catalog.version, by_id, by_name)
+        station, seconds = (by_id.get(cart_item.get('id')) or by_name.get(cart_item.get('name'))
+                            or (DEFAULT_PREP[0], DEFAULT_PREP[1] * 60))
+        if station not in self.stations:
+            station = self.default_station
+        return station, seconds
+
+kitchen_scheduler = KitchenScheduler()
+
+# --- KITCHEN NOTIFICATIONS ---
+# Kitchen displays get ready orders over SSE. Event ids are "<deadline ms>-<order pk>" on
+# every worker, so a display resumes with Last-Event-ID.
+KITCHEN_EVENT_BACKLOG = 500
+KITCHEN_SYNC_SECONDS = 5
+KITCHEN_KEEPALIVE_SECONDS = 15
+# Streams end after this long and reconnect, so a display never holds a worker for good.
+KITCHEN_STREAM_SECONDS = int(os.environ.get('KITCHEN_STREAM_SECONDS', 60))
+
+def kitchen_event_key(event_id):
+    try:
+        deadline_ms, order_pk = event_id.split('-')
+        return int(deadline_ms), int(order_pk)
+    except (AttributeError, ValueError):
+        return None
+
+class KitchenEventBus:
+    def __init__(self, backlog=KITCHEN_EVENT_BACKLOG):
+        self._recent = deque(maxlen=backlog)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def publish(self, event):
+        with self._lock:
+            self._recent.append(event)
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.put(event)
+
+    def subscribe(self, last_event_id=None):
+        """Returns (subscriber queue, events after last_event_id, id to resume from)."""
+        subscriber = queue.Queue()
+        last_key = kitchen_event_key(last_event_id)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            missed = [event for event in self._recent if last_key and kitchen_event_key(event['id']) > last_key]
+            if self._recent:
+                position = self._recent[-1]['id']
+            else:
+                position = f"{int(time.time() * 1000)}-0"
+        return subscriber, missed, position
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+class ReadyOrderScheduler:
+    def __init__(self, bus):
+        self.bus = bus
+        self._heap = []                 # (estimated_ready_time, order pk, order_id, customer_name)
+        self._scheduled = set()
+        self._max_seen_pk = 0
+        self._condition = threading.Condition()
+        self._release_lock = threading.Lock()
+        self._started_pid = None
+
+    def start(self):
+        if self._started_pid == os.getpid():
+            return
+        with self._condition:
+            if self._started_pid == os.getpid():
+                return
+            self._started_pid = os.getpid()
+            self._heap, self._scheduled, self._max_seen_pk = [], set(), 0
+        # Rebuild the deadline heap from the DB before the first poll is answered.
+        with app.app_context():
+            self._sync_from_db()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def schedule(self, order):
+        self.start()
+        with self._condition:
+            self._push(order.id, order.order_id, order.customer_name, order.estimated_ready_time)
+            self._condition.notify()
+
+    def _push(self, pk, order_id, customer_name, estimated_ready_time):
+        if pk in self._scheduled:
+            return
+        self._scheduled.add(pk)
+        self._max_seen_pk = max(self._max_seen_pk, pk)
+        heapq.heappush(self._heap, (estimated_ready_time, pk, order_id, customer_name))
+
+    def _sync_from_db(self):
+        # One cheap primary-key range query per process picks up orders placed on other workers.
+        new_orders = (db.session.query(DineInOrder.id, DineInOrder.order_id, DineInOrder.customer_name, DineInOrder.estimated_ready_time)
+                      .filter(DineInOrder.id > self._max_seen_pk, DineInOrder.status == 'preparing').all())
+        with self._condition:
+            for row in new_orders:
+                self._push(*row)
+
+    def _pop_due(self, now):
+        due = []
+        with self._condition:
+            while self._heap and self._heap[0][0] <= now:
+                due.append(heapq.heappop(self._heap))
+                self._scheduled.discard(due[-1][1])
+        return due
+
+    def release_due(self):
+        """Marks every order whose deadline has passed as ready. Costs nothing when none are due."""
+        # Serialized so a poll returns only after every due order is committed.
+        with self._release_lock:
+            due = self._pop_due(datetime.utcnow())
+            if due:
+                try:
+                    self._mark_ready(due)
+                except Exception:
+                    # e.g. "database is locked": put them back so the next pass retries them.
+                    db.session.rollback()
+                    self._requeue(due)
+                    raise
+        return len(due)
+
+    def _requeue(self, due):
+        with self._condition:
+            for estimated_ready_time, pk, order_id, customer_name in due:
+                self._push(pk, order_id, customer_name, estimated_ready_time)
+
+    def _run(self):
+        last_sync = time.time()
+        while True:
+            with app.app_context():
+                try:
+                    if time.time() - last_sync >= KITCHEN_SYNC_SECONDS:
+                        self._sync_from_db()
+                        last_sync = time.time()
+                    self.release_due()
+                except Exception as e:
+                    print(f"Kitchen scheduler error: {e}")
+                finally:
+                    db.session.remove()
+            with self._condition:
+                wait_seconds = KITCHEN_SYNC_SECONDS
+                if self._heap:
+                    wait_seconds = min(wait_seconds, max((self._heap[0][0] - datetime.utcnow()).total_seconds(), 0))
+                self._condition.wait(timeout=wait_seconds)
+
+    def _mark_ready(self, due):
+        # Each display listens to one worker, so every worker announces every due order.
+        (DineInOrder.query
+         .filter(DineInOrder.id.in_([pk for _, pk, _, _ in due]), DineInOrder.status == 'preparing')
+         .update({'status': 'ready'}, synchronize_session=False))
+        db.session.commit()
+        for estimated_ready_time, pk, order_id, customer_name in due:
+            self.bus.publish({
+                'id': f"{int(estimated_ready_time.replace(tzinfo=timezone.utc).timestamp() * 1000)}-{pk}",
+                'order_id': order_id,
+                'message': f"Order {order_id} for {customer_name} is ready!",
+            })
+
+kitchen_bus = KitchenEventBus()
+ready_order_scheduler = ReadyOrderScheduler(kitchen_bus)
 
 def check_prepared_orders():
-    now = datetime.utcnow()
-    orders_to_check = DineInOrder.query.filter(
-        DineInOrder.status == 'preparing',
-        DineInOrder.estimated_ready_time <= now
-    ).all()
-    if orders_to_check:
-        for order in orders_to_check:
-            order.status = 'ready'
-        db.session.commit()
+    # An idle poll only checks the in-memory deadline heap.
+    ready_order_scheduler.start()
+    return ready_order_scheduler.release_due()
+
+# --- TABLE AVAILABILITY ---
+# Per day, one sorted list of booking starts per table, so a free check is one bisect.
+# Days are reloaded after a TTL; only today onwards is kept, LRU-capped.
+BOOKING_DURATION = timedelta(hours=2)
+AVAILABILITY_CACHE_TTL = 30
+AVAILABILITY_CACHE_DAYS = int(os.environ.get('AVAILABILITY_CACHE_DAYS', 60))
+
+def parse_booking_datetime(date, time_str):
+    return datetime.strptime(f"{date} {time_str}", '%Y-%m-%d %H:%M')
+
+class TableAvailabilityIndex:
+    def __init__(self, ttl=AVAILABILITY_CACHE_TTL, max_days=AVAILABILITY_CACHE_DAYS):
+        self.ttl = ttl
+        self.max_days = max_days
+        self._days = OrderedDict()      # date -> {'loaded_at': epoch, 'tables': {table_id: [starts_at, ...]}}
+        self._lock = threading.Lock()
+
+    def _load_day(self, date):
+        tables = {}
+        rows = db.session.query(Booking.table_id, Booking.date, Booking.time, Booking.starts_at).filter(Booking.date == date).all()
+        for table_id, booking_date, booking_time, starts_at in rows:
+            tables.setdefault(table_id, []).append(starts_at or parse_booking_datetime(booking_date, booking_time))
+        for starts in tables.values():
+            starts.sort()
+        return {'loaded_at': time.time(), 'tables': tables}
+
+    def _day(self, date):
+        day = self._days.get(date)
+        if day is None or time.time() - day['loaded_at'] >= self.ttl:
+            day = self._load_day(date)
+            self._keep(date, day)
+        else:
+            with self._lock:
+                if date in self._days:
+                    self._days.move_to_end(date)
+        return day
+
+    def _keep(self, date, day):
+        today = datetime.now().strftime('%Y-%m-%d')
+        if date < today:
+            return
+        with self._lock:
+            self._days[date] = day
+            self._days.move_to_end(date)
+            for past_date in [cached for cached in self._days if cached < today]:
+                del self._days[past_date]
+            while len(self._days) > self.max_days:
+                self._days.popitem(last=False)
+
+    @staticmethod
+    def _overlaps(starts, starts_at):
+        # First booking strictly after starts_at - duration; taken if it begins before starts_at + duration.
+        index = bisect.bisect_right(starts, starts_at - BOOKING_DURATION)
+        return index < len(starts) and starts[index] < starts_at + BOOKING_DURATION
+
+    def is_free(self, table_id, starts_at):
+        starts = self._day(starts_at.strftime('%Y-%m-%d'))['tables'].get(table_id, [])
+        return not self._overlaps(starts, starts_at)
+
+    def booked_table_ids(self, starts_at):
+        tables = self._day(starts_at.strftime('%Y-%m-%d'))['tables']
+        return {table_id for table_id, starts in tables.items() if self._overlaps(starts, starts_at)}
+
+    def add(self, table_id, starts_at):
+        day = self._days.get(starts_at.strftime('%Y-%m-%d'))
+        if day is not None:
+            with self._lock:
+                bisect.insort(day['tables'].setdefault(table_id, []), starts_at)
+
+    def remove(self, table_id, starts_at):
+        day = self._days.get(starts_at.strftime('%Y-%m-%d'))
+        if day is not None:
+            with self._lock:
+                starts = day['tables'].get(table_id, [])
+                index = bisect.bisect_left(starts, starts_at)
+                if index < len(starts) and starts[index] == starts_at:
+                    starts.pop(index)
+
+table_availability = TableAvailabilityIndex()
+
+# --- RESERVATION LEDGER ---
+# Bookings bump each table's ledger row (in table order) before checking for overlaps,
+# which holds the row lock until commit. Booking ids come from a sequence row.
+class BookingConflict(Exception):
+    def __init__(self, booking_request):
+        super().__init__(f"Table {booking_request['table_id']} is already booked around {booking_request['date']} {booking_request['time']}")
+        self.booking_request = booking_request
+
+def begin_write_transaction():
+    """Begins the transaction; SQLite has no row locks, so it takes the write lock up front."""
+    connection = db.session.connection()
+    if connection.dialect.name == 'sqlite' and not connection.connection.dbapi_connection.in_transaction:
+        connection.exec_driver_sql('BEGIN IMMEDIATE')
+
+def increment_counter_row(model, key_field, key, counter_field):
+    """Atomically adds one to a counter row, creating it on first use, and returns the new value."""
+    key_column, counter_column = getattr(model, key_field), getattr(model, counter_field)
+    if not model.query.filter(key_column == key).update({counter_field: counter_column + 1}, synchronize_session=False):
+        try:
+            with db.session.begin_nested():
+                db.session.add(model(**{key_field: key, counter_field: 1}))
+            return 1
+        except IntegrityError:
+            model.query.filter(key_column == key).update({counter_field: counter_column + 1}, synchronize_session=False)
+    return db.session.query(counter_column).filter(key_column == key).scalar()
+
+def next_sequence_value(name):
+    return increment_counter_row(IdSequence, 'name', name, 'value')
+
+def parse_booking_request(data):
+    """Validates one booking payload. Returns None if fields are missing; raises ValueError if malformed."""
+    if not isinstance(data, dict):
+        raise ValueError('A booking must be a JSON object')
+    table_id, date, time_str, party_size = data.get('table_id'), data.get('date'), data.get('time'), data.get('party_size')
+    if not all([table_id, date, time_str, party_size]):
+        return None
+    try:
+        return {'table_id': int(table_id), 'date': date, 'time': time_str, 'party_size': int(party_size),
+                'starts_at': parse_booking_datetime(date, time_str)}
+    except TypeError as e: # a list or object where a number or string belongs
+        raise ValueError(str(e))
+
+def has_booking_overlap(table_id, date, starts_at):
+    rows = db.session.query(Booking.date, Booking.time, Booking.starts_at).filter(Booking.date == date, Booking.table_id == table_id).all()
+    for booking_date, booking_time, existing_starts_at in rows:
+        existing_starts_at = existing_starts_at or parse_booking_datetime(booking_date, booking_time)
+        if abs(existing_starts_at - starts_at) < BOOKING_DURATION:
+            return True
+    return False
+
+def reserve_tables(booking_requests):
+    """Adds a Booking per request to the session, all or nothing. Raises BookingConflict."""
+    begin_write_transaction()
+    for table_id in sorted({booking_request['table_id'] for booking_request in booking_requests}):
+        increment_counter_row(TableReservationLedger, 'table_id', table_id, 'reservation_count')
+    bookings = []
+    for booking_request in booking_requests:
+        # Earlier bookings of the same batch are flushed, so they count as overlaps too.
+        if has_booking_overlap(booking_request['table_id'], booking_request['date'], booking_request['starts_at']):
+            raise BookingConflict(booking_request)
+        booking = Booking(booking_id=f"BNB-{next_sequence_value('booking'):05d}", table_id=booking_request['table_id'],
+                          date=booking_request['date'], time=booking_request['time'],
+                          party_size=booking_request['party_size'], starts_at=booking_request['starts_at'])
+        db.session.add(booking)
+        db.session.flush()
+        bookings.append(booking)
+    return bookings
+
+def queue_booking_confirmation(booking, user_email):
+    table_name = TABLES_BY_ID.get(booking.table_id, {}).get('name', 'your booked table')
+    queue_mail("Your Table Booking at Brew & Bite is Confirmed!", [user_email],
+               body=f"Hello,\n\nYour booking for {table_name} on {booking.date} at {booking.time} for {booking.party_size} guests is confirmed.\nYour Booking ID is: {booking.booking_id}\n\nWe look forward to seeing you!\n- The Brew & Bite Team")
+    return table_name
+
+# --- SENTIMENT ANALYSIS ---
+# One VADER analyzer per process; bulk rescoring runs in chunks across a process pool.
+SENTIMENT_CHUNK_SIZE = 1000
+_sentiment_analyzer = None
+_sentiment_analyzer_lock = threading.Lock()
+
+def get_sentiment_analyzer():
+    global _sentiment_analyzer
+    if _sentiment_analyzer is None:
+        with _sentiment_analyzer_lock:
+            if _sentiment_analyzer is None:
+                from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+                _sentiment_analyzer = SentimentIntensityAnalyzer()
+    return _sentiment_analyzer
+
+def classify_sentiment(text):
+    score = get_sentiment_analyzer().polarity_scores(text)
+    return 'Positive' if score['compound'] >= 0.05 else 'Negative' if score['compound'] <= -0.05 else 'Neutral'
+
+def classify_sentiment_chunk(texts):
+    return [classify_sentiment(text) for text in texts]
+
+def _score_chunks(chunks, workers):
+    """Yields (chunk, labels) pairs, scoring chunks in a process pool when workers > 1."""
+    if workers <= 1:
+        for chunk in chunks:
+            yield chunk, classify_sentiment_chunk([text for _, text in chunk])
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append((chunk, pool.submit(classify_sentiment_chunk, [text for _, text in chunk])))
+            if len(pending) > workers * 2: # bounded read-ahead keeps memory flat
+                chunk, future = pending.popleft()
+                yield chunk, future.result()
+        while pending:
+            chunk, future = pending.popleft()
+            yield chunk, future.result()
+
+def _iter_feedback_chunks(chunk_size):
+    last_id = 0
+    while True:
+        chunk = (db.session.query(Feedback.id, Feedback.text, Feedback.sentiment)
+                 .filter(Feedback.id > last_id).order_by(Feedback.id).limit(chunk_size).all())
+        if not chunk:
+            return
+        last_id = chunk[-1][0]
+        yield chunk
+
+def rescore_feedback(chunk_size=SENTIMENT_CHUNK_SIZE, workers=os.cpu_count()):
+    """Re-runs sentiment over the whole Feedback table. Returns (rows scored, rows changed)."""
+    scored = changed = 0
+    current_labels = {}
+    def chunks():
+        for chunk in _iter_feedback_chunks(chunk_size):
+            current_labels.update((feedback_id, sentiment) for feedback_id, _, sentiment in chunk)
+            yield [(feedback_id, text) for feedback_id, text, _ in chunk]
+    for chunk, labels in _score_chunks(chunks(), workers):
+        updates = [{'id': feedback_id, 'sentiment': label}
+                   for (feedback_id, _), label in zip(chunk, labels) if current_labels.pop(feedback_id) != label]
+        if updates:
+            db.session.execute(sa_update(Feedback), updates)
+            db.session.commit()
+        scored += len(chunk)
+        changed += len(updates)
+    return scored, changed
+
+def score_reviews_csv(path, text_column='text', import_rows=False, chunk_size=SENTIMENT_CHUNK_SIZE, workers=os.cpu_count()):
+    """Scores a CSV of reviews. Returns a Counter of labels; with import_rows, also stores them as Feedback."""
+    counts = Counter()
+    def chunks():
+        with open(path, newline='', encoding='utf-8') as f:
+            chunk = []
+            for row in csv.DictReader(f):
+                text = (row.get(text_column) or '').strip()[:500]
+                if text:
+                    chunk.append((None, text))
+                if len(chunk) == chunk_size:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+    for chunk, labels in _score_chunks(chunks(), workers):
+        counts.update(labels)
+        if import_rows:
+            db.session.execute(sa_insert(Feedback), [{'text': text, 'sentiment': label, 'timestamp': datetime.utcnow()}
+                                                     for (_, text), label in zip(chunk, labels)])
+            db.session.commit()
+    return counts
+
+@app.cli.command('rescore-feedback')
+@click.option('--chunk-size', default=SENTIMENT_CHUNK_SIZE, show_default=True)
+@click.option('--workers', default=os.cpu_count(), show_default=True)
+def rescore_feedback_command(chunk_size, workers):
+    """Re-run sentiment analysis over all stored feedback."""
+    scored, changed = rescore_feedback(chunk_size, workers)
+    click.echo(f"Scored {scored} feedback entries, {changed} changed sentiment.")
+
+@app.cli.command('score-reviews')
+@click.argument('csv_path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--text-column', default='text', show_default=True)
+@click.option('--import', 'import_rows', is_flag=True, help='Also store the reviews as Feedback rows.')
+@click.option('--workers', default=os.cpu_count(), show_default=True)
+def score_reviews_command(csv_path, text_column, import_rows, workers):
+    """Score a CSV file of reviews (optionally importing them as feedback)."""
+    counts = score_reviews_csv(csv_path, text_column, import_rows, workers=workers)
+    click.echo(', '.join(f"{label}: {counts[label]}" for label in ('Positive', 'Neutral', 'Negative')))
+
+# --- ADMIN DASHBOARD DATA ---
+# Feedback and booking lists are keyset-paginated JSON endpoints.
+ADMIN_PAGE_SIZE = 20
+ADMIN_MAX_PAGE_SIZE = 100
+
+def get_sentiment_counts():
+    counts = Counter(archive_manifest.table('feedback').get('sentiments', {}))
+    counts.update(dict(db.session.query(Feedback.sentiment, db.func.count(Feedback.id)).group_by(Feedback.sentiment).all()))
+    positive_count, negative_count = counts.get('Positive', 0), counts.get('Negative', 0)
+    total_count = sum(counts.values())
+    return {'positive_count': positive_count, 'negative_count': negative_count,
+            'neutral_count': total_count - positive_count - negative_count, 'total_count': total_count}
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, default=str).encode()).decode()
+
+def decode_cursor(cursor, size, parse_key=None):
+    """The sort key a cursor holds. Raises ValueError for anything encode_cursor did not produce."""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(key, list) or len(key) != size or not all(isinstance(value, (str, int, float)) for value in key):
+            raise ValueError(cursor)
+        return parse_key(key) if parse_key else key
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+def keyset_page(query, sort_columns, cursor, limit, parse_key=None):
+    """Returns (rows, next_cursor) for a query sorted descending on sort_columns (last one unique).
+
+    Raises ValueError if the cursor is not one this function handed out.
+    """
+    if cursor:
+        key = decode_cursor(cursor, len(sort_columns), parse_key)
+        # (a, b, c) < (x, y, z), spelled out so it works on every backend.
+        conditions = []
+        for position, column in enumerate(sort_columns):
+            equal_prefix = [sort_columns[i] == key[i] for i in range(position)]
+            conditions.append(db.and_(*equal_prefix, column < key[position]))
+        query = query.filter(db.or_(*conditions))
+    rows = query.order_by(*[column.desc() for column in sort_columns]).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([getattr(rows[-1], column.key) for column in sort_columns])
+    return rows, next_cursor
+
+def get_page_size():
+    return max(1, min(request.args.get('limit', ADMIN_PAGE_SIZE, type=int), ADMIN_MAX_PAGE_SIZE))
+
+# --- SALES REPORTING ---
+# One OrderLine row per cart line, so sales reports are GROUP BY queries.
+# 'flask backfill-order-lines' fills it in for older orders.
+REPORTING_UTC_OFFSET = timedelta(minutes=int(os.environ.get('REPORTING_UTC_OFFSET_MINUTES', 330)))
+REPORT_DEFAULT_DAYS = 7
+BACKFILL_CHUNK_SIZE = 2000
+ORDER_MODELS = {'dine_in': DineInOrder, 'online': OnlineOrder}
+
+def build_order_lines(order_type, order_id, items, ordered_at):
+    ordered_hour = (ordered_at + REPORTING_UTC_OFFSET).hour
+    menu_items = get_menu_catalog().by_id
+    lines = []
+    for item in items:
+        quantity, unit_price = item['quantity'], item['price']
+        menu_item = menu_items.get(item.get('id'))
+        lines.append({
+            'order_type': order_type, 'order_id': order_id, 'menu_item_id': menu_item.id if menu_item else None,
+            'item_name': item['name'], 'category': menu_item.menu_category if menu_item else 'other',
+            'quantity': quantity, 'unit_price': unit_price, 'line_total': unit_price * quantity,
+            'ordered_at': ordered_at, 'ordered_hour': ordered_hour,
+        })
+    return lines
+
+def record_order_lines(order_type, order):
+    lines = build_order_lines(order_type, order.order_id, order.items, order.timestamp)
+    if lines:
+        db.session.execute(sa_insert(OrderLine), lines)
+
+def backfill_order_lines(chunk_size=BACKFILL_CHUNK_SIZE):
+    """Writes OrderLine rows for orders that have none yet. Returns {order_type: orders backfilled}."""
+    backfilled = {}
+    for order_type, model in ORDER_MODELS.items():
+        has_lines = db.exists().where(OrderLine.order_type == order_type, OrderLine.order_id == model.order_id)
+        last_id, count = 0, 0
+        while True:
+            chunk = (db.session.query(model.id, model.order_id, model.items, model.timestamp)
+                     .filter(model.id > last_id, ~has_lines).order_by(model.id).limit(chunk_size).all())
+            if not chunk:
+                break
+            lines = [line for _, order_id, items, ordered_at in chunk
+                     for line in build_order_lines(order_type, order_id, items or [], ordered_at)]
+            if lines:
+                db.session.execute(sa_insert(OrderLine), lines)
+            db.session.commit()
+            last_id = chunk[-1][0]
+            count += len(chunk)
+        backfilled[order_type] = count
+    return backfilled
+
+def get_report_range():
+    """Reads ?start=YYYY-MM-DD&end=YYYY-MM-DD (end inclusive, local dates), defaulting to the last week."""
+    today = (datetime.utcnow() + REPORTING_UTC_OFFSET).date()
+    start = request.args.get('start', (today - timedelta(days=REPORT_DEFAULT_DAYS - 1)).isoformat())
+    end = request.args.get('end', today.isoformat())
+    start_at = datetime.fromisoformat(start) - REPORTING_UTC_OFFSET
+    end_at = datetime.fromisoformat(end) + timedelta(days=1) - REPORTING_UTC_OFFSET
+    return start_at, end_at
+
+def sales_report(group_columns, start_at, end_at, order_by_revenue=True, limit=None):
+    revenue = db.func.sum(OrderLine.line_total).label('revenue')
+    query = (db.session.query(*group_columns, db.func.sum(OrderLine.quantity).label('quantity'), revenue,
+                              db.func.count(db.distinct(OrderLine.order_id)).label('orders'))
+             .filter(OrderLine.ordered_at >= start_at, OrderLine.ordered_at < end_at)
+             .group_by(*group_columns))
+    query = query.order_by(revenue.desc()) if order_by_revenue else query.order_by(*group_columns)
+    if limit:
+        query = query.limit(limit)
+    return [row._asdict() for row in query.all()]
+
+@app.cli.command('backfill-order-lines')
+@click.option('--chunk-size', default=BACKFILL_CHUNK_SIZE, show_default=True)
+def backfill_order_lines_command(chunk_size):
+    """Populate the order_line reporting table from existing orders."""
+    backfilled = backfill_order_lines(chunk_size)
+    click.echo(', '.join(f"{order_type}: {count} orders" for order_type, count in backfilled.items()))
+
+# --- ARCHIVE ---
+# 'flask archive' moves old rows into monthly gzip JSONL partitions under ARCHIVE_DIR.
+# journal.json makes each chunk crash-safe; manifest.json keeps the archived counts.
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', os.path.join(app.instance_path, 'archive'))
+ARCHIVE_RETENTION_DAYS = int(os.environ.get('ARCHIVE_RETENTION_DAYS', 365))
+ARCHIVE_CHUNK_SIZE = 5000
+EXPORT_CHUNK_SIZE = 1000
+EXPORT_BUFFER_BYTES = 64 * 1024
+EXPORT_FORMATS = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+ARCHIVED_TABLES = {
+    'dine_in_order': (DineInOrder, DineInOrder.timestamp),
+    'online_order': (OnlineOrder, OnlineOrder.timestamp),
+    'booking': (Booking, Booking.date), # 'YYYY-MM-DD' strings, which sort like the dates
+    'feedback': (Feedback, Feedback.timestamp),
+}
+
+class ArchiveBusy(Exception):
+    pass
+
+def archive_path(*parts):
+    return os.path.join(ARCHIVE_DIR, *parts)
+
+def open_archive_lock(shared=False):
+    """The lock file, locked: exclusively for an archive run, shared by exports (so an export never
+    sees a chunk half-moved). Closing the file releases the lock."""
+    import fcntl
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    lock_file = open(archive_path('.lock'), 'a')
+    try:
+        fcntl.flock(lock_file, (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        raise ArchiveBusy()
+    return lock_file
+
+def write_json_atomic(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def read_json_file(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def archive_record(row):
+    """A row mapping as a JSON-ready dict; datetimes become ISO strings."""
+    return {key: value.isoformat() if isinstance(value, datetime) else value for key, value in row.items()}
+
+def partition_month(value):
+    return value.strftime('%Y-%m') if isinstance(value, datetime) else value[:7]
+
+def column_bound(column, moment):
+    """`moment` in the column's terms: a datetime, or an ISO date for the string date columns."""
+    return moment if isinstance(column.type, db.DateTime) else moment.date().isoformat()
+
+class ArchiveManifest:
+    """Archived row counts per table, month and (feedback) sentiment; re-read only when the file changes."""
+
+    def __init__(self, path):
+        self.path = path
+        self._cached = (None, {})
+
+    def load(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return {}
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if self._cached[0] != stamp:
+            self._cached = (stamp, read_json_file(self.path) or {})
+        return self._cached[1]
+
+    def table(self, name):
+        return self.load().get('tables', {}).get(name, {})
+
+    def apply(self, journal):
+        """Adds a journaled chunk's counts, once: 'applied' remembers the last chunk added."""
+        manifest = json.loads(json.dumps(self.load())) # a private copy to change
+        if manifest.get('applied') == journal['chunk']:
+            return
+        table = manifest.setdefault('tables', {}).setdefault(journal['table'], {'rows': 0, 'months': {}})
+        table['rows'] += len(journal['ids'])
+        for month, count in journal['months'].items():
+            table['months'][month] = table['months'].get(month, 0) + count
+        if journal['sentiments']:
+            sentiments = table.setdefault('sentiments', {})
+            for sentiment, count in journal['sentiments'].items():
+                sentiments[sentiment] = sentiments.get(sentiment, 0) + count
+        manifest['applied'] = journal['chunk']
+        write_json_atomic(self.path, manifest)
+
+archive_manifest = ArchiveManifest(archive_path('manifest.json'))
+
+def recover_archive_journal():
+    """Finishes or rolls back the chunk an interrupted run left behind. Returns what was done, if anything."""
+    journal_path = archive_path('journal.json')
+    journal = read_json_file(journal_path)
+    if journal is None or archive_manifest.load().get('applied') == journal['chunk']:
+        return None
+    model, _ = ARCHIVED_TABLES[journal['table']]
+    if db.session.query(model.id).filter(model.id.in_(journal['ids'])).first():
+        # The delete never committed: cut the partitions back to where the chunk began.
+        for path, size in journal['sizes'].items():
+            if size:
+                with open(path, 'r+b') as f:
+                    f.truncate(size)
+            elif os.path.exists(path):
+                os.remove(path)
+        os.remove(journal_path)
+        outcome = 'rolled back'
+    else:
+        archive_manifest.apply(journal)
+        outcome = 'completed'
+    return f"{outcome} an interrupted {journal['table']} chunk of {len(journal['ids'])} rows"
+
+def archive_chunk(name, rows, column_key):
+    model, _ = ARCHIVED_TABLES[name]
+    by_month = {}
+    for row in rows:
+        by_month.setdefault(partition_month(row[column_key]), []).append(archive_record(row))
+    os.makedirs(archive_path(name), exist_ok=True)
+    paths = {month: archive_path(name, f"{month}.jsonl.gz") for month in by_month}
+    journal = {
+        'chunk': f"{name}:{rows[0]['id']}-{rows[-1]['id']}:{time.time_ns()}", 'table': name,
+        'ids': [row['id'] for row in rows],
+        'sizes': {path: os.path.getsize(path) if os.path.exists(path) else 0 for path in paths.values()},
+        'months': {month: len(records) for month, records in by_month.items()},
+        'sentiments': dict(Counter(row['sentiment'] for row in rows)) if name == 'feedback' else {},
+    }
+    write_json_atomic(archive_path('journal.json'), journal)
+    for month, records in by_month.items():
+        data = ''.join(json.dumps(record) + '\n' for record in records).encode()
+        with open(paths[month], 'ab') as f:
+            f.write(gzip.compress(data, mtime=0))
+            f.flush()
+            os.fsync(f.fileno())
+    model.query.filter(model.id.in_(journal['ids'])).delete(synchronize_session=False)
+    db.session.commit()
+    archive_manifest.apply(journal) # marks the journal done; it is overwritten by the next chunk
+
+def archive_old_rows(retention_days=ARCHIVE_RETENTION_DAYS, chunk_size=ARCHIVE_CHUNK_SIZE, dry_run=False):
+    """Moves rows older than the retention window into the archive. Returns {table: rows moved (or due)}."""
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    moved = {}
+    with open_archive_lock():
+        recovered = recover_archive_journal()
+        if recovered:
+            print(f"Archive: {recovered}")
+        if not dry_run:
+            backfill_order_lines() # archived orders keep counting in the sales reports
+        for name, (model, column) in ARCHIVED_TABLES.items():
+            table = model.__table__
+            # Keep the newest row so SQLite never reuses an archived id.
+            newest_id = db.session.query(db.func.max(model.id)).scalar() or 0
+            is_old = db.and_(table.c.id < newest_id, table.c[column.key] < column_bound(column, cutoff))
+            if dry_run:
+                moved[name] = db.session.query(db.func.count()).select_from(table).filter(is_old).scalar()
+                continue
+            count = 0
+            while True:
+                rows = db.session.execute(sa_select(table).where(is_old).order_by(table.c.id).limit(chunk_size)).mappings().all()
+                if not rows:
+                    break
+                archive_chunk(name, rows, column.key)
+                count += len(rows)
+            moved[name] = count
+    return moved
+
+def vacuum_database():
+    """Compacts a SQLite file after rows were deleted. Returns (bytes before, bytes after), or None on other backends."""
+    if db.engine.dialect.name != 'sqlite':
+        return None
+    path = db.engine.url.database
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        # In WAL mode the pages are only in the main file once checkpointed.
+        connection.exec_driver_sql('PRAGMA wal_checkpoint(TRUNCATE)')
+        before = os.path.getsize(path)
+        connection.exec_driver_sql('VACUUM')
+        connection.exec_driver_sql('PRAGMA wal_checkpoint(TRUNCATE)')
+    return before, os.path.getsize(path)
+
+@app.cli.command('archive')
+@click.option('--retention-days', default=ARCHIVE_RETENTION_DAYS, show_default=True, help='Keep rows this recent in the live database.')
+@click.option('--chunk-size', default=ARCHIVE_CHUNK_SIZE, show_default=True)
+@click.option('--dry-run', is_flag=True, help='Only count the rows that would be archived.')
+@click.option('--vacuum/--no-vacuum', default=True, show_default=True, help='Compact the SQLite file afterwards.')
+def archive_command(retention_days, chunk_size, dry_run, vacuum):
+    """Move orders, bookings and feedback older than the retention window into the archive."""
+    try:
+        moved = archive_old_rows(retention_days, chunk_size, dry_run)
+    except ArchiveBusy:
+        raise click.ClickException('Another archive run is in progress.')
+    click.echo(', '.join(f"{name}: {count} rows" for name, count in moved.items()) + (' due' if dry_run else ' archived'))
+    if vacuum and not dry_run and any(moved.values()):
+        sizes = vacuum_database()
+        if sizes:
+            click.echo(f"Database file: {sizes[0] / 1e6:.1f} MB -> {sizes[1] / 1e6:.1f} MB")
+
+def iter_archived_records(name, start=None, end=None):
+    """Archived rows of a table, oldest month first. start/end are ISO dates (end exclusive)."""
+    directory = archive_path(name)
+    try:
+        filenames = sorted(filename for filename in os.listdir(directory) if filename.endswith('.jsonl.gz'))
+    except FileNotFoundError:
+        return
+    _, column = ARCHIVED_TABLES[name]
+    for filename in filenames:
+        month = filename[:7]
+        if (start and month < start[:7]) or (end and month > end[:7]):
+            continue
+        try:
+            with gzip.open(os.path.join(directory, filename), 'rt', encoding='utf-8') as f:
+                for line in f:
+                    record = json.loads(line)
+                    value = record[column.key]
+                    if (start and value < start) or (end and value >= end):
+                        continue
+                    yield record
+        except (EOFError, gzip.BadGzipFile) as e:
+            # A chunk cut short by a crash; the next archive run truncates it away.
+            print(f"Skipping the damaged tail of {name}/{filename}: {e}")
+
+def iter_live_records(name, start=None, end=None, chunk_size=EXPORT_CHUNK_SIZE):
+    model, column = ARCHIVED_TABLES[name]
+    table = model.__table__
+    conditions = []
+    if start:
+        conditions.append(table.c[column.key] >= column_bound(column, datetime.fromisoformat(start)))
+    if end:
+        conditions.append(table.c[column.key] < column_bound(column, datetime.fromisoformat(end)))
+    last_id = 0
+    while True:
+        rows = (db.session.execute(sa_select(table).where(table.c.id > last_id, *conditions)
+                                   .order_by(table.c.id).limit(chunk_size)).mappings().all())
+        db.session.commit() # no read transaction held open across chunks (it would pin the WAL)
+        if not rows:
+            return
+        for row in rows:
+            yield archive_record(row)
+        last_id = rows[-1]['id']
+
+def export_chunks(name, records, export_format):
+    """Encodes records as CSV (with a header row) or JSONL, in buffers of about EXPORT_BUFFER_BYTES."""
+    buffer = io.StringIO()
+    if export_format == 'csv':
+        columns = [column.name for column in ARCHIVED_TABLES[name][0].__table__.columns]
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        write = lambda record: writer.writerow([json.dumps(value) if isinstance(value, (dict, list)) else value
+                                                for value in (record.get(column) for column in columns)])
+    else:
+        write = lambda record: buffer.write(json.dumps(record) + '\n')
+    for record in records:
+        write(record)
+        if buffer.tell() >= EXPORT_BUFFER_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def get_export_range():
+    """Reads ?start=YYYY-MM-DD&end=YYYY-MM-DD (UTC dates, end inclusive) as (start, exclusive end), either may be None."""
+    start, end = request.args.get('start'), request.args.get('end')
+    if start:
+        start = datetime.fromisoformat(start).date().isoformat()
+    if end:
+        end = (datetime.fromisoformat(end).date() + timedelta(days=1)).isoformat()
+    return start, end
+
+# --- DEMAND MODEL ---
+# PopularityModel: forward-decayed sales per (menu item, local hour), used to boost specials.
+# OrderLineFollower models follow order_line by id and snapshot to disk for restarts.
+POPULARITY_HALF_LIFE_DAYS = float(os.environ.get('POPULARITY_HALF_LIFE_DAYS', 7))
+POPULARITY_MAX_BOOST = 3.0
+POPULARITY_HOUR_WEIGHT = 0.7 # share of the boost from this hour's sales vs. the whole day's
+ORDER_LINE_SYNC_SECONDS = 60
+ORDER_LINE_SYNC_CHUNK = 5000
+HOURS_PER_DAY = 24
+
+class OrderLineFollower(ABC):
+    """Base for in-memory models fed by order_line rows; subclasses implement the abstract hooks."""
+    name = 'model'
+
+    def __init__(self, snapshot_file=None):
+        self.snapshot_file = snapshot_file
+        self.version = 0
+        self.last_line_id = 0
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._started_pid = None
+
+    @abstractmethod
+    def _apply(self, rows):
+        """Folds a batch of (id, order_id, menu_item_id, ordered_hour, quantity, ordered_at) rows in."""
+
+    @abstractmethod
+    def _snapshot_state(self):
+        """Returns (header dict, payload bytes) describing the model."""
+
+    @abstractmethod
+    def _restore_state(self, header, payload):
+        """Loads a snapshot; returns False if it does not fit the current menu/config."""
+
+    def _changed(self):
+        """Called (under the lock) whenever the model's contents change."""
+
+    def sync(self):
+        """Applies order lines added since the last sync. Returns the number of lines applied."""
+        self.start() # the first sync in a process restores the snapshot before replaying
+        return self._follow()
+
+    def _follow(self):
+        applied = 0
+        with self._lock:
+            while True:
+                rows = (db.session.query(OrderLine.id, OrderLine.order_id, OrderLine.menu_item_id, OrderLine.ordered_hour,
+                                         OrderLine.quantity, OrderLine.ordered_at)
+                        .filter(OrderLine.id > self.last_line_id).order_by(OrderLine.id).limit(ORDER_LINE_SYNC_CHUNK).all())
+                full_chunk = len(rows) == ORDER_LINE_SYNC_CHUNK
+                if full_chunk and rows[0][1] != rows[-1][1]:
+                    # An order's lines are inserted together; leave a partly fetched last order for the next chunk.
+                    last_order_id = rows[-1][1]
+                    while rows[-1][1] == last_order_id:
+                        rows.pop()
+                if rows:
+                    self._apply(rows)
+                    self.last_line_id = rows[-1][0]
+                applied += len(rows)
+                if not full_chunk:
+                    break
+            if applied:
+                self.version += 1
+                self._changed()
+        return applied
+
+    def save_snapshot(self):
+        if not self.snapshot_file:
+            return
+        with self._lock:
+            header, payload = self._snapshot_state()
+            header['last_line_id'] = self.last_line_id
+            data = json.dumps(header).encode() + b'\n' + payload
+        try:
+            os.makedirs(os.path.dirname(self.snapshot_file), exist_ok=True)
+            tmp_path = f"{self.snapshot_file}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self.snapshot_file)
+        except OSError as e:
+            print(f"Could not write {self.name} snapshot: {e}")
+
+    def load_snapshot(self):
+        try:
+            with open(self.snapshot_file, 'rb') as f:
+                header_line, payload = f.read().split(b'\n', 1)
+            header = json.loads(header_line)
+        except (OSError, TypeError, ValueError):
+            return False
+        with self._lock:
+            if not self._restore_state(header, payload):
+                return False # the menu or the config changed: replay from the order lines instead
+            self.last_line_id = header['last_line_id']
+            self.version += 1
+            self._changed()
+        return True
+
+    def load(self):
+        """Restores the snapshot and replays newer order lines, once; warm_caches() does it at startup."""
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            with app.app_context():
+                self.load_snapshot()
+                try:
+                    self._follow()
+                except Exception as e:
+                    print(f"Could not load order history for {self.name}: {e}")
+
+    def start(self):
+        # Forked workers inherit the loaded model and only need their own sync thread.
+        if self._started_pid == os.getpid():
+            return
+        self.load()
+        with self._lock:
+            if self._started_pid == os.getpid():
+                return
+            self._started_pid = os.getpid()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(ORDER_LINE_SYNC_SECONDS)
+            with app.app_context():
+                try:
+                    if self.sync():
+                        self.save_snapshot()
+                except Exception as e:
+                    print(f"{self.name.capitalize()} sync error: {e}")
+                finally:
+                    db.session.remove()
+
+class PopularityModel(OrderLineFollower):
+    name = 'popularity'
+
+    def __init__(self, half_life_days, snapshot_file=None):
+        super().__init__(snapshot_file)
+        self.item_ids = []  # menu item ids in slot order; a slot is added the first time an id sells
+        self._index = {}
+        self._tau = half_life_days * 86400 / math.log(2)
+        self._t0 = time.time()
+        self._hour_counts = array('d')
+        self._day_counts = array('d')
+        self._boost_cache = {}
+
+    @staticmethod
+    def current_hour():
+        return (datetime.utcnow() + REPORTING_UTC_OFFSET).hour
+
+    def _apply(self, rows):
+        for _, _, menu_item_id, hour, quantity, ordered_at in rows:
+            if menu_item_id is None:
+                continue
+            position = self._index.get(menu_item_id)
+            if position is None:
+                position = self._add_slot(menu_item_id)
+            exponent = (ordered_at.replace(tzinfo=timezone.utc).timestamp() - self._t0) / self._tau
+            if exponent > 500: # keep weights far from float overflow
+                self._rebase(exponent)
+                exponent = 0
+            weight = quantity * math.exp(exponent)
+            self._hour_counts[position * HOURS_PER_DAY + hour] += weight
+            self._day_counts[position] += weight
+
+    def _add_slot(self, menu_item_id):
+        self._index[menu_item_id] = position = len(self.item_ids)
+        self.item_ids.append(menu_item_id)
+        self._hour_counts.extend([0.0] * HOURS_PER_DAY)
+        self._day_counts.append(0.0)
+        return position
+
+    def _rebase(self, exponent):
+        scale = math.exp(-exponent)
+        for counts in (self._hour_counts, self._day_counts):
+            for position in range(len(counts)):
+                counts[position] *= scale
+        self._t0 += exponent * self._tau
+
+    def _changed(self):
+        self._boost_cache = {}
+
+    def _snapshot_state(self):
+        header = {'item_ids': self.item_ids, 't0': self._t0, 'tau': self._tau}
+        return header, self._hour_counts.tobytes() + self._day_counts.tobytes()
+
+    def _restore_state(self, header, payload):
+        item_ids = header.get('item_ids', [])
+        hour_size = 8 * len(item_ids) * HOURS_PER_DAY
+        if header.get('tau') != self._tau or len(payload) != hour_size + 8 * len(item_ids):
+            return False
+        self.item_ids = list(item_ids)
+        self._index = {item_id: position for position, item_id in enumerate(self.item_ids)}
+        self._t0 = header['t0']
+        self._hour_counts = array('d', payload[:hour_size])
+        self._day_counts = array('d', payload[hour_size:])
+        return True
+
+    def boosts(self, hour):
+        """{menu item id: score boost} for an hour of day; items that never sold get no entry."""
+        key = (hour, self.version)
+        boosts = self._boost_cache.get(key)
+        if boosts is None:
+            hour_counts = [self._hour_counts[position * HOURS_PER_DAY + hour] for position in range(len(self.item_ids))]
+            max_hour, max_day = max(hour_counts, default=0), max(self._day_counts, default=0)
+            boosts = {
+                item_id: POPULARITY_MAX_BOOST * (POPULARITY_HOUR_WEIGHT * (hour_count / max_hour if max_hour else 0)
+                                                 + (1 - POPULARITY_HOUR_WEIGHT) * (day_count / max_day if max_day else 0))
+                for item_id, hour_count, day_count in zip(self.item_ids, hour_counts, self._day_counts)
+            }
+            self._boost_cache = {key: boosts}
+        return boosts
+
+popularity_model = PopularityModel(POPULARITY_HALF_LIFE_DAYS, snapshot_file=os.path.join(app.instance_path, 'popularity.snapshot'))
+
+# --- CO-PURCHASE INDEX ---
+# CoPurchaseIndex: per-item co-occurrence counts from order_line; neighbours by cosine
+# similarity are computed lazily once per model version.
+COPURCHASE_NEIGHBOURS = 10
+
+class CoPurchaseIndex(OrderLineFollower):
+    name = 'co-purchase index'
+
+    def __init__(self, neighbours=COPURCHASE_NEIGHBOURS, snapshot_file=None):
+        super().__init__(snapshot_file)
+        self.neighbour_count = neighbours
+        self._reset()
+
+    def _reset(self):
+        self._order_counts = Counter()
+        self._pair_counts = {}
+        self._neighbours = {}
+
+    def _apply(self, rows):
+        order_id, basket = None, set()
+        for _, line_order_id, menu_item_id, _, _, _ in rows:
+            if line_order_id != order_id:
+                self._add_basket(basket)
+                order_id, basket = line_order_id, set()
+            if menu_item_id is not None:
+                basket.add(menu_item_id)
+        self._add_basket(basket)
+
+    def _add_basket(self, basket):
+        self._order_counts.update(basket)
+        if len(basket) < 2:
+            return
+        for item_id in basket:
+            pairs = self._pair_counts.setdefault(item_id, Counter())
+            for other_id in basket:
+                if other_id != item_id:
+                    pairs[other_id] += 1
+
+    def _changed(self):
+        self._neighbours = {}
+
+    def _snapshot_state(self):
+        state = {
+            'orders': list(self._order_counts.items()),
+            'pairs': [[item_id, list(pairs.items())] for item_id, pairs in self._pair_counts.items()],
+        }
+        return {}, json.dumps(state, separators=(',', ':')).encode()
+
+    def _restore_state(self, header, payload):
+        state = json.loads(payload)
+        self._reset()
+        self._order_counts.update(dict(state['orders']))
+        self._pair_counts = {item_id: Counter(dict(pairs)) for item_id, pairs in state['pairs']}
+        return True
+
+    def rebuild(self):
+        """Recounts the whole order history in one streaming pass over order_line."""
+        with self._lock:
+            self._reset()
+            self.last_line_id = 0
+            return self._follow()
+
+    def neighbours(self, item_id):
+        """[(similarity, other_id)] for the items most often ordered with item_id, best first."""
+        neighbours = self._neighbours.get(item_id)
+        if neighbours is None:
+            item_orders = self._order_counts[item_id]
+            neighbours = heapq.nlargest(self.neighbour_count, (
+                (together / math.sqrt(item_orders * self._order_counts[other_id]), other_id)
+                for other_id, together in self._pair_counts.get(item_id, {}).items()
+            ))
+            self._neighbours[item_id] = neighbours
+        return neighbours
+
+    def suggest(self, cart_item_ids, k):
+        """Top k item ids by summed similarity to the cart's items, excluding the cart itself."""
+        self.start()
+        scores = {}
+        for item_id in cart_item_ids:
+            for similarity, other_id in self.neighbours(item_id):
+                if other_id not in cart_item_ids:
+                    scores[other_id] = scores.get(other_id, 0) + similarity
+        return heapq.nlargest(k, ((score, other_id) for other_id, score in scores.items()))
+
+copurchase_index = CoPurchaseIndex(snapshot_file=os.path.join(app.instance_path, 'copurchase.snapshot'))
+
+@app.cli.command('rebuild-copurchase')
+def rebuild_copurchase_command():
+    """Recounts the co-purchase index from the full order history and saves a snapshot."""
+    lines = copurchase_index.rebuild()
+    copurchase_index.save_snapshot()
+    click.echo(f"Indexed {lines} order lines.")
+
+# --- ORDER LOOKUP ---
+# Order ids carry their type in the prefix. Rendered receipts are kept in an LRU cache.
+RECEIPT_CACHE_SIZE = int(os.environ.get('RECEIPT_CACHE_SIZE', 1024))
+ORDER_TYPES = {'online': (OnlineOrder, "Online Delivery"), 'dine_in': (DineInOrder, "Dine-In")}
+
+def order_type_for_id(order_id):
+    """Maps 'BNB-ONLINE-…' to 'online' and 'T<n>-ORD-…' to 'dine_in'; None for anything else."""
+    if order_id.startswith('BNB-ONLINE-'):
+        return 'online'
+    table_part, _, rest = order_id.partition('-ORD-')
+    if rest and table_part[:1] == 'T' and table_part[1:].isdigit():
+        return 'dine_in'
+    return None
+
+def resolve_order(order_id):
+    """Returns (order, order type label), or (None, None) if no order has this id."""
+    order_type = order_type_for_id(order_id)
+    if order_type is None:
+        return None, None
+    model, label = ORDER_TYPES[order_type]
+    order = model.query.filter_by(order_id=order_id).first()
+    return (order, label) if order else (None, None)
+
+class ReceiptCache:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, order_id):
+        with self._lock:
+            page = self._pages.get(order_id)
+            if page is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._pages.move_to_end(order_id)
+            return page
+
+    def put(self, order_id, page):
+        with self._lock:
+            self._pages[order_id] = page
+            self._pages.move_to_end(order_id)
+            while len(self._pages) > self.max_entries:
+                self._pages.popitem(last=False)
+                self.evictions += 1
+
+    def metrics(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._pages), 'max_entries': self.max_entries,
+                'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else None,
+            }
+
+receipt_cache = ReceiptCache(RECEIPT_CACHE_SIZE)
+
+# --- ORDER INGESTION ---
+# All orders go through ingest_orders() in one transaction. Ids come from sequence rows;
+# an Idempotency-Key replays the stored response instead of creating a second order.
+MAX_BULK_ORDERS = int(os.environ.get('MAX_BULK_ORDERS', 100))
+IDEMPOTENCY_KEY_MAX_LENGTH = 100
+MAX_CART_ITEM_QUANTITY = 100
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def valid_cart_item(item):
+    # The fields the order lines, the kitchen scheduler and the receipts read.
+    return (isinstance(item, dict) and isinstance(item.get('name'), str)
+            and isinstance(item.get('id'), (int, str, type(None))) and not isinstance(item.get('id'), bool)
+            and is_number(item.get('price')) and item['price'] >= 0
+            and isinstance(item.get('quantity'), int) and not isinstance(item['quantity'], bool)
+            and 0 < item['quantity'] <= MAX_CART_ITEM_QUANTITY)
+
+class OrderRejected(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+def parse_order_request(order_type, data, idempotency_key=None):
+    """Validates one order payload for ingest_orders(). Raises OrderRejected."""
+    if order_type not in ORDER_MODELS or not isinstance(data, dict):
+        raise OrderRejected('Invalid order information')
+    if idempotency_key is not None and not (isinstance(idempotency_key, str)
+                                            and 0 < len(idempotency_key) <= IDEMPOTENCY_KEY_MAX_LENGTH):
+        raise OrderRejected(f'Idempotency key must be 1-{IDEMPOTENCY_KEY_MAX_LENGTH} characters')
+    cart = data.get('cart')
+    order_request = {'order_type': order_type, 'cart': cart, 'idempotency_key': idempotency_key}
+    if order_type == 'dine_in':
+        order_request['customer_name'] = session.get('user_name', data.get('customer_name', 'Guest'))
+        if not cart:
+            raise OrderRejected('Missing cart information or not logged in')
+        try:
+            order_request['table_number'] = int(data.get('table_number', random.randint(1, 6)))
+        except (TypeError, ValueError):
+            raise OrderRejected('Invalid table number')
+    else:
+        order_request['customer_name'] = session.get('user_name', data.get('customer_name'))
+        order_request['address'] = data.get('address')
+        if not all([cart, order_request['customer_name'], order_request['address']]):
+            raise OrderRejected('Missing order information or not logged in')
+    if not isinstance(cart, list) or not all(valid_cart_item(item) for item in cart):
+        raise OrderRejected('Invalid cart information')
+    order_request['subtotal'] = sum(item['price'] * item['quantity'] for item in cart)
+    payload = {key: value for key, value in data.items() if key != 'idempotency_key'}
+    order_request['request_hash'] = hashlib.sha256(
+        json.dumps([order_type, payload], sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    return order_request
+
+def create_order(order_request, user_email, order_time, kitchen_plan):
+    """Adds the order, its order lines and its confirmation mail to the session."""
+    cart, subtotal = order_request['cart'], order_request['subtotal']
+    total = subtotal + round(subtotal * 0.05)
+    sequence = next_sequence_value(f"{order_request['order_type']}_order")
+    if order_request['order_type'] == 'dine_in':
+        order_id = f"T{order_request['table_number']}-ORD-{sequence:06d}"
+        order = DineInOrder(
+            order_id=order_id, table_number=order_request['table_number'], customer_name=order_request['customer_name'],
+            user_email=user_email, items=cart, total=total, timestamp=order_time
+        )
+        kitchen_plan.schedule(order)
+        subject = f"Your Brew & Bite Order ({order_id}) is Confirmed!"
+    else:
+        order_id = f"BNB-ONLINE-{sequence:06d}"
+        order = OnlineOrder(
+            order_id=order_id, customer_name=order_request['customer_name'], user_email=user_email,
+            address=order_request['address'], items=cart, total=total, timestamp=order_time
+        )
+        subject = f"Your Brew & Bite Online Order ({order_id}) is Confirmed!"
+    db.session.add(order)
+    record_order_lines(order_request['order_type'], order)
+    receipt_url = url_for('receipt', order_id=order_id, _external=True)
+    queue_mail(subject, [user_email], html=render_template('order_confirmation_email.html', order=order, receipt_url=receipt_url))
+    return order
+
+def _write_orders(order_requests, user_email):
+    begin_write_transaction()
+    order_time = datetime.utcnow()
+    kitchen_plan = kitchen_scheduler.begin()
+    results, created = [], []
+    for order_request in order_requests:
+        key = order_request['idempotency_key']
+        record = key and IdempotencyKey.query.filter_by(user_email=user_email, key=key).first()
+        if record:
+            if record.request_hash != order_request['request_hash']:
+                raise OrderRejected('This idempotency key was already used for a different order', 422)
+            results.append((record.response, True))
+            continue
+        order = create_order(order_request, user_email, order_time, kitchen_plan)
+        response = {'success': True, 'order_id': order.order_id,
+                    'confirmation_url': url_for('order_confirm', order_id=order.order_id)}
+        if key:
+            db.session.add(IdempotencyKey(user_email=user_email, key=key, request_hash=order_request['request_hash'],
+                                          order_id=order.order_id, response=response))
+            db.session.flush() # a repeated key later in the same batch must find this one
+        results.append((response, False))
+        created.append(order)
+    db.session.commit()
+    return results, created, kitchen_plan
+
+def ingest_orders(order_requests, user_email):
+    """Writes the orders in one transaction. Returns a (response, replayed) pair per request.
+
+    Raises OrderRejected, after rolling back, if a key was reused for a different payload.
+    """
+    try:
+        try:
+            results, created, kitchen_plan = _write_orders(order_requests, user_email)
+        except IntegrityError:
+            # A concurrent request with the same key committed first; its response is replayed now.
+            db.session.rollback()
+            results, created, kitchen_plan = _write_orders(order_requests, user_email)
+    except OrderRejected:
+        db.session.rollback()
+        raise
+    for order in created:
+        if isinstance(order, DineInOrder):
+            ready_order_scheduler.schedule(order)
+    kitchen_scheduler.commit(kitchen_plan)
+    if created:
+        for model in (popularity_model, copurchase_index):
+            # The orders are committed; the follower thread catches up if this fails.
+            try:
+                model.sync()
+            except Exception as e:
+                db.session.rollback()
+                print(f"{model.name.capitalize()} sync error: {e}")
+    return results
+
+def submit_order(order_type):
+    user_email = session.get('user')
+    if not user_email:
+        return jsonify({'error': 'Missing order information or not logged in'}), 400
+    try:
+        order_request = parse_order_request(order_type, request.get_json(silent=True), request.headers.get('Idempotency-Key'))
+        (response, replayed), = ingest_orders([order_request], user_email)
+    except OrderRejected as e:
+        return jsonify({'error': str(e)}), e.status
+    response = jsonify(response)
+    if replayed:
+        response.headers['Idempotent-Replayed'] = 'true'
+    return response
 
 # --- STANDARD PAGE & AUTH ROUTES ---
 @app.route('/')
@@ -265,13 +2777,14 @@ def signup():
         session['signup_data'] = {'name': name, 'email': email, 'password': password, 'otp': otp}
 
         try:
-            msg = Message(subject="Your Brew & Bite Verification Code", recipients=[email])
-            msg.body = f"Hello {name},\n\nYour verification code is: {otp}\n\n- The Brew & Bite Team"
-            mail.send(msg)
+            queue_mail("Your Brew & Bite Verification Code", [email],
+                       body=f"Hello {name},\n\nYour verification code is: {otp}\n\n- The Brew & Bite Team")
+            db.session.commit()
             flash('A verification code has been sent to your email.', 'success')
             return redirect(url_for('verify_otp'))
         except Exception as e:
-            print(f"Failed to send OTP email: {e}")
+            db.session.rollback()
+            print(f"Failed to queue OTP email: {e}")
             flash('Could not send verification email. Please try again.', 'error')
             return redirect(url_for('signup'))
             
@@ -323,11 +2836,12 @@ def login():
 
             try:
                 login_time = datetime.now().strftime('%d %b %Y at %I:%M %p')
-                msg = Message(subject="New Login to Your Brew & Bite Account", recipients=[user.email])
-                msg.body = (f"Hello {user.name},\n\nYour account was just accessed on {login_time}.\n\n- The Brew & Bite Team")
-                mail.send(msg)
+                queue_mail("New Login to Your Brew & Bite Account", [user.email],
+                           body=f"Hello {user.name},\n\nYour account was just accessed on {login_time}.\n\n- The Brew & Bite Team")
+                db.session.commit()
             except Exception as e:
-                print(f"Failed to send login notification email: {e}")
+                db.session.rollback()
+                print(f"Failed to queue login notification email: {e}")
 
             # ADDED THIS BLOCK
             # Checks if the user was trying to access a protected page before logging in.
@@ -362,19 +2876,20 @@ def home():
 @app.route('/main_menu')
 def main_menu():
     user_name = session.get('user_name')
-    return render_template('main_menu.html', user_name=user_name)
+    page = render_template('main_menu.html', user_name=user_name, todays_specials=get_todays_specials_data())
+    return conditional_page(page, private=True)
 
 @app.route('/breakfast')
-def breakfast(): return render_template('breakfast.html')
+def breakfast(): return render_category_page('breakfast', 'breakfast.html')
 
 @app.route('/lunch')
-def lunch(): return render_template('lunch.html')
+def lunch(): return render_category_page('lunch', 'lunch.html')
 
 @app.route('/dinner')
-def dinner(): return render_template('dinner.html')
+def dinner(): return render_category_page('dinner', 'dinner.html')
 
 @app.route('/drinks')
-def drinks(): return render_template('drinks.html')
+def drinks(): return render_category_page('drinks', 'drinks.html')
 
 @app.route('/add_to_cart')
 def add_to_cart(): return render_template('add_to_cart.html')
@@ -414,7 +2929,10 @@ def dine_in_menu():
     # Get user details from the session if they exist
     user_name = session.get('user_name')
     user_email = session.get('user')
-    return render_template('dine_in_menu.html', user_name=user_name, user_email=user_email)
+    category_cards = {name: menu_cards(name, 'dine_in_cards') for name in DINE_IN_MENU_CATEGORIES}
+    page = render_template('dine_in_menu.html', user_name=user_name, user_email=user_email,
+                           todays_specials=get_todays_specials_data(), category_cards=category_cards)
+    return conditional_page(page, private=True)
 
 @app.route('/table_order')
 def table_order():
@@ -443,63 +2961,129 @@ def admin_dashboard():
     if not session.get('is_admin'):
         flash('You must be an admin to view this page.', 'error')
         return redirect(url_for('login'))
-    all_feedback = Feedback.query.order_by(Feedback.timestamp.desc()).all()
-    all_bookings = Booking.query.order_by(Booking.date.desc(), Booking.time.desc()).all()
-    positive_count = sum(1 for item in all_feedback if item.sentiment == 'Positive')
-    negative_count = sum(1 for item in all_feedback if item.sentiment == 'Negative')
-    neutral_count = len(all_feedback) - positive_count - negative_count
-    bookings_with_names = []
-    for booking in all_bookings:
-        table_name = next((table['name'] for table in TABLE_DATA if table['id'] == booking.table_id), 'Unknown')
-        bookings_with_names.append({
-            'booking_id': booking.booking_id, 'table_name': table_name,
-            'date': booking.date, 'time': booking.time, 'party_size': booking.party_size
-        })
-    return render_template('admin_dashboard.html',
-                           positive_count=positive_count, negative_count=negative_count,
-                           neutral_count=neutral_count, total_count=len(all_feedback),
-                           feedback_items=all_feedback, booking_items=bookings_with_names)
+    return render_template('admin_dashboard.html', **get_sentiment_counts())
+
+@app.route('/api/admin/sentiment-summary')
+def admin_sentiment_summary():
+    if not session.get('is_admin'):
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 403
+    return jsonify(get_sentiment_counts())
+
+@app.route('/api/admin/feedback')
+def admin_feedback_page():
+    if not session.get('is_admin'):
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 403
+    query = db.session.query(Feedback.id, Feedback.text, Feedback.sentiment, Feedback.timestamp)
+    try:
+        rows, next_cursor = keyset_page(query, [Feedback.timestamp, Feedback.id], request.args.get('cursor'), get_page_size(),
+                                        parse_key=lambda key: [datetime.fromisoformat(key[0]), key[1]])
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    items = [{'id': row.id, 'text': row.text, 'sentiment': row.sentiment, 'timestamp': str(row.timestamp)} for row in rows]
+    return jsonify({'items': items, 'next_cursor': next_cursor})
+
+@app.route('/api/admin/bookings')
+def admin_bookings_page():
+    if not session.get('is_admin'):
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 403
+    query = db.session.query(Booking.id, Booking.booking_id, Booking.table_id, Booking.date, Booking.time, Booking.party_size)
+    try:
+        rows, next_cursor = keyset_page(query, [Booking.date, Booking.time, Booking.id], request.args.get('cursor'), get_page_size())
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    items = [{
+        'booking_id': row.booking_id, 'table_name': TABLES_BY_ID.get(row.table_id, {}).get('name', 'Unknown'),
+        'date': row.date, 'time': row.time, 'party_size': row.party_size
+    } for row in rows]
+    return jsonify({'items': items, 'next_cursor': next_cursor})
+
+@app.route('/api/admin/reports/<report_name>')
+def admin_sales_report(report_name):
+    if not session.get('is_admin'):
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 403
+    try:
+        start_at, end_at = get_report_range()
+    except ValueError:
+        return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+    if report_name == 'items':
+        limit = request.args.get('limit', 10, type=int)
+        rows = sales_report([OrderLine.menu_item_id, OrderLine.item_name], start_at, end_at, limit=limit)
+    elif report_name == 'categories':
+        rows = sales_report([OrderLine.category], start_at, end_at)
+    elif report_name == 'hours':
+        rows = sales_report([OrderLine.category, OrderLine.ordered_hour], start_at, end_at, order_by_revenue=False)
+    else:
+        return jsonify({'error': 'Report not found'}), 404
+    return jsonify({'report': report_name, 'start': start_at.isoformat(), 'end': end_at.isoformat(), 'rows': rows})
+
+@app.route('/api/admin/export/<table_name>')
+def admin_export(table_name):
+    """Streams a table, archived rows first, as ?format=csv|jsonl, optionally limited to ?start/&end dates."""
+    if not session.get('is_admin'):
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 403
+    export_format = request.args.get('format', 'csv')
+    if table_name not in ARCHIVED_TABLES:
+        return jsonify({'error': 'Table not found'}), 404
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f"Format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+    try:
+        start, end = get_export_range()
+    except ValueError:
+        return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+    try:
+        lock_file = open_archive_lock(shared=True)
+    except ArchiveBusy:
+        return jsonify({'error': 'An archive run is in progress, try again shortly'}), 409
+
+    def generate():
+        try:
+            records = (record for source in (iter_archived_records, iter_live_records)
+                       for record in source(table_name, start, end))
+            yield from export_chunks(table_name, records, export_format)
+        finally:
+            lock_file.close()
+
+    response = Response(stream_with_context(generate()), mimetype=EXPORT_FORMATS[export_format])
+    response.headers['Content-Disposition'] = f'attachment; filename="{table_name}.{export_format}"'
+    return response
 
 # --- API & AI FEATURE ROUTES ---
 @app.route("/todays-specials")
 def get_todays_specials():
-    weather = get_weather_data()
-    event = get_local_event()
-    scored_menu = calculate_dynamic_scores(weather, event)
-    scored_menu.sort(key=lambda x: x['dynamic_score'], reverse=True)
-    specials = scored_menu[:4]
-    image_map = get_image_map()
-    for special in specials:
-        special['image_url'] = url_for('static', filename=image_map.get(special['id'], 'images/logo.png'))
-    context_string = f"Based on the current weather ({weather.get('temperature')}°C) "
-    context_string += f"and a {event}, " if event else "in Kolkata, "
-    context_string += "here are our top picks for you!"
-    return jsonify({'specials': specials, 'context': context_string})
+    return jsonify(get_todays_specials_data())
 
 @app.route("/api/menu/<category_name>")
 def get_dynamic_menu(category_name):
-    if category_name not in MENU_DATA:
+    if category_name not in get_menu_catalog().by_menu_category:
         return jsonify({'error': 'Category not found'}), 404
-    menu_items = MENU_DATA[category_name]
-    dynamically_priced_items = apply_dynamic_pricing(menu_items)
-    image_map = get_image_map()
-    for item in dynamically_priced_items:
-        item['image_url'] = url_for('static', filename=image_map.get(item['id'], 'images/logo.png'))
-    return jsonify({'items': dynamically_priced_items})
+    snapshot = pricing_cache.get(category_name)
+    response = app.response_class(snapshot['body'], mimetype='application/json')
+    response.set_etag(snapshot['etag'])
+    response.last_modified = snapshot['window_start'].astimezone(timezone.utc)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+def suggest_cart_additions(item_names, k=3):
+    """Items often bought with the named cart items, topped up from the scoring engine."""
+    catalog = get_menu_catalog()
+    cart_items = (catalog.by_name.get(name) for name in item_names)
+    cart_item_ids = {item.id for item in cart_items if item}
+    top_suggestions = [dict(catalog.by_id[item_id].payload, dynamic_score=score)
+                       for score, item_id in copurchase_index.suggest(cart_item_ids, k) if item_id in catalog.by_id]
+    if len(top_suggestions) < k:
+        # Too little history for this cart: fill up with the best items for the current context.
+        weather = get_weather_data()
+        event = get_local_event()
+        exclude_ids = cart_item_ids | {item['id'] for item in top_suggestions}
+        top_suggestions += scoring_engine.top_k(weather, event, k - len(top_suggestions), exclude_ids=exclude_ids)
+    return top_suggestions
 
 @app.route("/api/cart-suggestions", methods=['POST'])
 def get_cart_suggestions():
     cart_data = request.get_json()
     if not cart_data or 'items' not in cart_data:
         return jsonify({'error': 'Invalid request format'}), 400
-    cart_item_names = {item for item in cart_data.get('items', [])}
-    weather = get_weather_data()
-    event = get_local_event()
-    scored_menu = calculate_dynamic_scores(weather, event)
-    suggestions = [item for item in scored_menu if item['name'] not in cart_item_names]
-    suggestions.sort(key=lambda x: x['dynamic_score'], reverse=True)
-    top_suggestions = suggestions[:3]
-    return jsonify({'suggestions': top_suggestions})
+    return jsonify({'suggestions': suggest_cart_additions(cart_data.get('items', []))})
 
 @app.route("/feedback", methods=['GET', 'POST'])
 def feedback():
@@ -508,9 +3092,7 @@ def feedback():
         if not feedback_text or not feedback_text.strip():
             flash('Please enter your feedback before submitting.', 'error')
             return redirect(url_for('feedback'))
-        analyzer = SentimentIntensityAnalyzer()
-        score = analyzer.polarity_scores(feedback_text)
-        sentiment = 'Positive' if score['compound'] >= 0.05 else 'Negative' if score['compound'] <= -0.05 else 'Neutral'
+        sentiment = classify_sentiment(feedback_text)
         new_feedback = Feedback(text=feedback_text, sentiment=sentiment)
         db.session.add(new_feedback)
         db.session.commit()
@@ -525,13 +3107,8 @@ def get_table_recommendations():
     if not date or not time or not party_size_str:
         return jsonify({'error': 'Date, time, and party size are required'}), 400
     party_size = int(party_size_str)
-    booking_datetime = datetime.strptime(f"{date} {time}", '%Y-%m-%d %H:%M')
-    bookings_on_date = Booking.query.filter_by(date=date).all()
-    booked_table_ids = set()
-    for b in bookings_on_date:
-        existing_booking_time = datetime.strptime(f"{b.date} {b.time}", '%Y-%m-%d %H:%M')
-        if abs((existing_booking_time - booking_datetime).total_seconds()) < 7200:
-            booked_table_ids.add(b.table_id)
+    booking_datetime = parse_booking_datetime(date, time)
+    booked_table_ids = table_availability.booked_table_ids(booking_datetime)
     available_tables = [table for table in TABLE_DATA if table['capacity'] >= party_size and table['id'] not in booked_table_ids]
     scored_tables = []
     for table in available_tables:
@@ -545,22 +3122,50 @@ def get_table_recommendations():
 @app.route('/api/book-table', methods=['POST'])
 def book_table():
     data = request.get_json()
-    table_id, date, time, party_size = data.get('table_id'), data.get('date'), data.get('time'), data.get('party_size')
     user_email = session.get('user')
-    if not all([table_id, date, time, party_size, user_email]):
+    try:
+        booking_request = parse_booking_request(data)
+    except ValueError:
+        return jsonify({'error': 'Invalid booking information'}), 400
+    if not booking_request or not user_email:
         return jsonify({'error': 'Missing booking information or not logged in'}), 400
-    booking_id = f"BNB-{random.randint(1000, 9999)}"
-    new_booking = Booking(booking_id=booking_id, table_id=table_id, date=date, time=time, party_size=party_size)
-    db.session.add(new_booking)
+    try:
+        new_booking, = reserve_tables([booking_request])
+    except BookingConflict:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': 'This table has just been booked for that time. Please pick another table.'}), 409
+    table_name = queue_booking_confirmation(new_booking, user_email)
     db.session.commit()
-    table_name = next((table['name'] for table in TABLE_DATA if table['id'] == table_id), 'your booked table')
+    table_availability.add(new_booking.table_id, new_booking.starts_at)
+    return jsonify({'success': True, 'booking_id': new_booking.booking_id, 'table_name': table_name})
+
+@app.route('/api/book-tables', methods=['POST'])
+def book_tables():
+    """Books several tables (events, group bookings) in one transaction: all succeed or none do."""
+    data = request.get_json()
+    user_email = session.get('user')
+    if not isinstance(data, dict) or not data.get('bookings') or not user_email:
+        return jsonify({'error': 'Missing booking information or not logged in'}), 400
     try:
-        msg = Message("Your Table Booking at Brew & Bite is Confirmed!", recipients=[user_email])
-        msg.body = f"Hello,\n\nYour booking for {table_name} on {date} at {time} for {party_size} guests is confirmed.\nYour Booking ID is: {booking_id}\n\nWe look forward to seeing you!\n- The Brew & Bite Team"
-        mail.send(msg)
-    except Exception as e:
-        print(f"Error sending booking confirmation email: {e}")
-    return jsonify({'success': True, 'booking_id': booking_id, 'table_name': table_name})
+        booking_requests = [parse_booking_request(item) for item in data['bookings']]
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid booking information'}), 400
+    if not all(booking_requests):
+        return jsonify({'error': 'Missing booking information'}), 400
+    try:
+        new_bookings = reserve_tables(booking_requests)
+    except BookingConflict as e:
+        db.session.rollback()
+        conflict = {key: e.booking_request[key] for key in ('table_id', 'date', 'time')}
+        return jsonify({'success': False, 'error': str(e), 'conflict': conflict}), 409
+    confirmed = []
+    for booking in new_bookings:
+        table_name = queue_booking_confirmation(booking, user_email)
+        confirmed.append({'booking_id': booking.booking_id, 'table_name': table_name})
+    db.session.commit()
+    for booking in new_bookings:
+        table_availability.add(booking.table_id, booking.starts_at)
+    return jsonify({'success': True, 'bookings': confirmed})
 
 @app.route('/api/admin/delete-booking/<string:booking_id>', methods=['DELETE'])
 def delete_booking(booking_id):
@@ -568,106 +3173,174 @@ def delete_booking(booking_id):
         return jsonify({'success': False, 'error': 'Unauthorized'}), 403
     booking_to_delete = Booking.query.filter_by(booking_id=booking_id).first()
     if booking_to_delete:
+        starts_at = booking_to_delete.starts_at or parse_booking_datetime(booking_to_delete.date, booking_to_delete.time)
         db.session.delete(booking_to_delete)
         db.session.commit()
+        table_availability.remove(booking_to_delete.table_id, starts_at)
         return jsonify({'success': True, 'message': 'Booking removed successfully'})
     else:
         return jsonify({'success': False, 'error': 'Booking not found'}), 404
 
+@app.route('/api/admin/mail-metrics')
+def mail_metrics():
+    if not session.get('is_admin'):
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 403
+    return jsonify(mail_outbox.metrics())
+
+@app.route('/metrics')
+def metrics():
+    token = app.config['METRICS_TOKEN']
+    if not (token or app.config['METRICS_ENABLED']):
+        return Response('Not Found\n', status=404, mimetype='text/plain')
+    if token and request.headers.get('Authorization') != f"Bearer {token}":
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(instrumentation.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/admin/receipt-metrics')
+def receipt_metrics():
+    if not session.get('is_admin'):
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 403
+    return jsonify(receipt_cache.metrics())
+
 @app.route('/api/confirm-dine-in-order', methods=['POST'])
 def confirm_dine_in_order():
-    data = request.get_json()
-    cart = data.get('cart')
-    customer_name = session.get('user_name', data.get('customer_name', 'Guest'))
-    user_email = session.get('user')
-    table_number = data.get('table_number', random.randint(1, 6))
-    if not cart or not user_email:
-        return jsonify({'error': 'Missing cart information or not logged in'}), 400
-    order_id = f"T{table_number}-ORD-{random.randint(100, 999)}"
-    total_items = sum(item['quantity'] for item in cart)
-    preparation_minutes = total_items * 2
-    order_time = datetime.utcnow()
-    estimated_ready_time = order_time + timedelta(minutes=preparation_minutes)
-    subtotal = sum(item['price'] * item['quantity'] for item in cart)
-    gst = round(subtotal * 0.05)
-    total = subtotal + gst
-    new_order = DineInOrder(
-        order_id=order_id, table_number=table_number, customer_name=customer_name,
-        user_email=user_email, items=cart, total=total,
-        estimated_ready_time=estimated_ready_time, timestamp=order_time
-    )
-    db.session.add(new_order)
-    db.session.commit()
-    try:
-        receipt_url = url_for('receipt', order_id=new_order.order_id, _external=True)
-        msg = Message(f"Your Brew & Bite Order ({order_id}) is Confirmed!", recipients=[user_email])
-        msg.html = render_template('order_confirmation_email.html', order=new_order, receipt_url=receipt_url)
-        mail.send(msg)
-    except Exception as e:
-        print(f"An exception occurred while sending dine-in email: {e}")
-    confirmation_url = url_for('order_confirm', order_id=new_order.order_id)
-    return jsonify({'success': True, 'confirmation_url': confirmation_url})
+    return submit_order('dine_in')
 
 @app.route('/api/confirm-online-order', methods=['POST'])
 def confirm_online_order():
-    data = request.get_json()
-    cart, address = data.get('cart'), data.get('address')
-    customer_name = session.get('user_name', data.get('customer_name'))
+    return submit_order('online')
+
+@app.route('/api/orders/bulk', methods=['POST'])
+def submit_bulk_orders():
+    """Submits many orders (e.g. buffered by an offline table tablet) in one transaction.
+
+    Body: {"orders": [{"type": "dine_in" | "online", "idempotency_key": ..., "cart": [...], ...}]}.
+    Orders whose key was already used are replayed, so a retried batch never duplicates orders.
+    """
+    data = request.get_json(silent=True)
     user_email = session.get('user')
-    if not all([cart, customer_name, user_email, address]):
+    if not data or not isinstance(data.get('orders'), list) or not data['orders'] or not user_email:
         return jsonify({'error': 'Missing order information or not logged in'}), 400
-    order_id = f"BNB-ONLINE-{random.randint(1000, 9999)}"
-    subtotal = sum(item['price'] * item['quantity'] for item in cart)
-    gst = round(subtotal * 0.05)
-    total = subtotal + gst
-    new_order = OnlineOrder(
-        order_id=order_id, customer_name=customer_name, user_email=user_email,
-        address=address, items=cart, total=total, timestamp=datetime.utcnow()
-    )
-    db.session.add(new_order)
-    db.session.commit()
+    if len(data['orders']) > MAX_BULK_ORDERS:
+        return jsonify({'error': f'At most {MAX_BULK_ORDERS} orders per request'}), 413
+    order_requests = []
+    for index, order in enumerate(data['orders']):
+        try:
+            if not isinstance(order, dict):
+                raise OrderRejected('Invalid order information')
+            order_requests.append(parse_order_request(order.get('type', 'dine_in'), order, order.get('idempotency_key')))
+        except OrderRejected as e:
+            return jsonify({'error': f'Order {index}: {e}', 'index': index}), e.status
     try:
-        receipt_url = url_for('receipt', order_id=new_order.order_id, _external=True)
-        msg = Message(f"Your Brew & Bite Online Order ({order_id}) is Confirmed!", recipients=[user_email])
-        msg.html = render_template('order_confirmation_email.html', order=new_order, receipt_url=receipt_url)
-        mail.send(msg)
-    except Exception as e:
-        print(f"An exception occurred while sending online email: {e}")
-    confirmation_url = url_for('order_confirm', order_id=new_order.order_id)
-    return jsonify({'success': True, 'confirmation_url': confirmation_url})
+        results = ingest_orders(order_requests, user_email)
+    except OrderRejected as e:
+        return jsonify({'success': False, 'error': str(e)}), e.status
+    return jsonify({'success': True, 'orders': [dict(response, replayed=replayed) for response, replayed in results]})
 
 @app.route('/receipt/<order_id>')
 def receipt(order_id):
-    order = OnlineOrder.query.filter_by(order_id=order_id).first()
-    order_type = "Online Delivery"
-    if not order:
-        order = DineInOrder.query.filter_by(order_id=order_id).first()
-        order_type = "Dine-In"
-    if not order:
-        flash('Receipt not found.', 'error')
-        return redirect(url_for('home'))
-    subtotal = sum(item['price'] * item['quantity'] for item in order.items)
-    gst = round(subtotal * 0.05)
-    return render_template("receipt.html", order=order, subtotal=subtotal, gst=gst, order_type=order_type)
+    page = receipt_cache.get(order_id)
+    if page is None:
+        order, order_type = resolve_order(order_id)
+        if not order: # unknown, or archived by `flask archive`
+            return Response('Receipt not found.\n', status=404, mimetype='text/plain')
+        subtotal = sum(item['price'] * item['quantity'] for item in order.items)
+        gst = round(subtotal * 0.05)
+        page = render_template("receipt.html", order=order, subtotal=subtotal, gst=gst, order_type=order_type)
+        receipt_cache.put(order_id, page)
+    return page
 
 @app.route('/api/kitchen-notifications')
 def get_kitchen_notifications():
     check_prepared_orders()
-    ready_orders = DineInOrder.query.filter_by(status='ready').all()
+    ready_orders = db.session.query(DineInOrder.id, DineInOrder.order_id, DineInOrder.customer_name).filter(DineInOrder.status == 'ready').all()
     notifications_to_send = []
-    for order in ready_orders:
+    for _, order_id, customer_name in ready_orders:
         notifications_to_send.append({
-            'order_id': order.order_id,
-            'message': f"Order {order.order_id} for {order.customer_name} is ready!"
+            'order_id': order_id,
+            'message': f"Order {order_id} for {customer_name} is ready!"
         })
-        order.status = 'notified'
     if ready_orders:
+        (DineInOrder.query
+         .filter(DineInOrder.id.in_([pk for pk, _, _ in ready_orders]), DineInOrder.status == 'ready')
+         .update({'status': 'notified'}, synchronize_session=False))
         db.session.commit()
     return jsonify({'notifications': notifications_to_send})
 
+@app.route('/api/kitchen-stream')
+def kitchen_stream():
+    ready_order_scheduler.start()
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    subscriber, missed, position = kitchen_bus.subscribe(last_event_id)
+
+    def format_event(event):
+        payload = json.dumps({'order_id': event['order_id'], 'message': event['message']})
+        return f"id: {event['id']}\nevent: order-ready\ndata: {payload}\n\n"
+
+    def stream():
+        try:
+            yield "retry: 3000\n\n"
+            if not last_event_id:
+                # A bare id gives the browser a Last-Event-ID to resume from.
+                yield f"id: {position}\n\n"
+            for event in missed:
+                yield format_event(event)
+            closes_at = time.monotonic() + KITCHEN_STREAM_SECONDS
+            while time.monotonic() < closes_at:
+                try:
+                    timeout = min(KITCHEN_KEEPALIVE_SECONDS, max(closes_at - time.monotonic(), 0))
+                    yield format_event(subscriber.get(timeout=timeout))
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+        finally:
+            kitchen_bus.unsubscribe(subscriber)
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# --- APPLICATION FACTORY ---
+# One app per process: the first create_app() configures it, later calls return it.
+def warm_caches():
+    """Builds the read-only data requests share, so no request pays for it."""
+    catalog = get_menu_catalog()
+    scoring_engine._catalog_features()
+    for category_name in catalog.by_menu_category:
+        pricing_cache.get(category_name)
+    popularity_model.load()
+    copurchase_index.load()
+    for template_name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(template_name)
+
+def create_app(config=None):
+    """Configures the app from the environment plus `config` (a mapping) and returns it."""
+    if 'sqlalchemy' in app.extensions:
+        if config:
+            raise RuntimeError("create_app() was already called in this process; pass config to the first call")
+        return app
+    app.config.from_mapping(config_from_environment())
+    app.config.from_mapping(config or {})
+    database_url = app.config['SQLALCHEMY_DATABASE_URI']
+    if database_url.startswith('postgres://'): # the scheme some hosts hand out; SQLAlchemy wants postgresql://
+        app.config['SQLALCHEMY_DATABASE_URI'] = database_url = 'postgresql://' + database_url[len('postgres://'):]
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(database_url, app.config))
+    db.init_app(app)
+    with app.app_context():
+        engines = list(db.engines.values())
+    os.register_at_fork(after_in_child=lambda: dispose_inherited_connections(engines))
+    with app.app_context():
+        warn_if_schema_outdated()
+    asset_manifest.update(load_asset_manifest())
+    if app.config['WARM_CACHES']:
+        warm_caches()
+    # Deliver mail left from a previous run; forked workers start theirs on their first request.
+    mail_outbox.start()
+    app.before_request(mail_outbox.start)
+    return app
+
 if __name__ == '__main__':
+    create_app()
     with app.app_context():
-        db.create_all()
+        upgrade_schema()
 
     app.run(debug=True)
 
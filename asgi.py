@@ -0,0 +1,99 @@
+"""ASGI entry point: the async serving mode.
+
+    uvicorn asgi:app --workers 4
+    gunicorn --preload -w 4 -k uvicorn.workers.UvicornWorker asgi:app
+
+Each worker serves requests from an event loop instead of one request at a time:
+
+  * /todays-specials and /api/cart-suggestions are answered on the loop itself; they
+    only read in-memory models (menu catalog, scoring engine, co-purchase index) and
+    the cached weather.
+  * Every other route is the Flask app, run in a bounded thread pool (ASYNC_DB_THREADS,
+    by default the database pool size plus overflow), so database work never blocks
+    the loop and never queues for a pool connection. An open kitchen display stream
+    holds one of those threads until it reconnects (KITCHEN_STREAM_SECONDS).
+  * The weather cache is refreshed on the loop through one pooled httpx.AsyncClient.
+
+Mail is sent by the outbox threads as in the WSGI mode. Needs uvicorn, starlette,
+httpx and a2wsgi (see requirements.txt).
+"""
+import asyncio
+import functools
+import gc
+import time
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.responses import Response
+from starlette.routing import Mount, Route
+
+import app as cafe
+
+flask_app = cafe.create_app()
+
+
+def json_response(data, status=200):
+    # Flask's JSON provider, so bodies are byte-for-byte what the Flask views return.
+    return Response(flask_app.json.dumps(data) + '\n', status_code=status, media_type='application/json')
+
+
+def instrumented(endpoint):
+    """Records the request in /metrics under the endpoint name of the Flask view it replaces."""
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(request):
+            started = time.perf_counter()
+            response = await handler(request)
+            labels = (('endpoint', endpoint),)
+            cafe.instrumentation.inc('http_requests_total', labels + (('method', request.method),
+                                                                      ('status', str(response.status_code))))
+            cafe.instrumentation.observe('http_request_duration_seconds', labels, time.perf_counter() - started)
+            return response
+        return wrapper
+    return decorator
+
+
+@instrumented('get_todays_specials')
+async def todays_specials(request):
+    return json_response(cafe.get_todays_specials_data())
+
+
+@instrumented('get_cart_suggestions')
+async def cart_suggestions(request):
+    try:
+        cart_data = await request.json()
+    except ValueError:
+        cart_data = None
+    if not isinstance(cart_data, dict) or 'items' not in cart_data:
+        return json_response({'error': 'Invalid request format'}, 400)
+    return json_response({'suggestions': cafe.suggest_cart_additions(cart_data.get('items', []))})
+
+
+def start_models():
+    # Starts the models' sync threads, and loads them first when create_app() did not
+    # (WARM_CACHES off); in a thread, so a replay never runs on the loop.
+    cafe.popularity_model.start()
+    cafe.copurchase_index.start()
+
+
+@asynccontextmanager
+async def lifespan(_):
+    await asyncio.to_thread(start_models)
+    weather_refresher = asyncio.create_task(
+        cafe.weather_provider.refresh_forever_async(cafe.fetch_open_meteo_weather_async))
+    try:
+        yield
+    finally:
+        weather_refresher.cancel()
+        await cafe.close_async_http_client()
+
+
+db_threads = flask_app.config['ASYNC_DB_THREADS'] or flask_app.config['DB_POOL_SIZE'] + flask_app.config['DB_MAX_OVERFLOW']
+app = Starlette(routes=[
+    Route('/todays-specials', todays_specials),
+    Route('/api/cart-suggestions', cart_suggestions, methods=['POST']),
+    Mount('/', app=WSGIMiddleware(flask_app, workers=db_threads)),
+], lifespan=lifespan)
+# As in wsgi.py: with --preload, keep the collector from un-sharing the preloaded pages.
+gc.freeze()
@@ -0,0 +1,154 @@
+"""Measures 'flask archive' and the streaming export on a database with years of history.
+
+Seeds --days of dine-in orders, online orders, bookings and feedback (--per-day rows of
+each per day, with their order lines), then reports:
+
+  * the database file size and a few dashboard queries before and after archiving
+    everything older than --retention-days (and VACUUM);
+  * archive throughput and the archive's size on disk;
+  * export throughput for each table and format, and the peak Python memory of an
+    export (tracemalloc), which should not grow with the number of rows exported.
+
+Usage: python benchmarks/archive_benchmark.py [--days 730] [--per-day 200] [--retention-days 365]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+work_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f"sqlite:///{work_dir}/archive_bench.db"
+os.environ['ARCHIVE_DIR'] = os.path.join(work_dir, 'archive')
+os.environ['MAIL_OUTBOX_WORKERS'] = '0'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as cafe  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+cafe.create_app({'WARM_CACHES': False})
+ADMIN_EMAIL = 'admin@example.com'
+SENTIMENTS = ('Positive', 'Negative', 'Neutral')
+
+
+def seed(days, per_day):
+    catalog = cafe.get_menu_catalog()
+    started_at = datetime.utcnow() - timedelta(days=days)
+    for day in range(days):
+        orders, online, bookings, feedback, lines = [], [], [], [], []
+        for index in range(per_day):
+            moment = started_at + timedelta(days=day, seconds=index * 86400 / per_day)
+            item = catalog.items[(day + index) % len(catalog.items)]
+            cart = [{'id': item.id, 'name': item.name, 'price': item.price, 'quantity': 1 + index % 3}]
+            total = item.price * cart[0]['quantity']
+            orders.append({'order_id': f"D{day}-{index}", 'table_number': 1 + index % 6, 'customer_name': 'Guest',
+                           'user_email': 'guest@example.com', 'items': cart, 'total': total, 'status': 'notified',
+                           'estimated_ready_time': moment, 'timestamp': moment})
+            online.append({'order_id': f"O{day}-{index}", 'customer_name': 'Guest', 'user_email': 'guest@example.com',
+                           'address': '1 Long Street', 'items': cart, 'total': total, 'timestamp': moment})
+            bookings.append({'booking_id': f"B{day}-{index}", 'table_id': 1 + index % 6, 'date': moment.date().isoformat(),
+                             'time': moment.strftime('%H:%M'), 'party_size': 2, 'starts_at': moment})
+            feedback.append({'text': 'Lovely coffee, slow service at lunch.', 'sentiment': SENTIMENTS[index % 3],
+                             'timestamp': moment})
+            lines += cafe.build_order_lines('dine_in', f"D{day}-{index}", cart, moment)
+            lines += cafe.build_order_lines('online', f"O{day}-{index}", cart, moment)
+        for model, rows in ((cafe.DineInOrder, orders), (cafe.OnlineOrder, online), (cafe.Booking, bookings),
+                            (cafe.Feedback, feedback), (cafe.OrderLine, lines)):
+            cafe.db.session.execute(insert(model), rows)
+        cafe.db.session.commit()
+
+
+def database_size():
+    with cafe.db.engine.connect() as connection:
+        connection.exec_driver_sql('PRAGMA wal_checkpoint(TRUNCATE)')
+    return os.path.getsize(cafe.db.engine.url.database)
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def dashboard_queries(client, repeat=50):
+    """Median milliseconds of a few admin reads that scan the growing tables."""
+    timings = {}
+    for label, path in (('sentiment summary', '/api/admin/sentiment-summary'),
+                        ('feedback page', '/api/admin/feedback'),
+                        ('bookings page', '/api/admin/bookings')):
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            assert client.get(path).status_code == 200, path
+            samples.append(time.perf_counter() - started)
+        timings[label] = sorted(samples)[len(samples) // 2] * 1000
+    return timings
+
+
+def export(client, table, export_format):
+    """Streams one export to nowhere. Returns (bytes, rows, seconds)."""
+    started = time.perf_counter()
+    response = client.get(f"/api/admin/export/{table}?format={export_format}", buffered=False)
+    size = rows = 0
+    for chunk in response.response:
+        size += len(chunk)
+        rows += chunk.count(b'\n')
+    response.close()
+    return size, rows - (export_format == 'csv'), time.perf_counter() - started
+
+
+def export_peak_memory(client, table):
+    tracemalloc.start()
+    export(client, table, 'csv')
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=int, default=730)
+    parser.add_argument('--per-day', type=int, default=200)
+    parser.add_argument('--retention-days', type=int, default=365)
+    args = parser.parse_args()
+
+    with cafe.app.app_context():
+        cafe.upgrade_schema()
+        cafe.db.session.add(cafe.User(name='Admin', email=ADMIN_EMAIL, password='admin', is_admin=True))
+        cafe.db.session.commit()
+        started = time.perf_counter()
+        seed(args.days, args.per_day)
+        print(f"Seeded {args.days} days x {args.per_day} rows per table in {time.perf_counter() - started:.1f}s")
+
+    client = cafe.app.test_client()
+    client.post('/login', data={'email': ADMIN_EMAIL, 'password': 'admin'})
+    with cafe.app.app_context():
+        size_before, queries_before = database_size(), dashboard_queries(client)
+        started = time.perf_counter()
+        moved = cafe.archive_old_rows(args.retention_days)
+        archive_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        cafe.vacuum_database()
+        vacuum_seconds = time.perf_counter() - started
+        size_after, queries_after = database_size(), dashboard_queries(client)
+
+    total_moved = sum(moved.values())
+    print(f"Archived {total_moved:,} rows ({', '.join(f'{name} {count:,}' for name, count in moved.items())}) "
+          f"in {archive_seconds:.1f}s ({total_moved / archive_seconds:,.0f} rows/s), VACUUM {vacuum_seconds:.1f}s")
+    print(f"Database file {size_before / 1e6:.1f} MB -> {size_after / 1e6:.1f} MB; "
+          f"archive {directory_size(os.environ['ARCHIVE_DIR']) / 1e6:.1f} MB")
+    print(f"{'query':<20}{'before ms':>11}{'after ms':>10}")
+    for label, before in queries_before.items():
+        print(f"{label:<20}{before:>11.2f}{queries_after[label]:>10.2f}")
+
+    print(f"{'export':<24}{'rows':>10}{'MB':>8}{'seconds':>9}{'rows/s':>10}")
+    for table in cafe.ARCHIVED_TABLES:
+        for export_format in cafe.EXPORT_FORMATS:
+            size, rows, seconds = export(client, table, export_format)
+            print(f"{f'{table}.{export_format}':<24}{rows:>10,}{size / 1e6:>8.1f}{seconds:>9.2f}{rows / seconds:>10,.0f}")
+    peaks = ', '.join(f"{table} {export_peak_memory(client, table) / 1e6:.1f} MB" for table in cafe.ARCHIVED_TABLES)
+    print(f"Peak Python memory per CSV export: {peaks}")
+
+
+if __name__ == '__main__':
+    main()
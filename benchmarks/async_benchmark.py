@@ -0,0 +1,263 @@
+"""Compares the sync (wsgi.py) and async (asgi.py) serving modes at a fixed worker count.
+
+Both modes run under gunicorn with --preload and the same number of workers: sync
+workers for wsgi, uvicorn workers for asgi. Each run keeps a number of concurrent
+clients busy for a fixed time with a mix of the hot API routes (specials, cart
+suggestions, the menu API, dine-in orders and table bookings) and reports throughput,
+latency and failures, split into the in-memory routes and the database routes.
+
+The weather API is a local stub answering after --weather-latency-ms, and the weather
+cache expires every few seconds, so both modes really make outbound calls. Mail stays
+in the outbox. --db-latency-ms adds a sleep before every SQL statement in the servers
+to stand in for a database across the network; by default runs are made without it
+and with 5 ms.
+
+Usage: python benchmarks/async_benchmark.py [--workers 2] [--concurrency 16 64 256]
+                                            [--duration 10] [--db-latency-ms 0 5]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlencode
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, REPO_ROOT)
+
+MEMORY_ROUTES = {'todays-specials', 'cart-suggestions', 'menu'}
+REQUEST_TIMEOUT = 30
+BENCH_EMAIL = 'bench@example.com'
+
+
+# --- server side: gunicorn imports this module and calls one of these factories ---
+def configure_server():
+    import app as cafe
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    latency = float(os.environ.get('BENCH_DB_LATENCY_MS', 0)) / 1000
+    if latency:
+        event.listen(Engine, 'before_cursor_execute', lambda *args: time.sleep(latency))
+    work_dir = os.environ['BENCH_WORK_DIR']
+    cafe.app.logger.disabled = True # failed requests are counted by the client instead
+    cafe.weather_provider.cache_file = os.path.join(work_dir, 'weather_cache.json')
+    for model in (cafe.popularity_model, cafe.copurchase_index):
+        model.snapshot_file = os.path.join(work_dir, f"{model.name.replace(' ', '_')}.snapshot")
+    return cafe
+
+
+def sync_app():
+    return configure_server().create_app()
+
+
+def async_app():
+    configure_server()
+    import asgi
+    return asgi.app
+
+
+# --- client side ---
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_weather_stub(latency):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            body = json.dumps({'current_weather': {'temperature': 31}}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def seed(env):
+    """Creates the schema and the benchmark user in the database the servers will use."""
+    subprocess.run([sys.executable, '-c', "import app\napp.create_app({'WARM_CACHES': False})\n"
+                    "with app.app.app_context():\n    app.upgrade_schema()\n"
+                    f"    app.db.session.add(app.User(name='Bench', email='{BENCH_EMAIL}', password='bench'))\n"
+                    "    app.db.session.commit()\n"], env=env, cwd=REPO_ROOT, check=True, capture_output=True)
+
+
+async def http_request(port, method, path, body=None, form=None, cookie=None):
+    """One request on a fresh connection. Returns (status, raw response)."""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        lines = [f"{method} {path} HTTP/1.1", f"Host: 127.0.0.1:{port}", 'Connection: close']
+        data = b''
+        if cookie:
+            lines.append(f"Cookie: {cookie}")
+        if body is not None:
+            data = json.dumps(body).encode()
+            lines.append('Content-Type: application/json')
+        elif form is not None:
+            data = urlencode(form).encode()
+            lines.append('Content-Type: application/x-www-form-urlencoded')
+        if method == 'POST':
+            lines.append(f"Content-Length: {len(data)}")
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode() + data)
+        response = await reader.read()
+    finally:
+        writer.close()
+    return int(response.split(b' ', 2)[1]), response
+
+
+async def login(port):
+    _, response = await http_request(port, 'POST', '/login', form={'email': BENCH_EMAIL, 'password': 'bench'})
+    for line in response.split(b'\r\n\r\n', 1)[0].split(b'\r\n'):
+        if line.lower().startswith(b'set-cookie: session='):
+            return line.split(b': ', 1)[1].split(b';', 1)[0].decode()
+    raise RuntimeError('Login failed')
+
+
+def request_mix(rng):
+    """(weight, name, method, path, payload factory, needs login)."""
+    import app as cafe
+    catalog = cafe.get_menu_catalog()
+    names = list(catalog.by_name)
+    cart = [{'id': item.id, 'name': item.name, 'price': item.price, 'quantity': 1} for item in catalog.items[:2]]
+    booking_day = (date.today() + timedelta(days=3)).isoformat()
+    return [
+        (35, 'todays-specials', 'GET', '/todays-specials', None, False),
+        (25, 'cart-suggestions', 'POST', '/api/cart-suggestions', lambda: {'items': rng.sample(names, 2)}, False),
+        (15, 'menu', 'GET', '/api/menu/breakfast', None, False),
+        (15, 'confirm-dine-in-order', 'POST', '/api/confirm-dine-in-order',
+         lambda: {'cart': cart, 'table_number': rng.randint(1, 6)}, True),
+        (10, 'book-table', 'POST', '/api/book-table',
+         lambda: {'table_id': rng.randint(1, 6), 'date': booking_day, 'time': f"{rng.randint(10, 21)}:{rng.choice(('00', '30'))}",
+                  'party_size': 2}, True),
+    ]
+
+
+async def drive(port, concurrency, duration, mix, rng):
+    """Runs `concurrency` clients for `duration` seconds. Returns [(route, ok, seconds)]."""
+    cookie = await login(port)
+    weights = [entry[0] for entry in mix]
+    results = []
+    deadline = time.perf_counter() + duration
+
+    async def client():
+        while time.perf_counter() < deadline:
+            _, name, method, path, payload, needs_login = rng.choices(mix, weights)[0]
+            started = time.perf_counter()
+            try:
+                status, _ = await asyncio.wait_for(
+                    http_request(port, method, path, body=payload() if payload else None,
+                                 cookie=cookie if needs_login else None), REQUEST_TIMEOUT)
+                ok = status < 500 # a 409 double booking is a valid answer
+            except (OSError, asyncio.TimeoutError, IndexError, ValueError):
+                ok = False
+            results.append((name, ok, time.perf_counter() - started))
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return results
+
+
+def wait_until_ready(port, process, log_path):
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with {process.returncode}, see {log_path}")
+        try:
+            status, _ = asyncio.run(http_request(port, 'GET', '/todays-specials'))
+            if status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server did not start, see {log_path}")
+
+
+def start_server(mode, workers, port, env, log_path):
+    command = [sys.executable, '-m', 'gunicorn', '--preload', '-w', str(workers), '-b', f'127.0.0.1:{port}',
+               '--chdir', BENCH_DIR, '--timeout', '120', '--log-level', 'warning']
+    if mode == 'async':
+        command += ['-k', 'uvicorn.workers.UvicornWorker', 'async_benchmark:async_app()']
+    else:
+        command += ['async_benchmark:sync_app()']
+    with open(log_path, 'a') as log:
+        process = subprocess.Popen(command, env=env, cwd=REPO_ROOT, stdout=log, stderr=subprocess.STDOUT)
+    wait_until_ready(port, process, log_path)
+    return process
+
+
+def summarize(results, duration):
+    ok = [seconds for _, passed, seconds in results if passed]
+    by_kind = {kind: sorted(seconds for name, passed, seconds in results if passed and (name in MEMORY_ROUTES) == memory)
+               for kind, memory in (('memory', True), ('db', False))}
+
+    def percentile(values, fraction):
+        return values[min(int(len(values) * fraction), len(values) - 1)] * 1000 if values else float('nan')
+
+    ok.sort()
+    return {
+        'rps': len(ok) / duration, 'p50': percentile(ok, 0.5), 'p99': percentile(ok, 0.99),
+        'memory_p50': percentile(by_kind['memory'], 0.5), 'db_p50': percentile(by_kind['db'], 0.5),
+        'db_rps': len(by_kind['db']) / duration, 'failed': len(results) - len(ok),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[16, 64, 256])
+    parser.add_argument('--duration', type=float, default=10, help='seconds per run')
+    parser.add_argument('--db-latency-ms', type=float, nargs='+', default=[0, 5])
+    parser.add_argument('--weather-latency-ms', type=float, default=200)
+    args = parser.parse_args()
+
+    weather_stub = start_weather_stub(args.weather_latency_ms / 1000)
+    work_dir = tempfile.mkdtemp()
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{work_dir}/async_bench.db", BENCH_WORK_DIR=work_dir,
+               MAIL_OUTBOX_WORKERS='0', WEATHER_CACHE_TTL='5', PYTHONPATH=REPO_ROOT,
+               WEATHER_API_URL=f"http://127.0.0.1:{weather_stub.server_port}/v1/forecast")
+    os.environ.update({key: env[key] for key in ('DATABASE_URL', 'MAIL_OUTBOX_WORKERS')})
+    seed(env)
+    rng = random.Random(5)
+    mix = request_mix(rng)
+
+    print(f"{args.workers} workers, {args.duration:g}s per run, weather API {args.weather_latency_ms:g} ms")
+    print(f"{'db ms':>6}{'mode':>7}{'clients':>9}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>10}"
+          f"{'mem p50':>9}{'db p50':>9}{'db req/s':>10}{'failed':>8}")
+    for db_latency in args.db_latency_ms:
+        for mode in ('sync', 'async'):
+            port = free_port()
+            process = start_server(mode, args.workers, port, dict(env, BENCH_DB_LATENCY_MS=str(db_latency)),
+                                   os.path.join(work_dir, f"{mode}_server.log"))
+            try:
+                for concurrency in args.concurrency:
+                    results = asyncio.run(drive(port, concurrency, args.duration, mix, rng))
+                    summary = summarize(results, args.duration)
+                    print(f"{db_latency:>6g}{mode:>7}{concurrency:>9}{summary['rps']:>9.1f}{summary['p50']:>9.1f}"
+                          f"{summary['p99']:>10.1f}{summary['memory_p50']:>9.1f}{summary['db_p50']:>9.1f}"
+                          f"{summary['db_rps']:>10.1f}{summary['failed']:>8}")
+            finally:
+                process.send_signal(signal.SIGTERM)
+                process.wait()
+    weather_stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
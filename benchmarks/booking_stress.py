@@ -0,0 +1,113 @@
+"""Fires many simultaneous bookings at the booking endpoints and checks the ledger holds.
+
+Scenarios (each against a fresh throwaway SQLite database):
+
+  * same slot:   N clients book the same table at the same time. Exactly one may win,
+                 every other request must get 409, and nothing may fail with a 500.
+  * spread:      N clients book distinct slots. All must succeed with unique,
+                 gap-free booking ids.
+  * batch:       group bookings through /api/book-tables overlapping on one table.
+                 A batch must be booked completely or not at all.
+
+Usage: python benchmarks/booking_stress.py [--clients 300]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+# Hundreds of writers queue on the SQLite write lock at once, so allow them to wait.
+os.environ['DATABASE_URL'] = f"sqlite:///{tempfile.mkdtemp()}/booking_stress.db" # never the configured DB: it is dropped
+os.environ.setdefault('SQLITE_BUSY_TIMEOUT_MS', '60000')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as cafe  # noqa: E402
+
+# Confirmation mails only need to be queued here; nobody should try to deliver them.
+cafe.create_app({'MAIL_OUTBOX_WORKERS': 0})
+
+
+def reset_database():
+    with cafe.app.app_context():
+        cafe.db.drop_all()
+        cafe.db.create_all()
+        cafe.db.session.add(cafe.User(name='Stress', email='stress@example.com', password='stress'))
+        cafe.db.session.commit()
+    cafe.table_availability._days.clear()
+
+
+def logged_in_client():
+    client = cafe.app.test_client()
+    client.post('/login', data={'email': 'stress@example.com', 'password': 'stress'})
+    return client
+
+
+def fire(url, payloads):
+    """Sends every payload from its own client thread, released together by a barrier."""
+    clients = [logged_in_client() for _ in payloads]
+    barrier = threading.Barrier(len(payloads))
+    results = [None] * len(payloads)
+
+    def worker(index):
+        barrier.wait()
+        response = clients[index].post(url, json=payloads[index])
+        results[index] = (response.status_code, response.get_json())
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(payloads))]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - started
+
+
+def check(name, condition, detail):
+    print(f"[{'PASS' if condition else 'FAIL'}] {name}: {detail}")
+    return condition
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=300)
+    args = parser.parse_args()
+    booking_day = (date.today() + timedelta(days=7)).isoformat()
+    ok = True
+
+    reset_database()
+    payload = {'table_id': 3, 'date': booking_day, 'time': '19:00', 'party_size': 4}
+    results, elapsed = fire('/api/book-table', [payload] * args.clients)
+    statuses = Counter(status for status, _ in results)
+    ok &= check('same slot', statuses == Counter({200: 1, 409: args.clients - 1}),
+                f"{dict(statuses)} in {elapsed:.2f}s")
+
+    reset_database()
+    payloads = [{'table_id': i % 6 + 1, 'date': (date.today() + timedelta(days=1 + i // 6)).isoformat(),
+                 'time': '12:00', 'party_size': 2} for i in range(args.clients)]
+    results, elapsed = fire('/api/book-table', payloads)
+    booking_ids = sorted(body['booking_id'] for status, body in results if status == 200)
+    expected_ids = [f"BNB-{n:05d}" for n in range(1, args.clients + 1)]
+    ok &= check('spread', booking_ids == expected_ids,
+                f"{len(booking_ids)} booked, ids {booking_ids[0]}..{booking_ids[-1]}, "
+                f"{args.clients / elapsed:.0f} bookings/s")
+
+    reset_database()
+    batches = [{'bookings': [{'table_id': 6, 'date': booking_day, 'time': '20:00', 'party_size': 8},
+                             {'table_id': 1 + i % 5, 'date': booking_day, 'time': f"{10 + i % 8}:00", 'party_size': 2}]}
+               for i in range(min(args.clients, 50))]
+    results, elapsed = fire('/api/book-tables', batches)
+    statuses = Counter(status for status, _ in results)
+    with cafe.app.app_context():
+        stored = cafe.Booking.query.count()
+    ok &= check('batch', statuses[200] == 1 and stored == 2 and statuses[409] == len(batches) - 1,
+                f"{dict(statuses)}, {stored} bookings stored")
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+"""Latency and throughput benchmark for the app's hot HTTP endpoints.
+
+Builds the app against a throwaway SQLite database seeded with realistic volumes of
+users, bookings, feedback and orders. The weather backend is replaced with a fixed
+local reading and mail goes to an in-process SMTP sink (smtp_sink.py), so nothing
+leaves the machine. Each endpoint is then driven by concurrent clients and the
+p50/p95/p99 latency and throughput are reported.
+
+Results are compared with a stored baseline (benchmarks/http_baseline.json by
+default): an endpoint whose p50 or p95 is more than --tolerance (and more than
+--min-delta-ms) slower than its baseline is reported as a regression and the script
+exits non-zero. Baselines are machine
+specific; refresh them with --save-baseline on the machine that runs the check.
+
+Usage: python benchmarks/http_benchmark.py [--clients 8] [--requests 400]
+                                           [--baseline PATH] [--save-baseline]
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(REPO_ROOT, 'benchmarks', 'http_baseline.json')
+SEED_CHUNK = 5000
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+# Everything the app reads from the environment at import time has to be set first.
+WORK_DIR = tempfile.mkdtemp()
+SMTP_PORT = free_port()
+os.environ['DATABASE_URL'] = f"sqlite:///{WORK_DIR}/http_bench.db" # seeded with fake data: never the configured DB
+os.environ.update({'MAIL_SERVER': '127.0.0.1', 'MAIL_PORT': str(SMTP_PORT), 'MAIL_USE_TLS': 'false',
+                   'EMAIL_USER': 'bench@example.com'})
+sys.path.insert(0, REPO_ROOT)
+
+import app as cafe  # noqa: E402
+from smtp_sink import SMTPSink  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+cafe.create_app()
+
+
+def isolate_app():
+    """Keeps caches and snapshots out of the real instance folder and stubs the weather."""
+    cafe.app.logger.disabled = True # failed requests are counted in the results instead
+    cafe.weather_provider.backend = lambda: {'temperature': 31}
+    cafe.weather_provider.cache_file = os.path.join(WORK_DIR, 'weather_cache.json')
+    cafe.weather_provider.refresh()
+    for model in (cafe.popularity_model, cafe.copurchase_index):
+        model.snapshot_file = os.path.join(WORK_DIR, f"{model.name.replace(' ', '_')}.snapshot")
+
+
+def synthetic_cart(rng):
+    return [{'id': item.id, 'name': item.name, 'price': item.price, 'quantity': rng.randint(1, 3)}
+            for item in rng.sample(cafe.get_menu_catalog().items, rng.randint(1, 4))]
+
+
+def insert_chunked(model, rows):
+    for start in range(0, len(rows), SEED_CHUNK):
+        cafe.db.session.execute(insert(model), rows[start:start + SEED_CHUNK])
+        cafe.db.session.commit()
+
+
+def seed(args):
+    rng = random.Random(7)
+    now = datetime.utcnow()
+    with cafe.app.app_context():
+        cafe.upgrade_schema()
+        insert_chunked(cafe.User, [{'name': f'Guest {n}', 'email': f'guest{n}@example.com', 'password': 'bench',
+                                    'is_admin': n == 0} for n in range(args.users)])
+        bookings = []
+        for n in range(args.bookings):
+            starts_at = datetime.combine(date.today() + timedelta(days=n % 60 - 30), datetime.min.time()) \
+                + timedelta(hours=rng.randint(9, 21))
+            table = cafe.TABLE_DATA[n % len(cafe.TABLE_DATA)]
+            bookings.append({'booking_id': f'SEED-{n}', 'table_id': table['id'],
+                             'party_size': rng.randint(1, table['capacity']), 'date': starts_at.strftime('%Y-%m-%d'),
+                             'time': starts_at.strftime('%H:%M'), 'starts_at': starts_at})
+        insert_chunked(cafe.Booking, bookings)
+        insert_chunked(cafe.Feedback, [{'text': rng.choice(['Lovely chai!', 'Service was slow.', 'Okay visit.']),
+                                        'sentiment': rng.choice(['Positive', 'Negative', 'Neutral']),
+                                        'timestamp': now - timedelta(minutes=n)} for n in range(args.feedback)])
+        online, dine_in, lines = [], [], []
+        for n in range(args.orders):
+            cart = synthetic_cart(rng)
+            ordered_at = now - timedelta(minutes=rng.randint(0, 90 * 24 * 60))
+            total = sum(item['price'] * item['quantity'] for item in cart)
+            email = f'guest{n % args.users}@example.com'
+            if n % 2:
+                order = {'order_id': f'BNB-ONLINE-S{n}', 'customer_name': 'Guest', 'user_email': email,
+                         'address': '1 Park Street', 'items': cart, 'total': total, 'timestamp': ordered_at}
+                online.append(order)
+                lines += cafe.build_order_lines('online', order['order_id'], cart, ordered_at)
+            else:
+                order = {'order_id': f'T{n % 6 + 1}-ORD-S{n}', 'table_number': n % 6 + 1, 'customer_name': 'Guest',
+                         'user_email': email, 'items': cart, 'total': total, 'status': 'notified',
+                         'estimated_ready_time': ordered_at + timedelta(minutes=10), 'timestamp': ordered_at}
+                dine_in.append(order)
+                lines += cafe.build_order_lines('dine_in', order['order_id'], cart, ordered_at)
+        insert_chunked(cafe.OnlineOrder, online)
+        insert_chunked(cafe.DineInOrder, dine_in)
+        insert_chunked(cafe.OrderLine, lines)
+
+
+def endpoints():
+    """(name, method, path, payload factory or None, login email or None)."""
+    rng = random.Random(11)
+    names = list(cafe.get_menu_catalog().by_name)
+    cart = [{'id': item.id, 'name': item.name, 'price': item.price, 'quantity': 1}
+            for item in cafe.get_menu_catalog().items[:2]]
+    booking_day = (date.today() + timedelta(days=3)).isoformat()
+    idempotency_keys = itertools.count()
+    return [
+        ('todays-specials', 'GET', '/todays-specials', None, None),
+        ('menu', 'GET', '/api/menu/breakfast', None, None),
+        ('breakfast-page', 'GET', '/breakfast', None, None),
+        ('dine-in-menu-page', 'GET', '/dine_in_menu', None, None),
+        ('cart-suggestions', 'POST', '/api/cart-suggestions', lambda: {'items': rng.sample(names, 2)}, None),
+        ('table-recommendations', 'POST', '/api/table-recommendations',
+         lambda: {'date': booking_day, 'time': f"{rng.randint(10, 21)}:00", 'party_size': 2, 'preference': 'window'},
+         None),
+        ('kitchen-notifications', 'GET', '/api/kitchen-notifications', None, None),
+        ('confirm-dine-in-order', 'POST', '/api/confirm-dine-in-order',
+         lambda: {'cart': cart, 'table_number': rng.randint(1, 6), 'customer_name': 'Bench'}, 'guest1@example.com'),
+        ('confirm-online-order', 'POST', '/api/confirm-online-order',
+         lambda: {'cart': cart, 'address': '1 Park Street'}, 'guest1@example.com'),
+        ('bulk-orders-x10', 'POST', '/api/orders/bulk',
+         lambda: {'orders': [{'type': 'dine_in', 'idempotency_key': f'bench-{next(idempotency_keys)}', 'cart': cart,
+                              'table_number': rng.randint(1, 6)} for _ in range(10)]}, 'guest1@example.com'),
+        ('admin-dashboard', 'GET', '/admin/dashboard', None, 'guest0@example.com'),
+    ]
+
+
+def drive(method, path, payload, login, clients, total_requests):
+    """Sends total_requests from `clients` concurrent clients; returns latencies and failures."""
+    test_clients = []
+    for _ in range(clients):
+        client = cafe.app.test_client()
+        if login:
+            client.post('/login', data={'email': login, 'password': 'bench'})
+        test_clients.append(client)
+    counter = iter(range(total_requests))
+    counter_lock = threading.Lock()
+    latencies, failures = [], [0]
+    results_lock = threading.Lock()
+    barrier = threading.Barrier(clients)
+
+    def worker(client):
+        barrier.wait()
+        while True:
+            with counter_lock:
+                if next(counter, None) is None:
+                    return
+            body = payload() if payload else None
+            started = time.perf_counter()
+            response = client.open(path, method=method, json=body)
+            elapsed = time.perf_counter() - started
+            with results_lock:
+                latencies.append(elapsed)
+                if response.status_code >= 400:
+                    failures[0] += 1
+
+    threads = [threading.Thread(target=worker, args=(client,)) for client in test_clients]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, failures[0], time.perf_counter() - started
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def summarize(latencies, failures, wall):
+    latencies.sort()
+    return {
+        'requests': len(latencies), 'failures': failures, 'throughput_rps': round(len(latencies) / wall, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """Flags endpoints whose p50 or p95 grew by more than the tolerance and min_delta_ms."""
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get('endpoints', {}).get(name)
+        if not reference:
+            continue
+        for key in ('p50_ms', 'p95_ms'):
+            allowed = max(reference[key] * (1 + tolerance), reference[key] + min_delta_ms)
+            if result[key] > allowed:
+                regressions.append(f"{name}: {key[:3]} {result[key]:.2f} ms vs baseline {reference[key]:.2f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--bookings', type=int, default=20000)
+    parser.add_argument('--feedback', type=int, default=20000)
+    parser.add_argument('--orders', type=int, default=50000)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=400, help='requests per endpoint')
+    parser.add_argument('--only', nargs='*', help='endpoint names to run (default: all)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='write these results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='allowed slowdown vs baseline (0.5 = 50%%)')
+    parser.add_argument('--min-delta-ms', type=float, default=2.0, help='ignore slowdowns smaller than this')
+    args = parser.parse_args()
+
+    sink = SMTPSink('127.0.0.1', SMTP_PORT)
+    sink.start()
+    isolate_app()
+    started = time.perf_counter()
+    seed(args)
+    print(f"Seeded {args.users} users, {args.bookings} bookings, {args.feedback} feedback, "
+          f"{args.orders} orders in {time.perf_counter() - started:.1f}s")
+
+    results = {}
+    print(f"{'endpoint':<24}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'failed':>8}")
+    for name, method, path, payload, login in endpoints():
+        if args.only and name not in args.only:
+            continue
+        drive(method, path, payload, login, args.clients, min(args.requests, 20)) # warm caches and pools
+        result = summarize(*drive(method, path, payload, login, args.clients, args.requests))
+        results[name] = result
+        print(f"{name:<24}{result['throughput_rps']:>9.1f}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+              f"{result['p99_ms']:>10.2f}{result['failures']:>8}")
+    print(f"{len(sink.messages)} mails delivered to the local SMTP sink")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'clients': args.clients, 'requests': args.requests, 'endpoints': results}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Baseline written to {args.baseline}")
+        return
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except OSError:
+        print("No baseline to compare against; run with --save-baseline to create one.")
+        return
+    regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+    for regression in regressions:
+        print(f"[REGRESSION] {regression}")
+    if not regressions:
+        print(f"No endpoint regressed by more than {args.tolerance:.0%} at p50 or p95.")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Measures the cost of one kitchen poll against a large order history.
+
+Seeds a throwaway SQLite database with historical (already notified) dine-in orders
+plus a few orders still being prepared, then times:
+
+  * the old check_prepared_orders(): an ORM scan of preparing/due orders, without the
+    (status, estimated_ready_time) index, mutating each object before commit;
+  * the current check_prepared_orders(): a deadline-heap check, plus a bulk UPDATE
+    when something is actually due.
+
+Usage: python benchmarks/kitchen_poll_benchmark.py [--orders 100000] [--polls 200]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ['DATABASE_URL'] = f"sqlite:///{tempfile.mkdtemp()}/kitchen_bench.db" # never the configured DB: it is dropped
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as cafe  # noqa: E402
+from sqlalchemy import insert, text  # noqa: E402
+
+cafe.create_app()
+
+
+def seed(order_count, preparing_count):
+    now = datetime.utcnow()
+    rows = []
+    for i in range(order_count):
+        placed_at = now - timedelta(minutes=i)
+        rows.append({
+            'order_id': f"T{i % 6 + 1}-HIST-{i}", 'table_number': i % 6 + 1, 'customer_name': 'Guest',
+            'user_email': 'guest@example.com', 'items': [{'name': 'Masala Chai', 'price': 90, 'quantity': 1}],
+            'total': 95, 'status': 'preparing' if i < preparing_count else 'notified',
+            'estimated_ready_time': placed_at + timedelta(minutes=30), 'timestamp': placed_at,
+        })
+        if len(rows) == 10000:
+            cafe.db.session.execute(insert(cafe.DineInOrder), rows)
+            rows = []
+    if rows:
+        cafe.db.session.execute(insert(cafe.DineInOrder), rows)
+    cafe.db.session.commit()
+
+
+def legacy_check_prepared_orders():
+    orders_to_check = cafe.DineInOrder.query.filter(
+        cafe.DineInOrder.status == 'preparing',
+        cafe.DineInOrder.estimated_ready_time <= datetime.utcnow()
+    ).all()
+    if orders_to_check:
+        for order in orders_to_check:
+            order.status = 'ready'
+        cafe.db.session.commit()
+
+
+def time_polls(poll, polls):
+    started = time.perf_counter()
+    for _ in range(polls):
+        poll()
+    return (time.perf_counter() - started) / polls * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, default=100000)
+    parser.add_argument('--polls', type=int, default=200)
+    args = parser.parse_args()
+
+    with cafe.app.app_context():
+        cafe.db.drop_all()
+        cafe.db.create_all()
+        print(f"Seeding {args.orders} orders...")
+        seed(args.orders, preparing_count=20)
+
+        cafe.db.session.execute(text('DROP INDEX ix_dine_in_order_status_ready_time'))
+        legacy_ms = time_polls(legacy_check_prepared_orders, args.polls)
+        cafe.db.session.execute(text('CREATE INDEX ix_dine_in_order_status_ready_time ON dine_in_order (status, estimated_ready_time)'))
+        cafe.db.session.commit()
+        indexed_scan_ms = time_polls(legacy_check_prepared_orders, args.polls)
+        heap_ms = time_polls(cafe.check_prepared_orders, args.polls)
+
+    print(f"{'poll strategy':<32}{'ms / poll':>12}")
+    print(f"{'full scan (no index)':<32}{legacy_ms:>12.3f}")
+    print(f"{'indexed scan':<32}{indexed_scan_ms:>12.3f}")
+    print(f"{'deadline heap + bulk update':<32}{heap_ms:>12.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+"""Replays a dine-in order arrival trace through a simulated kitchen to measure ETA accuracy.
+
+Every order in the trace is given two estimates:
+
+  * the old flat estimate: two minutes per item ordered;
+  * the kitchen scheduler's estimate (KitchenScheduler, with the KITCHEN_STATIONS or
+    --stations capacities).
+
+and an "actual" ready time from a simulated kitchen with the same stations, where each
+item takes its nominal prep time times a random factor (lognormal, --noise). The report
+shows the estimate errors, how many orders were ready more than five minutes after the
+promised time, the busiest minute of ready notifications, the kitchen's throughput and
+what placing one order costs as the backlog grows.
+
+The trace is either synthetic (a service day with lunch and dinner peaks), a JSONL file
+with one {"timestamp": ISO time, "items": cart} object per line, or, with --from-db,
+the dine-in orders in the database DATABASE_URL points at.
+
+Usage: python benchmarks/kitchen_simulation.py [--trace orders.jsonl | --from-db] [--stations stove:8,grill:4,cold:2,bar:3]
+                                                [--load 1.0] [--hours 14] [--noise 0.25] [--seed 7]
+
+--load 1.5 replays the trace with arrivals 1.5 times as dense, to see how the kitchen
+and the estimates hold up past today's peak.
+"""
+import argparse
+import heapq
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+if '--from-db' not in sys.argv:
+    os.environ.setdefault('DATABASE_URL', f"sqlite:///{tempfile.mkdtemp()}/kitchen_sim.db")
+os.environ.setdefault('MAIL_OUTBOX_WORKERS', '0')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as cafe  # noqa: E402
+
+cafe.create_app({'WARM_CACHES': False})
+
+LATE_MINUTES = 5
+PEAKS = ((13, 0.5), (20, 0.6))   # (hour, extra orders per minute at the top of the peak)
+BASE_RATE = 0.15                 # orders per minute outside the peaks
+QUANTITY_WEIGHTS = (0.7, 0.2, 0.1)
+
+
+def arrival_rate(hour):
+    return BASE_RATE + sum(height * math.exp(-((hour - peak) ** 2) / 0.5) for peak, height in PEAKS)
+
+
+def synthetic_trace(hours, rng):
+    """Poisson arrivals (by thinning) from 08:00, with carts weighted by base popularity."""
+    items = cafe.get_menu_catalog().items
+    weights = [item.base_popularity for item in items]
+    max_rate = max(arrival_rate(8 + minute / 60) for minute in range(int(hours * 60)))
+    opened_at = datetime(2024, 1, 1, 8)
+    trace, elapsed = [], 0.0
+    while True:
+        elapsed += rng.expovariate(max_rate)
+        if elapsed >= hours * 60:
+            return trace
+        if rng.random() * max_rate > arrival_rate(8 + elapsed / 60):
+            continue
+        chosen = {item.id: item for item in rng.choices(items, weights, k=rng.randint(1, 4))}.values()
+        cart = [{'id': item.id, 'name': item.name, 'price': item.price,
+                 'quantity': rng.choices((1, 2, 3), QUANTITY_WEIGHTS)[0]} for item in chosen]
+        trace.append((opened_at + timedelta(minutes=elapsed), cart))
+
+
+def file_trace(path):
+    trace = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                trace.append((datetime.fromisoformat(row['timestamp']), row['items']))
+    return sorted(trace, key=lambda order: order[0])
+
+
+def database_trace():
+    with cafe.app.app_context():
+        rows = (cafe.db.session.query(cafe.DineInOrder.timestamp, cafe.DineInOrder.items)
+                .order_by(cafe.DineInOrder.timestamp).all())
+    return [(ordered_at, items or []) for ordered_at, items in rows]
+
+
+class SimulatedKitchen:
+    """The same stations and slot discipline as the scheduler, with noisy prep times."""
+
+    def __init__(self, scheduler, noise, rng):
+        self.scheduler = scheduler
+        self.noise = noise
+        self.rng = rng
+        self.free_at = {station: [datetime.min] * slots for station, slots in scheduler.stations.items()}
+
+    def cook(self, cart, arrival):
+        ready_at = arrival
+        for station, seconds in self.scheduler.tasks(cart):
+            factor = self.rng.lognormvariate(-self.noise ** 2 / 2, self.noise) # mean 1
+            slots = self.free_at[station]
+            finished_at = max(slots[0], arrival) + timedelta(seconds=seconds * factor)
+            heapq.heapreplace(slots, finished_at)
+            ready_at = max(ready_at, finished_at)
+        return ready_at
+
+
+def flat_estimate(cart, arrival):
+    return arrival + timedelta(minutes=sum(item['quantity'] for item in cart) * 2)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def peak_per_minute(times):
+    return max(Counter(moment.replace(second=0, microsecond=0) for moment in times).values())
+
+
+def placement_cost(scheduler, carts, backlog):
+    """Microseconds per order placed on top of a backlog of `backlog` orders, all arriving at once."""
+    plan = scheduler.begin()
+    arrival = datetime(2024, 1, 1, 12)
+    for index in range(backlog):
+        plan.place(carts[index % len(carts)], arrival)
+    started = time.perf_counter()
+    for index in range(1000):
+        plan.place(carts[index % len(carts)], arrival)
+    return (time.perf_counter() - started) / 1000 * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--trace', help='JSONL file of {"timestamp", "items"} orders')
+    source.add_argument('--from-db', action='store_true', help='replay the dine-in orders in DATABASE_URL')
+    parser.add_argument('--stations', default=None, help='e.g. stove:8,grill:4,cold:2,bar:3 (default: KITCHEN_STATIONS)')
+    parser.add_argument('--load', type=float, default=1.0, help='arrival density multiplier')
+    parser.add_argument('--hours', type=float, default=14, help='length of the synthetic service day')
+    parser.add_argument('--noise', type=float, default=0.25, help='sigma of the lognormal prep time factor')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    if args.trace:
+        trace, label = file_trace(args.trace), args.trace
+    elif args.from_db:
+        trace, label = database_trace(), 'database'
+    else:
+        trace, label = synthetic_trace(args.hours, rng), f"synthetic {args.hours:g} h day"
+    if not trace:
+        sys.exit('The trace has no orders.')
+    first_arrival = trace[0][0]
+    trace = [(first_arrival + (arrival - first_arrival) / args.load, cart) for arrival, cart in trace]
+    stations = cafe.parse_kitchen_stations(args.stations) if args.stations else cafe.KITCHEN_STATIONS
+    scheduler = cafe.KitchenScheduler(stations)
+    plan = scheduler.begin()
+    kitchen = SimulatedKitchen(scheduler, args.noise, rng)
+
+    estimates = {'flat 2 min per item': [], 'kitchen scheduler': []}
+    actual, waits = [], []
+    started = time.perf_counter()
+    for arrival, cart in trace:
+        estimates['kitchen scheduler'].append(plan.place(cart, arrival))
+        estimates['flat 2 min per item'].append(flat_estimate(cart, arrival))
+        actual.append(kitchen.cook(cart, arrival))
+        waits.append((actual[-1] - arrival).total_seconds() / 60)
+    replay_seconds = time.perf_counter() - started
+
+    item_count = sum(item['quantity'] for _, cart in trace for item in cart)
+    print(f"Replayed {len(trace)} orders ({item_count} items) from {label} (load x{args.load:g}) in {replay_seconds * 1000:.1f} ms; "
+          f"stations {', '.join(f'{name}:{slots}' for name, slots in stations.items())}")
+    print(f"{'estimator':<22}{'MAE min':>9}{'p50 |err|':>11}{'p95 |err|':>11}{f'late >{LATE_MINUTES} min':>14}{'peak ready/min':>16}")
+    for name, promised in estimates.items():
+        errors = [(done - eta).total_seconds() / 60 for eta, done in zip(promised, actual)]
+        absolute = [abs(error) for error in errors]
+        late = sum(error > LATE_MINUTES for error in errors) / len(errors) * 100
+        print(f"{name:<22}{statistics.fmean(absolute):>9.1f}{percentile(absolute, 0.5):>11.1f}"
+              f"{percentile(absolute, 0.95):>11.1f}{late:>13.1f}%{peak_per_minute(promised):>16}")
+    print(f"{'(actual)':<22}{'':>9}{'':>11}{'':>11}{'':>14}{peak_per_minute(actual):>16}")
+
+    span_hours = (max(actual) - first_arrival).total_seconds() / 3600
+    busiest_hour = max(Counter(done.replace(minute=0, second=0, microsecond=0) for done in actual).values())
+    print(f"Kitchen throughput: {len(trace) / span_hours:.1f} orders/h, {item_count / span_hours:.1f} items/h "
+          f"(busiest hour {busiest_hour} orders); wait p50 {percentile(waits, 0.5):.1f} min, "
+          f"p95 {percentile(waits, 0.95):.1f} min")
+
+    carts = [cart for _, cart in trace]
+    costs = ', '.join(f"{backlog:,} queued {placement_cost(scheduler, carts, backlog):.1f} us"
+                      for backlog in (1_000, 10_000, 100_000))
+    print(f"Scheduler cost per order placed: {costs}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Measures write throughput of concurrent order confirmations.
+
+Each configuration runs in its own process against a fresh throwaway database:
+N client threads each log in and confirm orders back to back through
+/api/confirm-online-order and /api/confirm-dine-in-order, sharing a pool sized like
+one gunicorn worker's. Reports orders/s, latency percentiles and failed requests.
+
+The SQLite configurations compare the old connection settings (rollback journal,
+synchronous=FULL) with the tuned ones (WAL, synchronous=NORMAL). Pass --database-url
+to run the tuned configuration against another backend instead.
+
+Usage: python benchmarks/order_write_load.py [--clients 16] [--orders 50] [--database-url URL]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+CONFIGURATIONS = {
+    'before (journal=DELETE, synchronous=FULL)': {'SQLITE_JOURNAL_MODE': 'DELETE', 'SQLITE_SYNCHRONOUS': 'FULL'},
+    'after (journal=WAL, synchronous=NORMAL)': {'SQLITE_JOURNAL_MODE': 'WAL', 'SQLITE_SYNCHRONOUS': 'NORMAL'},
+}
+
+
+def run_load(clients, orders_per_client):
+    """Runs inside a child process whose environment selects the database settings."""
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import app as cafe
+
+    # Confirmation mails only need to be queued here; nobody should try to deliver them.
+    cafe.create_app({'MAIL_OUTBOX_WORKERS': 0})
+    with cafe.app.app_context():
+        cafe.upgrade_schema()
+        for n in range(clients):
+            cafe.db.session.add(cafe.User(name=f'Load {n}', email=f'load{n}@example.com', password='load'))
+        cafe.db.session.commit()
+
+    cart = [{'id': item.id, 'name': item.name, 'price': item.price, 'quantity': 1}
+            for item in cafe.get_menu_catalog().items[:3]]
+    barrier = threading.Barrier(clients)
+    latencies, statuses = [], Counter()
+    lock = threading.Lock()
+
+    def worker(n):
+        client = cafe.app.test_client()
+        client.post('/login', data={'email': f'load{n}@example.com', 'password': 'load'})
+        barrier.wait()
+        for i in range(orders_per_client):
+            if i % 2:
+                url, payload = '/api/confirm-online-order', {'cart': cart, 'address': '1 Park Street'}
+            else:
+                url, payload = '/api/confirm-dine-in-order', {'cart': cart, 'table_number': n % 6 + 1,
+                                                              'customer_name': f'Load {n}'}
+            started = time.perf_counter()
+            status = client.post(url, json=payload).status_code
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] += 1
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'orders': len(latencies), 'seconds': wall, 'statuses': dict(statuses),
+        'p50_ms': latencies[len(latencies) // 2] * 1000, 'p95_ms': latencies[int(len(latencies) * 0.95)] * 1000,
+    }
+
+
+def run_configuration(settings, database_url, args):
+    env = dict(os.environ, **settings, DATABASE_URL=database_url)
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child',
+                             '--clients', str(args.clients), '--orders', str(args.orders)],
+                            env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--orders', type=int, default=50, help='orders per client')
+    parser.add_argument('--database-url', help='benchmark this database instead of the SQLite comparison')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_load(args.clients, args.orders)))
+        return
+
+    if args.database_url:
+        runs = {args.database_url: ({}, args.database_url)}
+    else:
+        runs = {name: (settings, f"sqlite:///{tempfile.mkdtemp()}/order_load.db")
+                for name, settings in CONFIGURATIONS.items()}
+    print(f"{args.clients} clients x {args.orders} orders")
+    for name, (settings, database_url) in runs.items():
+        result = run_configuration(settings, database_url, args)
+        print(f"{name}: {result['orders'] / result['seconds']:.0f} orders/s, "
+              f"p50 {result['p50_ms']:.1f} ms, p95 {result['p95_ms']:.1f} ms, statuses {result['statuses']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Benchmarks sales reporting over a synthetic order history.
+
+Seeds a throwaway SQLite database with N orders (split between dine-in and online,
+1-4 lines each, spread over the last 90 days), then measures:
+
+  * the backfill that streams the orders into the order_line table;
+  * the SQL report queries (top items, revenue per category, per category per hour);
+  * the same "top items this week" answer computed the old way, by loading every
+    order in range and summing its JSON items in Python.
+
+Usage: python benchmarks/reporting_benchmark.py [--orders 1000000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+os.environ['DATABASE_URL'] = f"sqlite:///{tempfile.mkdtemp()}/reporting_bench.db" # never the configured DB: it is dropped
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as cafe  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+cafe.create_app()
+
+SEED_CHUNK = 20000
+
+
+def synthetic_cart(rng):
+    cart = []
+    for item in rng.sample(cafe.get_menu_catalog().items, rng.randint(1, 4)):
+        cart.append({'id': item.id, 'name': item.name, 'price': item.price, 'quantity': rng.randint(1, 3)})
+    return cart
+
+
+def seed(order_count):
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    dine_in, online = [], []
+    for i in range(order_count):
+        cart = synthetic_cart(rng)
+        placed_at = now - timedelta(seconds=rng.randint(0, 90 * 86400))
+        total = round(sum(line['price'] * line['quantity'] for line in cart) * 1.05)
+        common = {'customer_name': 'Guest', 'user_email': 'guest@example.com', 'items': cart, 'total': total, 'timestamp': placed_at}
+        if i % 2:
+            dine_in.append(dict(common, order_id=f"T{i % 6 + 1}-SYN-{i}", table_number=i % 6 + 1, status='notified',
+                                estimated_ready_time=placed_at + timedelta(minutes=10)))
+        else:
+            online.append(dict(common, order_id=f"BNB-SYN-{i}", address='Synthetic Street'))
+        if len(dine_in) + len(online) >= SEED_CHUNK:
+            flush(dine_in, online)
+    flush(dine_in, online)
+
+
+def flush(dine_in, online):
+    if dine_in:
+        cafe.db.session.execute(insert(cafe.DineInOrder), dine_in)
+    if online:
+        cafe.db.session.execute(insert(cafe.OnlineOrder), online)
+    cafe.db.session.commit()
+    dine_in.clear()
+    online.clear()
+
+
+def timed(label, fn):
+    started = time.perf_counter()
+    result = fn()
+    print(f"{label:<44}{(time.perf_counter() - started) * 1000:>12.1f} ms")
+    return result
+
+
+def python_top_items(start_at):
+    revenue = Counter()
+    for model in (cafe.DineInOrder, cafe.OnlineOrder):
+        for (items,) in cafe.db.session.query(model.items).filter(model.timestamp >= start_at):
+            for line in items:
+                revenue[line['name']] += line['price'] * line['quantity']
+    return revenue.most_common(10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, default=1000000)
+    args = parser.parse_args()
+
+    with cafe.app.app_context():
+        cafe.db.drop_all()
+        cafe.db.create_all()
+        timed(f"seed {args.orders} orders", lambda: seed(args.orders))
+        backfilled = timed('backfill order_line', cafe.backfill_order_lines)
+        print(f"  backfilled {backfilled}, {cafe.OrderLine.query.count()} lines")
+
+        end_at = datetime.utcnow() + timedelta(minutes=1)
+        week_start = end_at - timedelta(days=7)
+        quarter_start = end_at - timedelta(days=91)
+        sql_top = timed('SQL top items (7 days)', lambda: cafe.sales_report(
+            [cafe.OrderLine.menu_item_id, cafe.OrderLine.item_name], week_start, end_at, limit=10))
+        python_top = timed('Python top items from JSON (7 days)', lambda: python_top_items(week_start))
+        timed('SQL revenue per category (90 days)', lambda: cafe.sales_report([cafe.OrderLine.category], quarter_start, end_at))
+        timed('SQL revenue per category per hour (90 days)', lambda: cafe.sales_report(
+            [cafe.OrderLine.category, cafe.OrderLine.ordered_hour], quarter_start, end_at, order_by_revenue=False))
+        same = [row['item_name'] for row in sql_top] == [name for name, _ in python_top]
+        print(f"top items agree: {same}")
+
+
+if __name__ == '__main__':
+    main()
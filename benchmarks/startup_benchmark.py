@@ -0,0 +1,108 @@
+"""Measures how long a fresh process takes from `import app` to its first response.
+
+Each sample runs in a new interpreter and reports three phases:
+
+  import        importing app.py (modules, models, routes)
+  create_app    configuration, database engine, cache warm-up
+  first request the first GET of each of a few pages through the test client
+
+It also measures a preloading master (gunicorn --preload): one process imports and
+creates the app, then forks workers, and each worker's time to its first response is
+reported. The weather backend is stubbed, so nothing leaves the machine.
+
+Usage: python benchmarks/startup_benchmark.py [--samples 7] [--workers 4]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIRST_PATHS = ('/home', '/breakfast', '/dine_in_menu')
+
+
+def first_requests(cafe):
+    cafe.weather_provider.backend = lambda: {'temperature': 30}
+    client = cafe.app.test_client()
+    started = time.perf_counter()
+    for path in FIRST_PATHS:
+        response = client.get(path)
+        assert response.status_code == 200, (path, response.status_code)
+    return time.perf_counter() - started
+
+
+def cold_sample():
+    """Runs in a fresh interpreter: import, create_app(), first requests."""
+    started = time.perf_counter()
+    import app as cafe
+    imported = time.perf_counter()
+    cafe.create_app()
+    created = time.perf_counter()
+    first_request = first_requests(cafe)
+    print(json.dumps({'import': imported - started, 'create_app': created - imported, 'first_request': first_request}))
+
+
+def preload_sample(workers):
+    """Runs in a fresh interpreter: creates the app once, then forks workers like gunicorn --preload."""
+    import gc
+
+    import app as cafe
+    cafe.create_app()
+    gc.freeze()
+    results = []
+    for _ in range(workers):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            os.write(write_fd, json.dumps({'first_request': first_requests(cafe)}).encode())
+            os._exit(0)
+        os.close(write_fd)
+        with os.fdopen(read_fd) as pipe:
+            results.append(json.loads(pipe.read()))
+        os.waitpid(pid, 0)
+    print(json.dumps(results))
+
+
+def run_child(mode, env, *args):
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), mode, *args], env=env, cwd=REPO_ROOT,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--samples', type=int, default=7)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{work_dir}/startup_bench.db", MAIL_OUTBOX_WORKERS='0',
+               PYTHONPATH=REPO_ROOT)
+    subprocess.run([sys.executable, '-c', "import app; app.create_app({'WARM_CACHES': False})\n"
+                    "with app.app.app_context(): app.upgrade_schema()"], env=env, cwd=REPO_ROOT, check=True)
+
+    print(f"{'mode':<28}{'import ms':>11}{'create ms':>11}{'first req ms':>14}{'total ms':>11}")
+    for label, warm in (('cold, WARM_CACHES=false', 'false'), ('cold, WARM_CACHES=true', 'true')):
+        samples = [run_child('--cold', dict(env, WARM_CACHES=warm)) for _ in range(args.samples)]
+        phases = {key: statistics.median(sample[key] for sample in samples) * 1000
+                  for key in ('import', 'create_app', 'first_request')}
+        print(f"{label:<28}{phases['import']:>11.1f}{phases['create_app']:>11.1f}{phases['first_request']:>14.1f}"
+              f"{sum(phases.values()):>11.1f}")
+    forked = [worker['first_request'] for _ in range(args.samples)
+              for worker in run_child('--preload', dict(env, WARM_CACHES='true'), str(args.workers))]
+    print(f"{'preloaded, per worker':<28}{'-':>11}{'-':>11}{statistics.median(forked) * 1000:>14.1f}"
+          f"{statistics.median(forked) * 1000:>11.1f}")
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--cold']:
+        cold_sample()
+    elif sys.argv[1:2] == ['--preload']:
+        preload_sample(int(sys.argv[2]))
+    else:
+        main()
@@ -0,0 +1,141 @@
+"""Builds fingerprinted, resized and precompressed copies of everything in static/.
+
+Run it at deploy time, after installing requirements and before starting the app:
+
+    python build_assets.py
+
+For every file under static/ (except the output folder) it writes to static/dist/:
+
+  * a copy named after its content hash, e.g. images/dosa.3f9a1c0b2d.jpg;
+  * for JPEG/PNG images, WebP and same-format variants resized to each width in
+    IMAGE_WIDTHS (never upscaled), e.g. images/dosa.3f9a1c0b2d.w640.webp;
+  * for text assets (CSS, JS, SVG, JSON, ...), .gz and, with the brotli package
+    installed, .br precompressed siblings.
+
+static/dist/manifest.json maps each source path to its built files. The app reads
+it at startup to rewrite url_for('static', ...) and menu image URLs, and serves
+static/dist/ with immutable caching. Without a manifest the app serves static/ as is.
+"""
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+
+from PIL import Image
+
+try:
+    import brotli
+except ImportError: # optional: only gzip variants are written without it
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+OUTPUT_NAME = 'dist'
+MANIFEST_NAME = 'manifest.json'
+IMAGE_WIDTHS = (320, 640, 1280)
+RESIZABLE_EXTENSIONS = {'.jpg': 'JPEG', '.jpeg': 'JPEG', '.png': 'PNG'}
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.svg', '.json', '.txt', '.html', '.xml', '.ico', '.map'}
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:10]
+
+
+def write_file(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def encode_image(image, image_format):
+    buffer = io.BytesIO()
+    if image_format == 'JPEG':
+        image.convert('RGB').save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    elif image_format == 'PNG':
+        image.save(buffer, 'PNG', optimize=True)
+    else:
+        image.save(buffer, 'WEBP', quality=WEBP_QUALITY, method=6)
+    return buffer.getvalue()
+
+
+def build_image_variants(source_path, stem, extension, output_dir):
+    """Returns {'width', 'webp': path, 'widths': {width: {'webp': path, extension: path}}}, paths relative to output_dir."""
+    image_format = RESIZABLE_EXTENSIONS[extension]
+    variants = {'widths': {}}
+    with Image.open(source_path) as image:
+        image.load()
+        variants['width'] = image.width
+        if image.mode == 'P':
+            image = image.convert('RGBA')
+        webp_path = f"{stem}.webp"
+        write_file(os.path.join(output_dir, webp_path), encode_image(image, 'WEBP'))
+        variants['webp'] = webp_path
+        for width in IMAGE_WIDTHS:
+            if width >= image.width:
+                continue
+            resized = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+            sized = {}
+            for suffix, variant_format in (('.webp', 'WEBP'), (extension, image_format)):
+                path = f"{stem}.w{width}{suffix}"
+                write_file(os.path.join(output_dir, path), encode_image(resized, variant_format))
+                sized[suffix.lstrip('.')] = path
+            variants['widths'][str(width)] = sized
+    return variants
+
+
+def precompress(path, data):
+    write_file(f"{path}.gz", gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli:
+        write_file(f"{path}.br", brotli.compress(data, quality=11))
+
+
+def build(static_dir=STATIC_DIR):
+    output_dir = os.path.join(static_dir, OUTPUT_NAME)
+    shutil.rmtree(output_dir, ignore_errors=True)
+    manifest = {}
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != output_dir)
+        for name in sorted(files):
+            source_path = os.path.join(root, name)
+            relative_path = os.path.relpath(source_path, static_dir).replace(os.sep, '/')
+            with open(source_path, 'rb') as f:
+                data = f.read()
+            base, extension = os.path.splitext(relative_path)
+            extension = extension.lower()
+            stem = f"{base}.{content_hash(data)}"
+            built_path = f"{stem}{extension}"
+            write_file(os.path.join(output_dir, built_path), data)
+            entry = {'path': f"{OUTPUT_NAME}/{built_path}"}
+            if extension in RESIZABLE_EXTENSIONS:
+                variants = build_image_variants(source_path, stem, extension, output_dir)
+                entry['width'] = variants['width']
+                entry['webp'] = f"{OUTPUT_NAME}/{variants['webp']}"
+                entry['widths'] = {width: {fmt: f"{OUTPUT_NAME}/{path}" for fmt, path in sized.items()}
+                                   for width, sized in variants['widths'].items()}
+            elif extension in COMPRESSIBLE_EXTENSIONS:
+                precompress(os.path.join(output_dir, built_path), data)
+            manifest[relative_path] = entry
+    with open(os.path.join(output_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--static-dir', default=STATIC_DIR)
+    args = parser.parse_args()
+    manifest = build(args.static_dir)
+    print(f"Built {len(manifest)} assets into {os.path.join(args.static_dir, OUTPUT_NAME)} "
+          f"({directory_size(os.path.join(args.static_dir, OUTPUT_NAME)) / 1e6:.1f} MB)")
+
+
+if __name__ == '__main__':
+    main()
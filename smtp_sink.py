@@ -0,0 +1,83 @@
+"""A tiny local SMTP server that accepts every message and keeps it in memory.
+
+Point the app at it when testing the mail outbox without touching a real server:
+
+    python smtp_sink.py --port 1025
+    MAIL_SERVER=localhost MAIL_PORT=1025 MAIL_USE_TLS=false flask run
+"""
+import argparse
+import socketserver
+import threading
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.reply('220 brew-and-bite smtp sink')
+        envelope = {'from': None, 'to': []}
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors='replace').strip()
+            verb = command[:4].upper()
+            if verb in ('HELO', 'EHLO'):
+                self.reply('250 smtp sink')
+            elif verb == 'MAIL':
+                envelope = {'from': command.split(':', 1)[1].strip(), 'to': []}
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                envelope['to'].append(command.split(':', 1)[1].strip())
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                for data_line in iter(self.rfile.readline, b''):
+                    if data_line in (b'.\r\n', b'.\n'):
+                        break
+                    data.append(data_line)
+                self.server.record(envelope, b''.join(data))
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """Collects delivered messages in `self.messages`; use port 0 to pick a free port."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='localhost', port=1025, verbose=False):
+        super().__init__((host, port), _SMTPHandler)
+        self.messages = []
+        self.verbose = verbose
+        self._lock = threading.Lock()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def record(self, envelope, data):
+        with self._lock:
+            self.messages.append({'from': envelope['from'], 'to': envelope['to'], 'data': data})
+        if self.verbose:
+            print(f"--- mail from {envelope['from']} to {', '.join(envelope['to'])} ({len(data)} bytes)")
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local SMTP sink for development and tests.')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=1025)
+    args = parser.parse_args()
+    sink = SMTPSink(args.host, args.port, verbose=True)
+    print(f"SMTP sink listening on {args.host}:{sink.port}")
+    sink.serve_forever()
@@ -0,0 +1,53 @@
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+# app.py reads these at import time, so they are set before it is imported.
+work_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f"sqlite:///{work_dir}/test.db"
+os.environ['ARCHIVE_DIR'] = os.path.join(work_dir, 'archive')
+os.environ['MAIL_OUTBOX_WORKERS'] = '0'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as cafe  # noqa: E402
+
+cafe.create_app({'WARM_CACHES': False, 'TESTING': True})
+
+
+@pytest.fixture
+def app_context():
+    """An app context on an empty, current schema and an empty archive directory."""
+    with cafe.app.app_context():
+        cafe.db.drop_all()
+        cafe.upgrade_schema()
+        shutil.rmtree(cafe.ARCHIVE_DIR, ignore_errors=True)
+        yield
+        cafe.db.session.remove()
+
+
+@pytest.fixture
+def client(app_context):
+    """A test client logged in as a customer."""
+    client = cafe.app.test_client()
+    with client.session_transaction() as session:
+        session['user'] = 'guest@example.com'
+        session['user_name'] = 'Guest'
+    return client
+
+
+@pytest.fixture
+def admin_client(app_context):
+    client = cafe.app.test_client()
+    with client.session_transaction() as session:
+        session['user'] = 'admin@example.com'
+        session['is_admin'] = True
+    return client
+
+
+@pytest.fixture
+def cart():
+    item = cafe.get_menu_catalog().items[0]
+    return [{'id': item.id, 'name': item.name, 'price': item.price, 'quantity': 2}]
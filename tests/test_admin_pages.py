@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+
+import app as cafe
+
+
+def add_feedback(timestamps):
+    rows = [cafe.Feedback(text=f"Feedback {index}", sentiment='Positive', timestamp=timestamp)
+            for index, timestamp in enumerate(timestamps)]
+    cafe.db.session.add_all(rows)
+    cafe.db.session.commit()
+    return rows
+
+
+def walk(client, path, limit):
+    """Follows next_cursor from the first page to the last. Returns the pages' items."""
+    pages, cursor = [], None
+    while True:
+        query = {'limit': limit} if cursor is None else {'limit': limit, 'cursor': cursor}
+        response = client.get(path, query_string=query)
+        assert response.status_code == 200
+        data = response.get_json()
+        pages.append(data['items'])
+        cursor = data['next_cursor']
+        if cursor is None:
+            return pages
+
+
+def test_feedback_pages_cover_every_row_once_in_order(admin_client):
+    now = datetime(2026, 5, 1, 12, 0)
+    # Runs of equal timestamps straddle the page boundaries, so the id tiebreak matters.
+    rows = add_feedback([now] * 5 + [now - timedelta(minutes=1)] * 3 + [now + timedelta(minutes=1)])
+
+    pages = walk(admin_client, '/api/admin/feedback', limit=2)
+
+    expected = [row.id for row in sorted(rows, key=lambda row: (row.timestamp, row.id), reverse=True)]
+    assert [item['id'] for page in pages for item in page] == expected
+    assert [len(page) for page in pages] == [2, 2, 2, 2, 1]
+
+
+def test_last_full_page_has_no_next_cursor(admin_client):
+    add_feedback([datetime(2026, 5, 1) + timedelta(minutes=minute) for minute in range(4)])
+
+    pages = walk(admin_client, '/api/admin/feedback', limit=2)
+
+    assert [len(page) for page in pages] == [2, 2]
+
+
+def test_empty_list_is_one_empty_page(admin_client):
+    assert walk(admin_client, '/api/admin/feedback', limit=2) == [[]]
+
+
+def test_booking_pages_break_ties_on_date_time_and_id(admin_client):
+    slots = [('2026-05-02', '19:00'), ('2026-05-02', '19:00'), ('2026-05-02', '18:00'),
+             ('2026-05-01', '19:00'), ('2026-05-01', '19:00')]
+    for index, (date, time_str) in enumerate(slots):
+        cafe.db.session.add(cafe.Booking(booking_id=f"BNB-{index:05d}", table_id=1 + index, date=date, time=time_str,
+                                         party_size=2, starts_at=cafe.parse_booking_datetime(date, time_str)))
+    cafe.db.session.commit()
+
+    pages = walk(admin_client, '/api/admin/bookings', limit=2)
+
+    booking_ids = [item['booking_id'] for page in pages for item in page]
+    assert booking_ids == ['BNB-00001', 'BNB-00000', 'BNB-00002', 'BNB-00004', 'BNB-00003']
+
+
+def test_page_size_is_clamped(admin_client):
+    add_feedback([datetime(2026, 5, 1)] * (cafe.ADMIN_MAX_PAGE_SIZE + 1))
+
+    assert len(admin_client.get('/api/admin/feedback?limit=1000').get_json()['items']) == cafe.ADMIN_MAX_PAGE_SIZE
+    assert len(admin_client.get('/api/admin/feedback?limit=0').get_json()['items']) == 1
+
+
+def test_malformed_cursors_are_rejected(admin_client):
+    for cursor in ('not-base64!', cafe.encode_cursor([1]), cafe.encode_cursor(['not a date', 1]),
+                   cafe.encode_cursor([{'a': 1}, 1])):
+        response = admin_client.get('/api/admin/feedback', query_string={'cursor': cursor})
+        assert response.status_code == 400, cursor
+
+
+def test_pages_are_admin_only(client):
+    assert client.get('/api/admin/feedback').status_code == 403
+    assert client.get('/api/admin/bookings').status_code == 403
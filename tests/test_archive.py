@@ -0,0 +1,143 @@
+import json
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select as sa_select
+
+import app as cafe
+
+OLD = datetime.utcnow() - timedelta(days=cafe.ARCHIVE_RETENTION_DAYS + 30)
+RECENT = datetime.utcnow() - timedelta(days=1)
+SENTIMENTS = ('Positive', 'Negative', 'Neutral', 'Positive')
+
+
+def add_feedback(timestamp, count):
+    rows = [cafe.Feedback(text=f"Feedback {index}", sentiment=SENTIMENTS[index % len(SENTIMENTS)], timestamp=timestamp)
+            for index in range(count)]
+    cafe.db.session.add_all(rows)
+    cafe.db.session.commit()
+    return [row.id for row in rows] # the rows themselves go stale once archived
+
+
+def old_feedback_rows():
+    table = cafe.Feedback.__table__
+    query = sa_select(table).where(table.c.timestamp < RECENT - timedelta(days=1)).order_by(table.c.id)
+    return cafe.db.session.execute(query).mappings().all()
+
+
+def archived_ids(name='feedback'):
+    return [record['id'] for record in cafe.iter_archived_records(name)]
+
+
+def test_archive_moves_old_rows_and_keeps_their_counts(app_context):
+    old = add_feedback(OLD, 8)
+    recent = add_feedback(RECENT, 2)
+    before = cafe.get_sentiment_counts()
+
+    moved = cafe.archive_old_rows(chunk_size=3)
+
+    assert moved['feedback'] == 8
+    assert archived_ids() == old
+    assert [row.id for row in cafe.Feedback.query.order_by(cafe.Feedback.id)] == recent
+    manifest = cafe.archive_manifest.table('feedback')
+    assert manifest['rows'] == 8
+    assert manifest['months'] == {OLD.strftime('%Y-%m'): 8}
+    assert manifest['sentiments'] == {'Positive': 4, 'Negative': 2, 'Neutral': 2}
+    assert cafe.get_sentiment_counts() == before
+
+
+def test_newest_row_is_never_archived(app_context):
+    old = add_feedback(OLD, 3)
+
+    cafe.archive_old_rows()
+
+    assert archived_ids() == old[:-1]
+    assert cafe.Feedback.query.one().id == old[-1]
+
+
+def test_dry_run_only_counts(app_context):
+    add_feedback(OLD, 4)
+    add_feedback(RECENT, 1)
+
+    assert cafe.archive_old_rows(dry_run=True)['feedback'] == 4
+    assert cafe.Feedback.query.count() == 5
+    assert archived_ids() == []
+
+
+def test_interrupted_chunk_whose_delete_never_committed_is_rolled_back(app_context, monkeypatch):
+    add_feedback(OLD, 4)
+    add_feedback(RECENT, 1)
+    cafe.archive_old_rows(chunk_size=2) # an earlier, complete run: the partition already has rows
+    add_feedback(OLD, 3)
+    add_feedback(RECENT, 1)
+    partition = cafe.archive_path('feedback', f"{OLD.strftime('%Y-%m')}.jsonl.gz")
+    size_before = os.path.getsize(partition)
+
+    def crash():
+        raise RuntimeError('killed before the delete committed')
+    monkeypatch.setattr(cafe.db.session, 'commit', crash)
+    with pytest.raises(RuntimeError):
+        cafe.archive_chunk('feedback', old_feedback_rows(), 'timestamp')
+    monkeypatch.undo()
+    cafe.db.session.rollback()
+
+    assert os.path.getsize(partition) > size_before
+    assert cafe.recover_archive_journal().startswith('rolled back')
+    assert os.path.getsize(partition) == size_before
+    assert not os.path.exists(cafe.archive_path('journal.json'))
+    assert cafe.archive_manifest.table('feedback')['rows'] == 4
+
+    cafe.archive_old_rows()
+    ids = archived_ids()
+    assert len(ids) == len(set(ids)) == 7
+    assert cafe.archive_manifest.table('feedback')['rows'] == 7
+
+
+def test_interrupted_chunk_whose_delete_committed_is_completed(app_context, monkeypatch):
+    add_feedback(OLD, 3)
+    add_feedback(RECENT, 1)
+
+    def crash(journal):
+        raise RuntimeError('killed before the manifest was updated')
+    monkeypatch.setattr(cafe.archive_manifest, 'apply', crash)
+    with pytest.raises(RuntimeError):
+        cafe.archive_chunk('feedback', old_feedback_rows(), 'timestamp')
+    monkeypatch.undo()
+
+    assert cafe.archive_manifest.table('feedback') == {}
+    assert cafe.recover_archive_journal().startswith('completed')
+    assert cafe.archive_manifest.table('feedback')['rows'] == 3
+    assert cafe.recover_archive_journal() is None # applied once, however often recovery runs
+    assert cafe.archive_manifest.table('feedback')['rows'] == 3
+
+
+def test_manifest_applies_a_journal_once(app_context):
+    os.makedirs(cafe.ARCHIVE_DIR)
+    journal = {'chunk': 'feedback:1-2:1', 'table': 'feedback', 'ids': [1, 2], 'months': {'2024-01': 2},
+               'sentiments': {'Positive': 2}, 'sizes': {}}
+
+    cafe.archive_manifest.apply(journal)
+    cafe.archive_manifest.apply(journal)
+
+    with open(cafe.archive_path('manifest.json')) as f:
+        manifest = json.load(f)
+    assert manifest['tables']['feedback'] == {'rows': 2, 'months': {'2024-01': 2}, 'sentiments': {'Positive': 2}}
+    assert manifest['applied'] == 'feedback:1-2:1'
+
+
+def test_export_streams_archived_then_live_rows(admin_client):
+    old = add_feedback(OLD, 3)
+    recent = add_feedback(RECENT, 2)
+    cafe.archive_old_rows()
+
+    response = admin_client.get('/api/admin/export/feedback?format=jsonl')
+
+    assert response.status_code == 200
+    ids = [json.loads(line)['id'] for line in response.get_data(as_text=True).splitlines()]
+    assert ids == old + recent
+
+
+def test_export_waits_for_a_running_archive(admin_client):
+    with cafe.open_archive_lock():
+        assert admin_client.get('/api/admin/export/feedback').status_code == 409
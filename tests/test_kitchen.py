@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+import app as cafe
+
+ARRIVAL = datetime(2026, 5, 1, 12, 0)
+
+
+def unknown_item(quantity=1):
+    # Not on the menu, so it gets DEFAULT_PREP; a station the kitchen lacks maps to its first one.
+    return {'id': None, 'name': 'Off-menu special', 'price': 100, 'quantity': quantity}
+
+
+def prep_minutes():
+    return cafe.DEFAULT_PREP[1]
+
+
+def minutes_after_arrival(ready_at):
+    return (ready_at - ARRIVAL).total_seconds() / 60
+
+
+def test_units_share_the_station_slots():
+    scheduler = cafe.KitchenScheduler({'stove': 2})
+    plan = scheduler.begin()
+
+    assert minutes_after_arrival(plan.place([unknown_item(quantity=2)], ARRIVAL)) == prep_minutes()
+    assert minutes_after_arrival(plan.place([unknown_item(quantity=1)], ARRIVAL)) == 2 * prep_minutes()
+
+
+def test_order_waits_behind_the_backlog_and_not_after_it_clears():
+    scheduler = cafe.KitchenScheduler({'stove': 1})
+    plan = scheduler.begin()
+    plan.place([unknown_item(quantity=3)], ARRIVAL)
+
+    assert minutes_after_arrival(plan.place([unknown_item()], ARRIVAL)) == 4 * prep_minutes()
+    later = ARRIVAL + timedelta(hours=1)
+    assert (plan.place([unknown_item()], later) - later) == timedelta(minutes=prep_minutes())
+
+
+def test_stations_work_in_parallel():
+    catalog = cafe.get_menu_catalog()
+    drink = next(item for item in catalog.items if cafe.item_prep_profile(item)[0] == 'bar')
+    food = next(item for item in catalog.items if cafe.item_prep_profile(item)[0] == 'stove')
+    scheduler = cafe.KitchenScheduler({'stove': 1, 'bar': 1})
+    cart = [{'id': item.id, 'name': item.name, 'price': item.price, 'quantity': 1} for item in (drink, food)]
+
+    ready_at = scheduler.begin().place(cart, ARRIVAL)
+
+    slowest = max(cafe.item_prep_profile(drink)[1], cafe.item_prep_profile(food)[1])
+    assert ready_at == ARRIVAL + timedelta(seconds=slowest)
+
+
+def test_menu_file_overrides_station_and_prep_time():
+    item = cafe.get_menu_catalog().items[0]
+    overridden = SimpleNamespace(type=item.type, category=item.category, menu_category=item.menu_category,
+                                 payload=dict(item.payload, station='grill', prep_minutes=11))
+
+    assert cafe.item_prep_profile(overridden) == ('grill', 660)
+
+
+def test_plan_is_installed_only_if_the_schedule_has_not_moved_on():
+    scheduler = cafe.KitchenScheduler({'stove': 1})
+    first, second = scheduler.begin(), scheduler.begin()
+    first.place([unknown_item()], ARRIVAL)
+    first.orders.append(SimpleNamespace(id=1))
+    second.place([unknown_item(quantity=5)], ARRIVAL)
+    second.orders.append(SimpleNamespace(id=2))
+
+    scheduler.commit(first)
+    scheduler.commit(second) # began from the same state, so it is dropped and replayed by a later sync
+
+    assert minutes_after_arrival(scheduler.begin().place([unknown_item()], ARRIVAL)) == 2 * prep_minutes()
+
+
+def test_dine_in_order_gets_the_scheduled_eta(client, cart):
+    response = client.post('/api/confirm-dine-in-order', json={'cart': cart, 'table_number': 3})
+
+    order = cafe.DineInOrder.query.filter_by(order_id=response.get_json()['order_id']).one()
+    station, seconds = cafe.kitchen_scheduler.prep_profile(cart[0])
+    assert order.estimated_ready_time - order.timestamp >= timedelta(seconds=seconds)
+
+
+@pytest.mark.parametrize('spec, stations', [
+    ('stove:8,grill:4', {'stove': 8, 'grill': 4}),
+    ('stove, bar:0', {'stove': 1, 'bar': 1}),
+])
+def test_parse_kitchen_stations(spec, stations):
+    assert cafe.parse_kitchen_stations(spec) == stations
+
+
+def test_parse_kitchen_stations_needs_a_station():
+    with pytest.raises(ValueError):
+        cafe.parse_kitchen_stations(' , ')
+
+
+def test_due_orders_are_requeued_when_marking_them_ready_fails(client, cart, monkeypatch):
+    response = client.post('/api/confirm-dine-in-order', json={'cart': cart, 'table_number': 3})
+    order = cafe.DineInOrder.query.filter_by(order_id=response.get_json()['order_id']).one()
+    order.estimated_ready_time = datetime.utcnow() - timedelta(seconds=1)
+    cafe.db.session.commit()
+    scheduler = cafe.ReadyOrderScheduler(cafe.KitchenEventBus())
+    scheduler._sync_from_db()
+
+    def locked(due):
+        raise RuntimeError('database is locked')
+    monkeypatch.setattr(scheduler, '_mark_ready', locked)
+    with pytest.raises(RuntimeError):
+        scheduler.release_due()
+    monkeypatch.undo()
+
+    assert scheduler.release_due() == 1
+    assert cafe.db.session.get(cafe.DineInOrder, order.id).status == 'ready'
@@ -0,0 +1,143 @@
+import smtplib
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as cafe
+
+
+class FakeMail:
+    """Stands in for the Flask-Mail client; `send(msg, session)` decides what each send does."""
+
+    def __init__(self, send=None):
+        self.sessions = 0
+        self.sent = []
+        self._send = send
+
+    def connect(self):
+        self.sessions += 1
+        return FakeConnection(self, self.sessions)
+
+
+class FakeConnection:
+    def __init__(self, mail, session):
+        self.mail = mail
+        self.session = session
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def send(self, msg):
+        if self.mail._send:
+            self.mail._send(msg, self.session)
+        self.mail.sent.append(msg.recipients[0])
+
+
+@pytest.fixture
+def outbox(app_context, monkeypatch):
+    cafe.get_mail() # registers the real extension, which Message reads its default sender from
+    fake_mail = FakeMail()
+    monkeypatch.setattr(cafe, 'get_mail', lambda: fake_mail)
+    return fake_mail
+
+
+def queue(*recipients):
+    mails = [cafe.queue_mail('Order confirmed', [recipient], body='Thanks!') for recipient in recipients]
+    cafe.db.session.commit()
+    return mails
+
+
+def test_batch_is_delivered_over_one_session(outbox):
+    mails = queue('a@example.com', 'b@example.com', 'c@example.com')
+
+    assert cafe.mail_outbox.deliver_batch() == 3
+    assert outbox.sessions == 1
+    assert outbox.sent == ['a@example.com', 'b@example.com', 'c@example.com']
+    assert {mail.status for mail in mails} == {'sent'}
+    assert cafe.mail_outbox.deliver_batch() == 0
+
+
+def test_refused_mail_is_retried_later_without_failing_the_batch(outbox):
+    def send(msg, session):
+        if msg.recipients == ['refused@example.com']:
+            raise smtplib.SMTPRecipientsRefused({'refused@example.com': (550, b'No such user')})
+    outbox._send = send
+    refused, delivered = queue('refused@example.com', 'b@example.com')
+
+    cafe.mail_outbox.deliver_batch()
+
+    assert delivered.status == 'sent'
+    assert refused.status == 'pending'
+    assert refused.attempts == 1
+    assert refused.next_attempt_at > datetime.utcnow() + timedelta(seconds=cafe.MAIL_RETRY_BASE_SECONDS - 5)
+    assert 'No such user' in refused.last_error
+    assert cafe.mail_outbox.deliver_batch() == 0 # not due yet
+
+
+def test_retry_delay_doubles_with_each_attempt(outbox):
+    def send(msg, session):
+        raise smtplib.SMTPDataError(554, b'Rejected')
+    outbox._send = send
+    mail, = queue('a@example.com')
+    delays = []
+    for _ in range(3):
+        mail.next_attempt_at = datetime.utcnow()
+        cafe.db.session.commit()
+        cafe.mail_outbox.deliver_batch()
+        delays.append((mail.next_attempt_at - datetime.utcnow()).total_seconds())
+
+    assert [round(delay / cafe.MAIL_RETRY_BASE_SECONDS) for delay in delays] == [1, 2, 4]
+
+
+def test_mail_fails_for_good_after_the_last_attempt(outbox, monkeypatch):
+    monkeypatch.setitem(cafe.app.config, 'MAIL_OUTBOX_MAX_ATTEMPTS', 2)
+    def send(msg, session):
+        raise smtplib.SMTPDataError(554, b'Rejected')
+    outbox._send = send
+    mail, = queue('a@example.com')
+    mail.attempts = 1
+    cafe.db.session.commit()
+
+    cafe.mail_outbox.deliver_batch()
+
+    assert mail.status == 'failed'
+    assert mail.attempts == 2
+
+
+def test_dropped_session_is_reconnected_once(outbox):
+    def send(msg, session):
+        if session == 1 and msg.recipients == ['b@example.com']:
+            raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+    outbox._send = send
+    mails = queue('a@example.com', 'b@example.com', 'c@example.com')
+
+    cafe.mail_outbox.deliver_batch()
+
+    assert outbox.sessions == 2
+    assert outbox.sent == ['a@example.com', 'b@example.com', 'c@example.com']
+    assert {mail.status for mail in mails} == {'sent'}
+
+
+def test_rest_of_the_batch_is_retried_when_reconnecting_fails(outbox):
+    def send(msg, session):
+        if msg.recipients != ['a@example.com']:
+            raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+    outbox._send = send
+    delivered, second, third = queue('a@example.com', 'b@example.com', 'c@example.com')
+
+    cafe.mail_outbox.deliver_batch()
+
+    assert outbox.sessions == 1 + cafe.MAIL_SESSION_RECONNECTS
+    assert delivered.status == 'sent'
+    assert (second.status, second.attempts) == (third.status, third.attempts) == ('pending', 1)
+
+
+def test_smtp_connection_errors_are_told_apart_from_refused_mail():
+    assert cafe.is_smtp_connection_error(smtplib.SMTPServerDisconnected())
+    assert cafe.is_smtp_connection_error(smtplib.SMTPResponseException(421, b'Closing'))
+    assert cafe.is_smtp_connection_error(ConnectionResetError())
+    assert not cafe.is_smtp_connection_error(smtplib.SMTPRecipientsRefused({}))
+    assert not cafe.is_smtp_connection_error(smtplib.SMTPDataError(554, b'Rejected'))
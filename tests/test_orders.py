@@ -0,0 +1,61 @@
+import app as cafe
+
+
+def online_order(cart):
+    return {'cart': cart, 'address': '1 Long Street'}
+
+
+def test_idempotency_key_replays_the_first_response(client, cart):
+    headers = {'Idempotency-Key': 'checkout-1'}
+    first = client.post('/api/confirm-online-order', json=online_order(cart), headers=headers)
+    retry = client.post('/api/confirm-online-order', json=online_order(cart), headers=headers)
+
+    assert first.status_code == retry.status_code == 200
+    assert retry.get_json() == first.get_json()
+    assert 'Idempotent-Replayed' not in first.headers
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert cafe.OnlineOrder.query.count() == 1
+    assert cafe.OutboxMail.query.count() == 1
+
+
+def test_idempotency_key_reused_for_a_different_order_is_rejected(client, cart):
+    headers = {'Idempotency-Key': 'checkout-1'}
+    client.post('/api/confirm-online-order', json=online_order(cart), headers=headers)
+    changed = dict(online_order(cart), address='2 Short Street')
+    response = client.post('/api/confirm-online-order', json=changed, headers=headers)
+
+    assert response.status_code == 422
+    assert cafe.OnlineOrder.query.count() == 1
+
+
+def test_orders_without_a_key_are_not_deduplicated(client, cart):
+    client.post('/api/confirm-online-order', json=online_order(cart))
+    client.post('/api/confirm-online-order', json=online_order(cart))
+
+    assert cafe.OnlineOrder.query.count() == 2
+
+
+def test_retried_bulk_submit_replays_every_order(client, cart):
+    orders = [dict(online_order(cart), type='online', idempotency_key=f"tablet-{index}") for index in range(3)]
+    first = client.post('/api/orders/bulk', json={'orders': orders}).get_json()
+    retry = client.post('/api/orders/bulk', json={'orders': orders}).get_json()
+
+    assert [order['replayed'] for order in first['orders']] == [False] * 3
+    assert [order['replayed'] for order in retry['orders']] == [True] * 3
+    assert [order['order_id'] for order in retry['orders']] == [order['order_id'] for order in first['orders']]
+    assert cafe.OnlineOrder.query.count() == 3
+
+
+def test_repeated_key_within_one_bulk_submit_creates_one_order(client, cart):
+    order = dict(online_order(cart), type='online', idempotency_key='tablet-1')
+    response = client.post('/api/orders/bulk', json={'orders': [order, order]}).get_json()
+
+    assert [order['replayed'] for order in response['orders']] == [False, True]
+    assert cafe.OnlineOrder.query.count() == 1
+
+
+def test_invalid_cart_items_are_rejected(client, cart):
+    for bad_item in (dict(cart[0], quantity=0), dict(cart[0], quantity=True), dict(cart[0], price='free'), 'coffee'):
+        response = client.post('/api/confirm-online-order', json=online_order([bad_item]))
+        assert response.status_code == 400, bad_item
+    assert cafe.OnlineOrder.query.count() == 0
@@ -0,0 +1,27 @@
+"""WSGI entry point.
+
+    flask upgrade-db                # before the first start and after every deploy
+    gunicorn --preload -w 4 -k gthread --threads 8 wsgi:app
+
+Nothing creates or migrates tables when the app starts, so run `flask upgrade-db`
+before first serving a new database (and on each deploy). Serve this module, not
+app:app: it is create_app() here that configures the app, and the bare app answers
+every request with an error saying so.
+
+Use a threaded (gthread) or gevent worker class. Each open kitchen display holds a
+/api/kitchen-stream response for up to KITCHEN_STREAM_SECONDS before it reconnects;
+with the default sync workers that is a whole worker per display, so a few displays
+would leave no worker for anyone else.
+
+With --preload the master builds the app once (menu catalog, pricing snapshots,
+compiled templates) and the forked workers share that memory copy-on-write. The
+flask CLI picks this module up too, e.g. `flask upgrade-db`.
+"""
+import gc
+
+from app import create_app
+
+app = create_app()
+# Move everything built so far out of the collector's generations: a collection in a
+# worker would otherwise write to (and un-share) every page holding preloaded objects.
+gc.freeze()